@@ -0,0 +1,6 @@
+"""
+Shared building blocks for the metrics collection pipeline.
+
+Modules in this package are used by ``pipeline.py`` and ``collect_metrics.py``
+and must not depend on Django at import time.
+"""
@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Benchmark the line protocol parser.
+
+    python -m collector.bench_line_protocol [nombre_de_lignes]
+"""
+
+import sys
+import time
+
+from collector.line_protocol import parse_lines
+
+SAMPLE = [
+    "snmp,agent_host=172.16.10.41,host=router-collector,hostname=R1 "
+    "cpu_0_index=7i,cpu_0_usage=12i,cpu_5min=9i,ram_free=1834567890i,ram_used=201234567i,uptime=353899741i "
+    "1718000000000000000",
+    "interfaces,agent_host=172.16.10.41,hostname=R1,ifDescr=GigabitEthernet0/0 "
+    "ifInErrors=0i,ifInOctets=3456789012i,ifOutErrors=0i,ifOutOctets=2345678901i "
+    "1718000000000000000",
+    "interfaces,agent_host=172.16.10.41,hostname=R1,ifDescr=GigabitEthernet0/1 "
+    "ifInErrors=0i,ifInOctets=456789012i,ifOutErrors=0i,ifOutOctets=345678901i "
+    "1718000000000000000",
+    "interfaces,agent_host=172.16.10.41,hostname=R1,ifDescr=GigabitEthernet0/2\\ uplink "
+    "ifInErrors=2i,ifInOctets=123456789i,ifOutErrors=0i,ifOutOctets=987654321i "
+    "1718000000000000000",
+    "ping_latency,host=router-collector value=3.42 1718000000000000000",
+]
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200_000
+    lines = (SAMPLE * (count // len(SAMPLE) + 1))[:count]
+
+    started = time.perf_counter()
+    parsed = sum(1 for _ in parse_lines(lines))
+    elapsed = time.perf_counter() - started
+
+    print(f"{parsed} lignes en {elapsed:.3f}s -> {parsed / elapsed:,.0f} lignes/s")
+
+
+if __name__ == "__main__":
+    main()
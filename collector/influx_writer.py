@@ -0,0 +1,125 @@
+"""
+Process-lifetime, batching InfluxDB writer.
+
+One ``InfluxDBClient`` (and its HTTP connection pool) is kept for the whole
+life of the pipeline. Points are accumulated and sent as gzip compressed
+write requests once the batch is full or when the pipeline flushes at the
+end of a collection cycle. When a
+:class:`~collector.spool.Spool` is attached, batches that cannot be written
+(or that would overtake points still waiting in the spool) are appended to
+it instead of being lost.
+"""
+
+import logging
+import time
+
+from influxdb_client import InfluxDBClient, WritePrecision
+from influxdb_client.client.write_api import SYNCHRONOUS
+
+from collector.instrumentation import BATCH_SIZE, WRITE_LATENCY
+
+logger = logging.getLogger(__name__)
+
+
+class InfluxWriter:
+    """Accumulate points and write them in size/time-bounded batches."""
+
+    def __init__(self, url, token, org, bucket, batch_size=5000,
+                 pool_size=4, timeout_ms=10000, spool=None):
+        self.org = org
+        self.bucket = bucket
+        self.batch_size = batch_size
+        self.spool = spool
+        self.client = InfluxDBClient(
+            url=url,
+            token=token,
+            org=org,
+            enable_gzip=True,
+            timeout=timeout_ms,
+            connection_pool_maxsize=pool_size,
+        )
+        self.write_api = self.client.write_api(write_options=SYNCHRONOUS)
+        self._pending = []
+        self.stats = {
+            "flushes": 0,
+            "points_written": 0,
+            "last_batch_size": 0,
+            "last_flush_ms": 0.0,
+            "max_flush_ms": 0.0,
+            "points_spooled": 0,
+        }
+
+    def add(self, points):
+        """Queue points; flush immediately if the batch is full."""
+        if not points:
+            return
+        self._pending.extend(points)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Send every pending point, in requests of at most ``batch_size`` points.
+
+        Without a spool, write failures are raised. With a spool, the failed
+        request and the ones after it are spooled (the requests already
+        accepted are not, so a replay does not duplicate them), and the whole
+        batch is spooled while older points are still waiting to be replayed
+        so that ordering is preserved. Returns the number of points written.
+        """
+        if not self._pending:
+            return 0
+        batch, self._pending = self._pending, []
+
+        if self.spool is not None and self.spool.pending_bytes():
+            self._spool_points(batch)
+            return 0
+
+        started = time.perf_counter()
+        start = 0
+        try:
+            for start in range(0, len(batch), self.batch_size):
+                self.write_lines(batch[start:start + self.batch_size])
+        except Exception as e:
+            if self.spool is None:
+                raise
+            logger.warning("Écriture InfluxDB échouée (%s): %d points mis en spool", e, len(batch) - start)
+            self._spool_points(batch[start:])
+            self.stats["points_written"] += start
+            return start
+        elapsed = time.perf_counter() - started
+        elapsed_ms = elapsed * 1000
+        BATCH_SIZE.observe(len(batch))
+        WRITE_LATENCY.observe(elapsed)
+
+        self.stats["flushes"] += 1
+        self.stats["points_written"] += len(batch)
+        self.stats["last_batch_size"] = len(batch)
+        self.stats["last_flush_ms"] = round(elapsed_ms, 2)
+        self.stats["max_flush_ms"] = max(self.stats["max_flush_ms"], round(elapsed_ms, 2))
+        logger.info("Batch InfluxDB: %d points en %.1f ms", len(batch), elapsed_ms)
+        return len(batch)
+
+    def write_lines(self, records):
+        """Synchronously write points or line protocol strings in one request."""
+        self.write_api.write(bucket=self.bucket, org=self.org, record=records)
+
+    def _spool_points(self, points):
+        lines = []
+        for point in points:
+            if isinstance(point, str):
+                lines.append(point)
+                continue
+            # Stamp now, otherwise a replay would be dated at replay time
+            if point._time is None:
+                point.time(time.time_ns(), WritePrecision.NS)
+            lines.append(point.to_line_protocol())
+        self.spool.append(lines)
+        self.stats["points_spooled"] += len(lines)
+
+    def close(self):
+        try:
+            self.flush()
+        finally:
+            self.write_api.close()
+            self.client.close()
@@ -0,0 +1,201 @@
+"""
+Pipeline self-instrumentation.
+
+Counters, gauges and histograms kept in a process-wide registry. They are
+served in Prometheus text format on ``/metrics`` by a small HTTP server
+thread, and also turned into ``pipeline_stats`` points so they land in the
+``router-metrics`` bucket next to the data they describe.
+"""
+
+import bisect
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from influxdb_client import Point, WritePrecision
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_text(names, values):
+    if not names:
+        return ""
+    pairs = ",".join(f'{name}="{_escape_label(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    def _items(self):
+        """Copy of the (labels, value) pairs, safe to iterate while other threads record."""
+        with self._lock:
+            return list(self._values.items())
+
+    def header(self):
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = self.header()
+        for key, value in sorted(self._items()):
+            lines.append(f"{self.name}{_label_text(self.label_names, key)} {value}")
+        return lines
+
+    def fields(self):
+        return [(key, {"value": float(value)}) for key, value in self._items()]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [[0] * len(self.buckets), 0.0, 0, 0.0]
+            position = bisect.bisect_left(self.buckets, value)
+            if position < len(self.buckets):
+                state[0][position] += 1
+            state[1] += value
+            state[2] += 1
+            state[3] = value
+
+    def _items(self):
+        # Les compteurs par seau sont modifiés en place : copie sous le verrou
+        with self._lock:
+            return [(key, (list(counts), total, count, last))
+                    for key, (counts, total, count, last) in self._values.items()]
+
+    def render(self):
+        lines = self.header()
+        names = self.label_names + ("le",)
+        for key, (counts, total, count, _) in sorted(self._items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                lines.append(f"{self.name}_bucket{_label_text(names, key + (bound,))} {cumulative}")
+            lines.append(f"{self.name}_bucket{_label_text(names, key + ('+Inf',))} {count}")
+            lines.append(f"{self.name}_sum{_label_text(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_label_text(self.label_names, key)} {count}")
+        return lines
+
+    def fields(self):
+        return [
+            (key, {"sum": float(total), "count": float(count), "last": float(last)})
+            for key, (_, total, count, last) in self._items()
+        ]
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self.metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+    def to_points(self, measurement="pipeline_stats", timestamp=None):
+        """One point per metric and label set, for the router-metrics bucket, stamped ``timestamp`` (ns)."""
+        points = []
+        for metric in self.metrics:
+            for key, fields in metric.fields():
+                point = Point(measurement).tag("metric", metric.name)
+                for name, value in zip(metric.label_names, key):
+                    point = point.tag(name, value)
+                for name, value in fields.items():
+                    point = point.field(name, value)
+                if timestamp is not None:
+                    point = point.time(timestamp, WritePrecision.NS)
+                points.append(point)
+        return points
+
+
+REGISTRY = Registry()
+
+POLL_DURATION = REGISTRY.register(Histogram(
+    "pipeline_poll_duration_seconds", "Durée d'une collecte Telegraf/SNMP", labels=("router",)))
+POLL_FAILURES = REGISTRY.register(Counter(
+    "pipeline_poll_failures_total", "Collectes en échec", labels=("router", "reason")))
+LINES_PARSED = REGISTRY.register(Counter(
+    "pipeline_lines_parsed_total", "Lignes de line protocol analysées"))
+POINTS_DROPPED = REGISTRY.register(Counter(
+    "pipeline_points_dropped_total", "Points abandonnés", labels=("reason",)))
+BATCH_SIZE = REGISTRY.register(Histogram(
+    "pipeline_write_batch_points", "Taille des lots écrits dans InfluxDB",
+    buckets=(10, 50, 100, 250, 500, 1000, 2500, 5000, 10000)))
+WRITE_LATENCY = REGISTRY.register(Histogram(
+    "pipeline_write_latency_seconds", "Latence d'écriture d'un lot InfluxDB"))
+SPOOL_DEPTH = REGISTRY.register(Gauge(
+    "pipeline_spool_bytes", "Octets en attente dans le spool disque"))
+STAGE_DURATION = REGISTRY.register(Histogram(
+    "pipeline_stage_seconds", "Durée de chaque étape d'un cycle", labels=("stage",)))
+CYCLE_LAG = REGISTRY.register(Gauge(
+    "pipeline_cycle_lag_seconds", "Retard du cycle par rapport à la cadence cible"))
+
+
+class _Handler(BaseHTTPRequestHandler):
+    registry = REGISTRY
+
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = self.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(port, address="0.0.0.0", registry=REGISTRY):
+    """Serve ``/metrics`` from a daemon thread; returns the server."""
+    handler = type("MetricsHandler", (_Handler,), {"registry": registry})
+    server = ThreadingHTTPServer((address, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    return server
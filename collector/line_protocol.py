@@ -0,0 +1,133 @@
+"""
+InfluxDB line protocol parser shared by ``pipeline.py`` and ``collect_metrics.py``.
+
+Handles the escaping rules of the format (``\\,``, ``\\=`` and ``\\ `` in
+measurement names and tags, quoted string fields) so interface names such as
+``GigabitEthernet0/0\\ uplink`` survive. Lines without quoted string fields, which
+is nearly all SNMP output, go through a ``str.split`` fast path; only quoted
+strings need the compiled regular expressions.
+"""
+
+import re
+
+__all__ = ["Metric", "parse_line", "parse_lines"]
+
+_TRUE = frozenset(("t", "T", "true", "True", "TRUE"))
+_FALSE = frozenset(("f", "F", "false", "False", "FALSE"))
+
+
+class Metric:
+    """One parsed line: measurement, tags, fields and optional timestamp (ns)."""
+
+    __slots__ = ("measurement", "tags", "fields", "timestamp")
+
+    def __init__(self, measurement, tags, fields, timestamp):
+        self.measurement = measurement
+        self.tags = tags
+        self.fields = fields
+        self.timestamp = timestamp
+
+    def __repr__(self):
+        return (f"Metric({self.measurement!r}, tags={self.tags!r}, "
+                f"fields={self.fields!r}, timestamp={self.timestamp!r})")
+
+
+def _field_value(raw):
+    last = raw[-1]
+    if last == "i" or last == "u":
+        return int(raw[:-1])
+    if raw[0] == '"':
+        return raw[1:-1].replace('\\"', '"').replace("\\\\", "\\")
+    if raw in _TRUE:
+        return True
+    if raw in _FALSE:
+        return False
+    return float(raw)
+
+
+# Compiled once: tokens made of plain characters, escape pairs or quoted strings
+_SECTION_RE = re.compile(r'(?:[^ "\\]|\\.|"(?:[^"\\]|\\.)*")+')
+_ITEM_RE = re.compile(r'(?:[^,"\\]|\\.|"(?:[^"\\]|\\.)*")+')
+_EQUALS_RE = re.compile(r'(?<!\\)=')
+_UNESCAPE_RE = re.compile(r'\\([, =\\])')
+
+
+def _unescape(text):
+    if "\\" not in text:
+        return text
+    return _UNESCAPE_RE.sub(r"\1", text)
+
+
+def _parse_slow(line):
+    sections = _SECTION_RE.findall(line)
+    if len(sections) < 2:
+        return None
+    series = _ITEM_RE.findall(sections[0])
+    tags = {}
+    for item in series[1:]:
+        key_value = _EQUALS_RE.split(item, 1)
+        if len(key_value) == 2:
+            tags[_unescape(key_value[0])] = _unescape(key_value[1])
+    fields = {}
+    for item in _ITEM_RE.findall(sections[1]):
+        key_value = _EQUALS_RE.split(item, 1)
+        if len(key_value) == 2 and key_value[1]:
+            fields[_unescape(key_value[0])] = _field_value(key_value[1])
+    timestamp = int(sections[2]) if len(sections) > 2 else None
+    return Metric(_unescape(series[0]), tags, fields, timestamp)
+
+
+# Escaped separators are swapped for control characters so that escaped lines
+# can still use the split fast path, then swapped back in names and tags.
+_ESCAPES = (("\\\\", "\x03"), ("\\ ", "\x00"), ("\\,", "\x01"), ("\\=", "\x02"))
+_RESTORE = str.maketrans({"\x00": " ", "\x01": ",", "\x02": "=", "\x03": "\\"})
+
+
+def _parse_split(line, escaped):
+    sections = line.split(" ")
+    if len(sections) < 2:
+        return None
+    series = sections[0].split(",")
+    tags = {}
+    for item in series[1:]:
+        key, _, value = item.partition("=")
+        if escaped:
+            key, value = key.translate(_RESTORE), value.translate(_RESTORE)
+        tags[key] = value
+    fields = {}
+    for item in sections[1].split(","):
+        key, _, value = item.partition("=")
+        if value:
+            fields[key.translate(_RESTORE) if escaped else key] = _field_value(value)
+    timestamp = int(sections[2]) if len(sections) > 2 and sections[2] else None
+    measurement = series[0].translate(_RESTORE) if escaped else series[0]
+    return Metric(measurement, tags, fields, timestamp)
+
+
+def parse_line(line):
+    """Parse a single line, returning a :class:`Metric` or ``None``."""
+    if line.startswith("> "):
+        line = line[2:]
+    line = line.rstrip("\r\n")
+    if not line or line[0] == "#":
+        return None
+    try:
+        if '"' in line:
+            return _parse_slow(line)
+        if "\\" in line:
+            for escape, placeholder in _ESCAPES:
+                line = line.replace(escape, placeholder)
+            return _parse_split(line, True)
+        return _parse_split(line, False)
+    except ValueError:
+        return None
+
+
+def parse_lines(lines):
+    """Yield a :class:`Metric` for every parsable line of ``lines``."""
+    if isinstance(lines, str):
+        lines = lines.splitlines()
+    for line in lines:
+        metric = parse_line(line)
+        if metric is not None:
+            yield metric
@@ -0,0 +1,124 @@
+"""
+Declarative measurement/field mapping for the collection pipeline.
+
+``measurements.toml`` lists, for each Telegraf measurement, the fields to
+keep with their type and unit conversion. The file is compiled once into a
+dict of converters, so mapping a parsed line is one dict lookup followed by
+a loop over prebuilt ``(name, source, convert)`` tuples.
+"""
+
+import functools
+import os
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11 (image almalinux:9)
+    import tomli as tomllib
+
+# Tags copied as-is into every entry when present (set by the router scheduler)
+PASSTHROUGH_TAGS = ("router",)
+
+DEFAULT_MAPPING = os.path.join(os.path.dirname(os.path.abspath(__file__)), "measurements.toml")
+
+_TYPES = {"float": float, "int": int, "str": str}
+
+
+class MeasurementSpec:
+    """Compiled mapping for one measurement."""
+
+    __slots__ = ("name", "fields", "key_tag", "key_name", "drop_if_empty")
+
+    def __init__(self, name, fields, key_tag=None, key_name=None, drop_if_empty=False):
+        self.name = name
+        self.fields = fields
+        self.key_tag = key_tag
+        self.key_name = key_name
+        self.drop_if_empty = drop_if_empty
+
+
+def _converter(spec):
+    if isinstance(spec, str):
+        spec = {"type": spec}
+    cast = _TYPES[spec.get("type", "float")]
+    scale = spec.get("scale")
+    digits = spec.get("round")
+
+    if scale is None and digits is None:
+        return cast
+    if scale is None:
+        return lambda value: round(cast(value), digits)
+    if digits is None:
+        return lambda value: cast(value) * scale
+    return lambda value: round(cast(value) * scale, digits)
+
+
+def compile_mapping(config):
+    """Turn the parsed TOML document into ``{measurement: MeasurementSpec}``."""
+    table = {}
+    for measurement, options in config.items():
+        fields = tuple(
+            (name, (spec.get("source", name) if isinstance(spec, dict) else name), _converter(spec))
+            for name, spec in options.get("fields", {}).items()
+        )
+        key = options.get("key_tag")
+        if isinstance(key, str):
+            key = {"tag": key, "as": key}
+        table[measurement] = MeasurementSpec(
+            measurement,
+            fields,
+            key_tag=key["tag"] if key else None,
+            key_name=key["as"] if key else None,
+            drop_if_empty=options.get("drop_if_empty", False),
+        )
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def load_mapping(path=DEFAULT_MAPPING):
+    with open(path, "rb") as f:
+        return compile_mapping(tomllib.load(f))
+
+
+def map_metrics(metrics, table=None):
+    """
+    Filter parsed :class:`~collector.line_protocol.Metric` records.
+
+    Returns the pipeline entries ``{"measurement", ["interface"], ["router"], "data"}``
+    with ``data`` holding every mapped field (``None`` when absent or not
+    convertible) plus the line ``timestamp``.
+    """
+    if table is None:
+        table = load_mapping()
+    results = []
+    for metric in metrics:
+        spec = table.get(metric.measurement)
+        if spec is None:
+            continue
+        if spec.key_tag is not None and spec.key_tag not in metric.tags:
+            continue
+
+        fields = metric.fields
+        data = {}
+        present = False
+        for name, source, convert in spec.fields:
+            value = fields.get(source)
+            if value is not None:
+                try:
+                    value = convert(value)
+                    present = True
+                except (TypeError, ValueError):
+                    value = None
+            data[name] = value
+        if spec.drop_if_empty and not present:
+            continue
+        data["timestamp"] = metric.timestamp
+
+        entry = {"measurement": metric.measurement}
+        if spec.key_tag is not None:
+            entry[spec.key_name] = metric.tags[spec.key_tag]
+        for tag in PASSTHROUGH_TAGS:
+            if tag in metric.tags:
+                entry[tag] = metric.tags[tag]
+        entry["data"] = data
+        results.append(entry)
+    return results
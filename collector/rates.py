@@ -0,0 +1,115 @@
+"""
+Counter-to-rate conversion done once, at ingest time.
+
+SNMP interface counters are cumulative. The engine keeps the previous value
+and timestamp of each ``(router, interface, counter)`` in memory and adds
+derived ``in_mbps``, ``out_mbps`` and ``err_rate`` (errors/s) fields to the
+interface entries, so readers only need the last value.
+
+Counter wraps are handled for 32-bit (``ifInOctets``...) and 64-bit
+(``ifHC*``) counters. The boot time of each router (sample time minus
+``uptime``) is kept across batches: a counter whose previous sample predates
+the last boot starts over instead of producing a bogus rate. A delta larger
+than the interface could have carried in the interval (``ifSpeed``) is a
+reset seen before its uptime, not a wrap, and is dropped.
+"""
+
+import time
+
+WRAP_32 = 2 ** 32
+WRAP_64 = 2 ** 64
+
+# derived field -> (counters summed, multiplier applied to the per-second delta)
+DERIVED_FIELDS = {
+    "in_mbps": (("ifInOctets",), 8 / 1_000_000),
+    "out_mbps": (("ifOutOctets",), 8 / 1_000_000),
+    "err_rate": (("ifInErrors", "ifOutErrors"), 1.0),
+}
+
+# Débit supposé quand ifSpeed est absent ou saturé (Gauge32 plafonné à ~4,3 Gb/s)
+MAX_PLAUSIBLE_MBPS = 400_000
+# Marge sur ifSpeed * dt : l'horodatage est celui du collecteur, pas de l'agent
+SPEED_TOLERANCE = 1.2
+# Bits sur le lien par unité comptée : un octet, ou une trame minimale
+# (64 octets + préambule et inter-trame = 84 octets) pour les erreurs
+COUNTER_UNIT_BITS = {
+    "ifInOctets": 8,
+    "ifOutOctets": 8,
+    "ifInErrors": 84 * 8,
+    "ifOutErrors": 84 * 8,
+}
+
+
+class RateEngine:
+    """Turn cumulative interface counters into per-second rates."""
+
+    def __init__(self, derived_fields=None):
+        self.derived_fields = derived_fields or DERIVED_FIELDS
+        self._counters = {}
+        self._boots = {}
+
+    @staticmethod
+    def _delta(field, previous, current):
+        if current >= previous:
+            return current - previous
+        modulus = WRAP_64 if field.startswith("ifHC") or previous >= WRAP_32 else WRAP_32
+        return current + modulus - previous
+
+    @staticmethod
+    def _max_delta(field, speed, seconds):
+        """Largest plausible delta of ``field`` over ``seconds`` on a ``speed`` bit/s link."""
+        if not speed or speed >= WRAP_32 - 1:
+            speed = MAX_PLAUSIBLE_MBPS * 1_000_000
+        return speed * seconds * SPEED_TOLERANCE / COUNTER_UNIT_BITS.get(field, 8)
+
+    def _record_uptime(self, router, uptime, timestamp):
+        # sysUpTime en centisecondes, horodatages en nanosecondes
+        boot = timestamp - int(uptime * 10_000_000)
+        previous = self._boots.get(router)
+        # Une seconde de marge : l'estimation varie avec la latence de collecte
+        if previous is None or boot > previous + 1_000_000_000:
+            self._boots[router] = boot
+
+    def apply(self, entries):
+        """Add the derived rate fields to interface entries, in place."""
+        for entry in entries:
+            if entry["measurement"] == "snmp":
+                uptime = entry["data"].get("uptime")
+                if uptime is not None:
+                    timestamp = entry["data"].get("timestamp") or time.time_ns()
+                    self._record_uptime(entry.get("router"), uptime, timestamp)
+
+        for entry in entries:
+            if entry["measurement"] != "interfaces":
+                continue
+            data = entry["data"]
+            router = entry.get("router")
+            interface = entry.get("interface")
+            timestamp = data.get("timestamp")
+            if timestamp is None:
+                timestamp = time.time_ns()
+            boot = self._boots.get(router)
+
+            rates = {}
+            for field in {f for counters, _ in self.derived_fields.values() for f in counters}:
+                value = data.get(field)
+                if value is None:
+                    continue
+                key = (router, interface, field)
+                previous = self._counters.get(key)
+                self._counters[key] = (value, timestamp)
+                if previous is None or timestamp <= previous[1]:
+                    continue
+                if boot is not None and previous[1] < boot:
+                    continue
+                seconds = (timestamp - previous[1]) / 1e9
+                delta = self._delta(field, previous[0], value)
+                if delta > self._max_delta(field, data.get("ifSpeed"), seconds):
+                    continue
+                rates[field] = delta / seconds
+
+            for name, (counters, multiplier) in self.derived_fields.items():
+                if all(counter in rates for counter in counters):
+                    value = sum(rates[counter] for counter in counters) * multiplier
+                    data[name] = round(value, 3)
+        return entries
@@ -0,0 +1,247 @@
+"""
+Concurrent multi-router collection scheduler.
+
+Every router gets its own asyncio task polling on a fixed cadence, with a
+random start offset (so a fleet does not fire all at once), a per-router
+timeout and a global concurrency cap. A slow or unreachable router only
+ever holds its own slot, until its timeout, and never delays the others.
+
+The scheduler runs its event loop in a background thread and hands parsed
+:class:`~collector.line_protocol.Metric` records (tagged with ``router``)
+to the pipeline in timed batches, like :class:`~collector.telegraf_stream.TelegrafStream`.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import queue
+import random
+import tempfile
+import threading
+import time
+import urllib.request
+
+from collector.instrumentation import LINES_PARSED, POINTS_DROPPED, POLL_DURATION, POLL_FAILURES
+from collector.line_protocol import parse_lines
+
+logger = logging.getLogger(__name__)
+
+ROUTER_TAG = "router"
+
+
+class RouterTarget:
+    __slots__ = ("name", "address")
+
+    def __init__(self, name, address):
+        self.name = name
+        self.address = address
+
+    def __eq__(self, other):
+        return isinstance(other, RouterTarget) and (self.name, self.address) == (other.name, other.address)
+
+    def __hash__(self):
+        return hash((self.name, self.address))
+
+    def __repr__(self):
+        return f"RouterTarget({self.name!r}, {self.address!r})"
+
+
+def routers_from_env(value):
+    """Parse ``"R1=172.16.10.41,R2=10.0.0.2"`` into router targets."""
+    targets = []
+    for item in value.split(","):
+        name, _, address = item.strip().partition("=")
+        if name:
+            targets.append(RouterTarget(name, address or name))
+    return targets
+
+
+def routers_from_url(url, token="", timeout=5.0):
+    """
+    Read the ``Router`` table through the Django app's ``/api/routers/``
+    (``{"routers": [{"name", "address"}]}``); the pipeline image has no Django.
+    """
+    request = urllib.request.Request(url, headers={"Accept": "application/json"})
+    if token:
+        request.add_header("Authorization", f"Bearer {token}")
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        routers = json.load(response)["routers"]
+    return [RouterTarget(item["name"], item["address"]) for item in routers if item.get("address")]
+
+
+class TelegrafPoller:
+    """
+    Poll one router with ``telegraf --test`` on a per-router config.
+
+    The config is ``telegraf.conf`` with its hard-wired agent address
+    replaced by the router's address.
+    """
+
+    def __init__(self, template_path, template_address="172.16.10.41", workdir=None):
+        with open(template_path) as f:
+            self.template = f.read()
+        self.template_address = template_address
+        self.workdir = workdir or tempfile.mkdtemp(prefix="telegraf-routers-")
+        self._configs = {}
+
+    def config_for(self, router):
+        path = self._configs.get(router)
+        if path is None:
+            path = os.path.join(self.workdir, f"{router.name}.conf".replace(os.sep, "_"))
+            with open(path, "w") as f:
+                f.write(self.template.replace(self.template_address, router.address))
+            self._configs[router] = path
+        return path
+
+    async def __call__(self, router, timeout):
+        process = await asyncio.create_subprocess_exec(
+            "telegraf", "--config", self.config_for(router), "--test",
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL,
+            env={**os.environ, "MIBS": ""},
+        )
+        try:
+            stdout, _ = await asyncio.wait_for(process.communicate(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+            raise
+        lines = stdout.decode("utf-8", errors="replace").splitlines()
+        LINES_PARSED.inc(len(lines))
+        return list(parse_lines(lines))
+
+
+class RouterScheduler:
+    """Poll every router concurrently and collect the results."""
+
+    def __init__(self, load_routers, poll, interval=5.0, timeout=4.0,
+                 max_concurrency=32, refresh_interval=60.0, max_pending=100000):
+        self.load_routers = load_routers
+        self.poll = poll
+        self.interval = interval
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.refresh_interval = refresh_interval
+        self.results = queue.Queue(maxsize=max_pending)
+        self.stats = {"polls": 0, "timeouts": 0, "errors": 0, "overruns": 0, "dropped": 0}
+        self.last_poll_seconds = {}
+        self._tasks = {}
+        self._loop = None
+        self._thread = None
+        self._stopping = threading.Event()
+
+    # -- lifecycle ----------------------------------------------------------
+
+    def start(self):
+        self._stopping.clear()
+        self._thread = threading.Thread(target=self._run, name="router-scheduler", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(lambda: None)
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+            self._thread = None
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        try:
+            self._loop.run_until_complete(self._main())
+        finally:
+            self._loop.close()
+            self._loop = None
+
+    async def _main(self):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        while not self._stopping.is_set():
+            try:
+                routers = set(await asyncio.to_thread(self.load_routers))
+            except Exception as e:
+                logger.error("Chargement des routeurs impossible: %s", e)
+                routers = set(self._tasks)
+
+            for router in list(self._tasks):
+                if router not in routers:
+                    self._tasks.pop(router).cancel()
+            for router in routers:
+                if router not in self._tasks:
+                    self._tasks[router] = asyncio.create_task(self._router_loop(router, semaphore))
+
+            deadline = time.monotonic() + self.refresh_interval
+            while not self._stopping.is_set() and time.monotonic() < deadline:
+                await asyncio.sleep(0.5)
+
+        for task in self._tasks.values():
+            task.cancel()
+        await asyncio.gather(*self._tasks.values(), return_exceptions=True)
+        self._tasks.clear()
+
+    # -- per-router loop ----------------------------------------------------
+
+    async def _router_loop(self, router, semaphore):
+        # Jittered start spreads the fleet over one interval
+        await asyncio.sleep(random.uniform(0, self.interval))
+        next_due = time.monotonic()
+        while not self._stopping.is_set():
+            await self._poll_once(router, semaphore)
+            next_due += self.interval
+            now = time.monotonic()
+            if next_due <= now:
+                # The poll overran its slot: skip the missed samples
+                self.stats["overruns"] += 1
+                next_due = now + self.interval
+            await asyncio.sleep(next_due - now)
+
+    async def _poll_once(self, router, semaphore):
+        async with semaphore:
+            started = time.monotonic()
+            try:
+                metrics = await asyncio.wait_for(self.poll(router, self.timeout), self.timeout)
+            except asyncio.TimeoutError:
+                self.stats["timeouts"] += 1
+                POLL_FAILURES.inc(router=router.name, reason="timeout")
+                logger.warning("Routeur %s: pas de réponse en %.1fs", router.name, self.timeout)
+                return
+            except Exception as e:
+                self.stats["errors"] += 1
+                POLL_FAILURES.inc(router=router.name, reason="error")
+                logger.warning("Routeur %s: échec de collecte (%s)", router.name, e)
+                return
+            finally:
+                elapsed = time.monotonic() - started
+                self.last_poll_seconds[router.name] = elapsed
+                POLL_DURATION.observe(elapsed, router=router.name)
+        self.stats["polls"] += 1
+
+        for metric in metrics:
+            metric.tags[ROUTER_TAG] = router.name
+        try:
+            self.results.put_nowait(metrics)
+        except queue.Full:
+            self.stats["dropped"] += len(metrics)
+            POINTS_DROPPED.inc(len(metrics), reason="queue_full")
+
+    # -- consumer side ------------------------------------------------------
+
+    def batches(self, interval=None):
+        """Yield the metrics collected during each ``interval`` window."""
+        interval = interval or self.interval
+        deadline = time.monotonic() + interval
+        while not self._stopping.is_set():
+            batch = []
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.extend(self.results.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            yield batch
+            deadline += interval
+            now = time.monotonic()
+            if deadline <= now:
+                deadline = now + interval
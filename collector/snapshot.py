@@ -0,0 +1,87 @@
+"""
+Latest-value snapshot shared between the pipeline and the Django dashboard.
+
+The pipeline keeps the last value of every ``router/measurement/field`` in
+memory and, once per cycle, serialises it compactly to a temporary file
+that atomically replaces the snapshot (``os.replace``). Readers therefore
+never see a half-written file; they memory-map the current one and only
+re-decode it when its inode or mtime changes, so repeated reads cost a
+``stat`` call.
+
+Layout::
+
+    {"updated_at": <ns>, "routers": {<router>: {
+        "snmp": {"cpu_5min": 9.0, ..., "timestamp": <ns>},
+        "interfaces": {"GigabitEthernet0/0": {"in_mbps": 1.2, ...}}, ...}}}
+"""
+
+import json
+import mmap
+import os
+import threading
+import time
+
+DEFAULT_PATH = os.getenv("METRICS_SNAPSHOT_PATH", "/tmp/metrics/latest_metrics.snap")
+DEFAULT_ROUTER = "default"
+
+
+class SnapshotWriter:
+    """Merge pipeline entries into the latest state and publish it atomically."""
+
+    def __init__(self, path=DEFAULT_PATH):
+        self.path = path
+        self.routers = {}
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+    def update(self, entries):
+        for entry in entries:
+            router = self.routers.setdefault(entry.get("router") or DEFAULT_ROUTER, {})
+            values = {k: v for k, v in entry["data"].items() if v is not None}
+            measurement = entry["measurement"]
+            if "interface" in entry:
+                router.setdefault(measurement, {}).setdefault(entry["interface"], {}).update(values)
+            else:
+                router.setdefault(measurement, {}).update(values)
+
+    def publish(self):
+        payload = json.dumps(
+            {"updated_at": time.time_ns(), "routers": self.routers},
+            separators=(",", ":"),
+        ).encode("utf-8")
+        tmp = f"{self.path}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+        os.replace(tmp, self.path)
+
+
+_cache_lock = threading.Lock()
+_cache = {}
+
+
+def read_snapshot(path=DEFAULT_PATH):
+    """Return the decoded snapshot, or ``None`` if none was published yet."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+    cached = _cache.get(path)
+    if cached is not None and cached[0] == signature:
+        return cached[1]
+
+    with _cache_lock:
+        try:
+            with open(path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    snapshot = json.loads(mapped[:])
+        except (OSError, ValueError):
+            return None
+        _cache[path] = (signature, snapshot)
+        return snapshot
+
+
+def snapshot_age_seconds(snapshot):
+    return (time.time_ns() - snapshot.get("updated_at", 0)) / 1e9
@@ -0,0 +1,384 @@
+"""
+Native asyncio SNMP v2c poller, an alternative to running Telegraf.
+
+Polls the scalar fields and tables declared under ``[[inputs.snmp]]`` in
+``telegraf.conf`` (uptime, cpu_5min, cpu_0_usage, ram_used, ram_free, the
+interfaces table...) and returns the same
+:class:`~collector.line_protocol.Metric` records Telegraf would have printed,
+so the rest of the pipeline is unchanged. Scalars are read with one GET,
+tables with GETBULK, and every agent is multiplexed over a single UDP socket
+keyed by request id.
+
+Any SNMP agent works for testing, including a local simulator such as
+``snmpsim``: give the router address as ``host:port``.
+"""
+
+import asyncio
+import itertools
+import logging
+import random
+import time
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11 (image almalinux:9)
+    import tomli as tomllib
+
+from collector.line_protocol import Metric
+
+logger = logging.getLogger(__name__)
+
+SNMP_VERSION_2C = 1
+
+# ASN.1 / SNMP tags
+_INTEGER = 0x02
+_OCTET_STRING = 0x04
+_NULL = 0x05
+_OID = 0x06
+_SEQUENCE = 0x30
+_IP_ADDRESS = 0x40
+_COUNTER32 = 0x41
+_GAUGE32 = 0x42
+_TIMETICKS = 0x43
+_OPAQUE = 0x44
+_COUNTER64 = 0x46
+_NO_SUCH_OBJECT = 0x80
+_NO_SUCH_INSTANCE = 0x81
+_END_OF_MIB_VIEW = 0x82
+_GET_REQUEST = 0xA0
+_RESPONSE = 0xA2
+_GET_BULK_REQUEST = 0xA5
+
+_UNSIGNED = (_COUNTER32, _GAUGE32, _TIMETICKS, _COUNTER64)
+_NO_VALUE = (_NO_SUCH_OBJECT, _NO_SUCH_INSTANCE, _END_OF_MIB_VIEW)
+
+# endOfMibView marker in decoded varbinds: a unique object, never a real value
+_END = object()
+
+
+class SnmpError(Exception):
+    pass
+
+
+# -- BER encoding -----------------------------------------------------------
+
+def _encode_length(length):
+    if length < 0x80:
+        return bytes((length,))
+    payload = length.to_bytes((length.bit_length() + 7) // 8, "big")
+    return bytes((0x80 | len(payload),)) + payload
+
+
+def _tlv(tag, payload):
+    return bytes((tag,)) + _encode_length(len(payload)) + payload
+
+
+def _encode_integer(value):
+    length = max(1, (value + (value < 0)).bit_length() // 8 + 1)
+    return _tlv(_INTEGER, value.to_bytes(length, "big", signed=True))
+
+
+def _encode_oid(oid):
+    parts = [int(part) for part in oid.strip(".").split(".")]
+    payload = bytearray((parts[0] * 40 + parts[1],))
+    for part in parts[2:]:
+        chunk = [part & 0x7F]
+        part >>= 7
+        while part:
+            chunk.append(0x80 | (part & 0x7F))
+            part >>= 7
+        payload.extend(reversed(chunk))
+    return _tlv(_OID, bytes(payload))
+
+
+def encode_request(pdu_type, request_id, community, oids, non_repeaters=0, max_repetitions=0):
+    """Build a v2c GET (``error`` fields 0) or GETBULK message."""
+    varbinds = b"".join(_tlv(_SEQUENCE, _encode_oid(oid) + _tlv(_NULL, b"")) for oid in oids)
+    pdu = _tlv(
+        pdu_type,
+        _encode_integer(request_id)
+        + _encode_integer(non_repeaters)
+        + _encode_integer(max_repetitions)
+        + _tlv(_SEQUENCE, varbinds),
+    )
+    return _tlv(
+        _SEQUENCE,
+        _encode_integer(SNMP_VERSION_2C) + _tlv(_OCTET_STRING, community.encode()) + pdu,
+    )
+
+
+# -- BER decoding -----------------------------------------------------------
+
+def _read_tlv(data, offset):
+    tag = data[offset]
+    length = data[offset + 1]
+    offset += 2
+    if length & 0x80:
+        size = length & 0x7F
+        length = int.from_bytes(data[offset:offset + size], "big")
+        offset += size
+    return tag, data[offset:offset + length], offset + length
+
+
+def _decode_oid(payload):
+    first = payload[0]
+    parts = [first // 40, first % 40]
+    value = 0
+    for byte in payload[1:]:
+        value = (value << 7) | (byte & 0x7F)
+        if not byte & 0x80:
+            parts.append(value)
+            value = 0
+    return ".".join(map(str, parts))
+
+
+def _decode_value(tag, payload):
+    if tag == _INTEGER:
+        return int.from_bytes(payload, "big", signed=True)
+    if tag in _UNSIGNED:
+        return int.from_bytes(payload, "big")
+    if tag == _OCTET_STRING or tag == _OPAQUE:
+        return payload.decode("utf-8", errors="replace")
+    if tag == _IP_ADDRESS:
+        return ".".join(map(str, payload))
+    if tag == _OID:
+        return _decode_oid(payload)
+    return None
+
+
+def decode_response(data):
+    """Return ``(request_id, error_status, [(oid, value), ...])``."""
+    _, message, _ = _read_tlv(data, 0)
+    _, _, offset = _read_tlv(message, 0)           # version
+    _, _, offset = _read_tlv(message, offset)      # community
+    pdu_type, pdu, _ = _read_tlv(message, offset)
+    if pdu_type != _RESPONSE:
+        raise SnmpError(f"unexpected PDU type 0x{pdu_type:02x}")
+
+    _, raw_id, offset = _read_tlv(pdu, 0)
+    _, raw_status, offset = _read_tlv(pdu, offset)
+    _, _, offset = _read_tlv(pdu, offset)          # error index
+    _, varbind_list, _ = _read_tlv(pdu, offset)
+
+    varbinds = []
+    offset = 0
+    while offset < len(varbind_list):
+        _, varbind, offset = _read_tlv(varbind_list, offset)
+        _, raw_oid, value_offset = _read_tlv(varbind, 0)
+        value_tag, raw_value, _ = _read_tlv(varbind, value_offset)
+        if value_tag == _END_OF_MIB_VIEW:
+            varbinds.append((_decode_oid(raw_oid), _END))
+        elif value_tag in _NO_VALUE:
+            varbinds.append((_decode_oid(raw_oid), None))
+        else:
+            varbinds.append((_decode_oid(raw_oid), _decode_value(value_tag, raw_value)))
+    return (
+        int.from_bytes(raw_id, "big", signed=True),
+        int.from_bytes(raw_status, "big"),
+        varbinds,
+    )
+
+
+# -- transport --------------------------------------------------------------
+
+class SnmpTransport(asyncio.DatagramProtocol):
+    """One UDP socket shared by every agent; replies matched by request id."""
+
+    def __init__(self):
+        self.transport = None
+        self._pending = {}
+        self._ids = itertools.count(random.randint(1, 1 << 30))
+
+    @classmethod
+    async def open(cls, local_addr=("0.0.0.0", 0)):
+        loop = asyncio.get_running_loop()
+        _, protocol = await loop.create_datagram_endpoint(cls, local_addr=local_addr)
+        return protocol
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        try:
+            request_id, status, varbinds = decode_response(data)
+        except (IndexError, ValueError, SnmpError) as e:
+            logger.debug("Réponse SNMP illisible de %s: %s", addr, e)
+            return
+        future = self._pending.pop(request_id, None)
+        if future is not None and not future.done():
+            future.set_result((status, varbinds))
+
+    def close(self):
+        if self.transport is not None:
+            self.transport.close()
+
+    async def request(self, address, pdu_type, community, oids, timeout, retries,
+                      non_repeaters=0, max_repetitions=0):
+        loop = asyncio.get_running_loop()
+        for attempt in range(retries + 1):
+            request_id = next(self._ids) & 0x7FFFFFFF
+            future = loop.create_future()
+            self._pending[request_id] = future
+            self.transport.sendto(
+                encode_request(pdu_type, request_id, community, oids, non_repeaters, max_repetitions),
+                address,
+            )
+            try:
+                status, varbinds = await asyncio.wait_for(future, timeout)
+            except asyncio.TimeoutError:
+                continue
+            finally:
+                self._pending.pop(request_id, None)
+            if status:
+                raise SnmpError(f"error-status {status} from {address[0]}")
+            return varbinds
+        raise asyncio.TimeoutError(f"no SNMP response from {address[0]}")
+
+
+# -- poller -----------------------------------------------------------------
+
+def _seconds(duration, default):
+    if isinstance(duration, (int, float)):
+        return float(duration)
+    if isinstance(duration, str) and duration.endswith("ms"):
+        return float(duration[:-2]) / 1000
+    if isinstance(duration, str) and duration.endswith("s"):
+        return float(duration[:-1])
+    return default
+
+
+class SnmpPoller:
+    """Poll routers for the ``[[inputs.snmp]]`` fields of telegraf.conf."""
+
+    def __init__(self, fields, tables, community="public", timeout=5.0, retries=1,
+                 max_repetitions=10, port=161):
+        self.fields = fields          # [(name, oid, is_tag)]
+        self.tables = tables          # [(measurement, inherit_tags, [(name, oid, is_tag)])]
+        self.community = community
+        self.request_timeout = timeout
+        self.retries = retries
+        self.max_repetitions = max_repetitions
+        self.port = port
+        self._transport = None
+
+    @classmethod
+    def from_telegraf_config(cls, path, **overrides):
+        with open(path, "rb") as f:
+            snmp = tomllib.load(f)["inputs"]["snmp"][0]
+
+        fields = [(f["name"], f["oid"].strip("."), f.get("is_tag", False)) for f in snmp.get("field", [])]
+        tables = [
+            (
+                table.get("name_override") or table["name"],
+                table.get("inherit_tags", []),
+                [(f["name"], f["oid"].strip("."), f.get("is_tag", False)) for f in table.get("field", [])],
+            )
+            for table in snmp.get("table", [])
+        ]
+        options = {
+            "community": snmp.get("community", "public"),
+            "timeout": _seconds(snmp.get("timeout"), 5.0),
+            "retries": snmp.get("retries", 1),
+            "max_repetitions": snmp.get("max_repetitions", 10),
+        }
+        options.update(overrides)
+        return cls(fields, tables, **options)
+
+    async def _request(self, address, pdu_type, oids, deadline=None, **kwargs):
+        if self._transport is None:
+            # Shared by every concurrent poll: open the socket only once
+            self._transport = asyncio.ensure_future(SnmpTransport.open())
+        transport = await self._transport
+        timeout = self.request_timeout
+        if deadline is not None:
+            # Every try of this request must end before the poll deadline
+            remaining = deadline - asyncio.get_running_loop().time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError(f"poll deadline exceeded for {address[0]}")
+            timeout = min(timeout, remaining / (self.retries + 1))
+        return await transport.request(
+            address, pdu_type, self.community, oids,
+            timeout, self.retries, **kwargs
+        )
+
+    def _address(self, router):
+        host, _, port = router.address.partition(":")
+        return host, int(port) if port else self.port
+
+    async def _walk_columns(self, address, columns, deadline=None):
+        """GETBULK every column of a table at once; returns {column_oid: {index: value}}."""
+        values = {oid: {} for oid in columns}
+        cursors = {oid: oid for oid in columns}
+        while cursors:
+            bases = list(cursors)
+            varbinds = await self._request(
+                address, _GET_BULK_REQUEST, [cursors[base] for base in bases],
+                deadline=deadline, max_repetitions=self.max_repetitions,
+            )
+            finished = set()
+            # GETBULK answers are interleaved: row 0 of every column, row 1...
+            for position, (oid, value) in enumerate(varbinds):
+                base = bases[position % len(bases)]
+                if base in finished:
+                    continue
+                if value is _END or not oid.startswith(base + "."):
+                    finished.add(base)
+                    continue
+                values[base][oid[len(base) + 1:]] = value
+                cursors[base] = oid
+            if not varbinds:
+                finished.update(bases)
+            for base in finished:
+                cursors.pop(base, None)
+        return values
+
+    async def __call__(self, router, timeout=None):
+        """Poll one router; ``timeout`` (seconds) bounds the whole poll, every request included."""
+        address = self._address(router)
+        deadline = None
+        if timeout:
+            deadline = asyncio.get_running_loop().time() + timeout
+        now = time.time_ns()
+        metrics = []
+
+        scalar_tags = {"agent_host": address[0]}
+        scalar_fields = {}
+        if self.fields:
+            names = {oid: (name, is_tag) for name, oid, is_tag in self.fields}
+            varbinds = await self._request(address, _GET_REQUEST, list(names), deadline=deadline)
+            for oid, value in varbinds:
+                if value is None or oid not in names:
+                    continue
+                name, is_tag = names[oid]
+                if is_tag:
+                    scalar_tags[name] = str(value)
+                else:
+                    scalar_fields[name] = value
+            if scalar_fields:
+                metrics.append(Metric("snmp", dict(scalar_tags), scalar_fields, now))
+
+        for measurement, inherit_tags, columns in self.tables:
+            walked = await self._walk_columns(address, [oid for _, oid, _ in columns], deadline)
+            rows = {}
+            for name, oid, is_tag in columns:
+                for index, value in walked[oid].items():
+                    row = rows.setdefault(index, ({"agent_host": address[0]}, {}))
+                    if value is None:
+                        continue
+                    if is_tag:
+                        row[0][name] = str(value)
+                    else:
+                        row[1][name] = value
+            for tags, fields in rows.values():
+                if not fields:
+                    continue
+                for tag in inherit_tags:
+                    if tag in scalar_tags:
+                        tags[tag] = scalar_tags[tag]
+                metrics.append(Metric(measurement, tags, fields, now))
+        return metrics
+
+    def close(self):
+        if self._transport is not None and self._transport.done() and not self._transport.exception():
+            self._transport.result().close()
+        self._transport = None
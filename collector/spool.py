@@ -0,0 +1,214 @@
+"""
+Append-only, segment-rotated on-disk spool for points InfluxDB did not accept.
+
+Failed batches are appended as line protocol to ``seg-<n>.lp`` files (one
+fsync per append). A background drainer replays them oldest-first at a
+bounded rate and records its progress in a checkpoint file, so a restart
+resumes where it left off. Disk usage is capped: when the spool grows past
+``max_bytes`` the oldest segments are evicted.
+"""
+
+import logging
+import os
+import threading
+import time
+
+from collector.instrumentation import POINTS_DROPPED
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "seg-"
+SEGMENT_SUFFIX = ".lp"
+CHECKPOINT_FILE = "drain.offset"
+
+
+class Spool:
+    """Durable FIFO of line protocol strings split across segment files."""
+
+    def __init__(self, directory, segment_bytes=8 * 1024 * 1024,
+                 max_bytes=512 * 1024 * 1024):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.max_bytes = max_bytes
+        self.evicted_lines = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._segments = sorted(
+            int(name[len(SEGMENT_PREFIX):-len(SEGMENT_SUFFIX)])
+            for name in os.listdir(directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(SEGMENT_SUFFIX)
+        )
+        self._read_segment, self._read_offset = self._load_checkpoint()
+
+    # -- paths / checkpoint -------------------------------------------------
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"{SEGMENT_PREFIX}{segment:08d}{SEGMENT_SUFFIX}")
+
+    def _load_checkpoint(self):
+        try:
+            with open(os.path.join(self.directory, CHECKPOINT_FILE)) as f:
+                segment, offset = f.read().split()
+            segment, offset = int(segment), int(offset)
+        except (OSError, ValueError):
+            return (self._segments[0] if self._segments else 0), 0
+        if segment not in self._segments:
+            return (self._segments[0] if self._segments else 0), 0
+        return segment, offset
+
+    def _save_checkpoint(self):
+        path = os.path.join(self.directory, CHECKPOINT_FILE)
+        tmp = path + ".tmp"
+        with open(tmp, "w") as f:
+            f.write(f"{self._read_segment} {self._read_offset}")
+        os.replace(tmp, path)
+
+    # -- writing ------------------------------------------------------------
+
+    def append(self, lines):
+        """Durably append line protocol strings to the active segment."""
+        if not lines:
+            return
+        payload = ("\n".join(lines) + "\n").encode("utf-8")
+        with self._lock:
+            if not self._segments:
+                self._segments.append(self._read_segment or 1)
+                self._read_segment, self._read_offset = self._segments[0], 0
+            active = self._path(self._segments[-1])
+            if os.path.exists(active) and os.path.getsize(active) >= self.segment_bytes:
+                self._segments.append(self._segments[-1] + 1)
+                active = self._path(self._segments[-1])
+            with open(active, "ab") as f:
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            self._evict()
+
+    def _evict(self):
+        while len(self._segments) > 1 and self._size() > self.max_bytes:
+            oldest = self._segments.pop(0)
+            path = self._path(oldest)
+            try:
+                with open(path, "rb") as f:
+                    evicted = f.read().count(b"\n")
+                os.remove(path)
+                self.evicted_lines += evicted
+                POINTS_DROPPED.inc(evicted, reason="spool_evicted")
+            except OSError:
+                pass
+            logger.warning("Spool plein: segment %s supprimé", oldest)
+            if self._read_segment == oldest:
+                self._read_segment, self._read_offset = self._segments[0], 0
+                self._save_checkpoint()
+
+    def _size(self):
+        total = 0
+        for segment in self._segments:
+            try:
+                total += os.path.getsize(self._path(segment))
+            except OSError:
+                pass
+        return total
+
+    # -- reading ------------------------------------------------------------
+
+    def pending_bytes(self):
+        """Bytes not yet replayed (0 means the spool is empty)."""
+        with self._lock:
+            if not self._segments:
+                return 0
+            return max(self._size() - self._consumed_in_live_segments(), 0)
+
+    def _consumed_in_live_segments(self):
+        return self._read_offset if self._read_segment in self._segments else 0
+
+    def read(self, max_lines=1000):
+        """
+        Return ``(lines, token)`` from the oldest unread position.
+
+        ``token`` must be passed to :meth:`commit` once the lines have been
+        written successfully; nothing is consumed until then.
+        """
+        with self._lock:
+            while self._segments:
+                segment, offset = self._read_segment, self._read_offset
+                lines = []
+                try:
+                    with open(self._path(segment), "rb") as f:
+                        f.seek(offset)
+                        while len(lines) < max_lines:
+                            raw = f.readline()
+                            # Ignore a torn trailing write until it is complete
+                            if not raw.endswith(b"\n"):
+                                break
+                            offset += len(raw)
+                            if raw.strip():
+                                lines.append(raw.decode("utf-8").rstrip("\n"))
+                except FileNotFoundError:
+                    pass
+                if lines:
+                    return lines, (segment, offset)
+                if segment == self._segments[-1]:
+                    return [], None
+                # Segment exhausted and no longer active: drop it
+                self._segments.remove(segment)
+                try:
+                    os.remove(self._path(segment))
+                except OSError:
+                    pass
+                self._read_segment, self._read_offset = self._segments[0], 0
+                self._save_checkpoint()
+            return [], None
+
+    def commit(self, token):
+        segment, offset = token
+        with self._lock:
+            # The segment may have been evicted while the lines were in flight
+            if segment != self._read_segment or segment not in self._segments:
+                return
+            self._read_offset = offset
+            self._save_checkpoint()
+
+
+class SpoolDrainer(threading.Thread):
+    """Replay spooled lines at a bounded rate, backing off on failure."""
+
+    def __init__(self, spool, write_lines, chunk_lines=1000,
+                 max_lines_per_second=20000, idle_interval=1.0, max_backoff=30.0):
+        super().__init__(name="spool-drainer", daemon=True)
+        self.spool = spool
+        self.write_lines = write_lines
+        self.chunk_lines = chunk_lines
+        self.max_lines_per_second = max_lines_per_second
+        self.idle_interval = idle_interval
+        self.max_backoff = max_backoff
+        self.replayed_lines = 0
+        self._stopping = threading.Event()
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        self.join(timeout=timeout)
+
+    def run(self):
+        backoff = self.idle_interval
+        while not self._stopping.is_set():
+            lines, token = self.spool.read(self.chunk_lines)
+            if not lines:
+                self._stopping.wait(self.idle_interval)
+                continue
+            started = time.monotonic()
+            try:
+                self.write_lines(lines)
+            except Exception as e:
+                logger.warning("Rejeu du spool échoué (%s), nouvel essai dans %.1fs", e, backoff)
+                self._stopping.wait(backoff)
+                backoff = min(backoff * 2, self.max_backoff)
+                continue
+            backoff = self.idle_interval
+            self.spool.commit(token)
+            self.replayed_lines += len(lines)
+            # Rate limit so a recovering InfluxDB is not flooded
+            budget = len(lines) / self.max_lines_per_second
+            elapsed = time.monotonic() - started
+            if budget > elapsed:
+                self._stopping.wait(budget - elapsed)
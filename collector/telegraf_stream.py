@@ -0,0 +1,170 @@
+"""
+Long-lived Telegraf process that streams line protocol on stdout.
+
+Instead of forking ``telegraf --test`` on every cycle (config parsing, MIB
+loading and SNMP session setup each time), a single Telegraf child runs with
+only its ``outputs.file`` (stdout) enabled. A reader thread pushes each line
+into a bounded queue: when the consumer falls behind the queue fills, the
+reader blocks, the pipe buffer fills and Telegraf itself is throttled.
+Telegraf's own log (stderr) is forwarded to this module's logger by a
+second reader thread. If the child dies it is restarted with exponential
+backoff.
+
+The agent ``interval`` and ``flush_interval`` of ``telegraf.conf`` read
+``${TELEGRAF_INTERVAL:-15s}``: the child is started with that variable set
+to the batch window, so each window holds at most one collection per
+interval, collection jitter permitting.
+"""
+
+import logging
+import os
+import queue
+import subprocess
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Niveau des lignes de log Telegraf ("2024-01-01T00:00:00Z E! [inputs.snmp] ...")
+TELEGRAF_LOG_LEVELS = {"E!": logging.ERROR, "W!": logging.WARNING, "I!": logging.INFO, "D!": logging.DEBUG}
+
+
+class TelegrafStream:
+    """Run Telegraf continuously and hand out its output in timed batches."""
+
+    def __init__(self, config_path, interval=None, max_pending_lines=50000,
+                 restart_backoff=1.0, max_restart_backoff=60.0):
+        self.config_path = config_path
+        self.interval = interval
+        self.restart_backoff = restart_backoff
+        self.max_restart_backoff = max_restart_backoff
+        self.lines = queue.Queue(maxsize=max_pending_lines)
+        self.restarts = 0
+        self._process = None
+        self._stopping = threading.Event()
+        self._supervisor = None
+
+    def command(self):
+        """Telegraf command line: no --test, only the stdout output plugin."""
+        return [
+            "telegraf",
+            "--config", self.config_path,
+            "--output-filter", "file",
+        ]
+
+    def start(self):
+        if self._supervisor is not None:
+            return
+        self._stopping.clear()
+        self._supervisor = threading.Thread(
+            target=self._supervise, name="telegraf-stream", daemon=True
+        )
+        self._supervisor.start()
+
+    def stop(self, timeout=5.0):
+        self._stopping.set()
+        process = self._process
+        if process is not None and process.poll() is None:
+            process.terminate()
+            try:
+                process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if self._supervisor is not None:
+            self._supervisor.join(timeout=timeout)
+            self._supervisor = None
+
+    def environment(self):
+        env = {**os.environ, "MIBS": ""}
+        if self.interval:
+            env["TELEGRAF_INTERVAL"] = f"{self.interval:g}s"
+        return env
+
+    def _spawn(self):
+        return subprocess.Popen(
+            self.command(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1,
+            env=self.environment(),
+        )
+
+    def _supervise(self):
+        backoff = self.restart_backoff
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                self._process = self._spawn()
+            except OSError as e:
+                logger.error("Impossible de lancer Telegraf: %s", e)
+            else:
+                logger.info("Telegraf démarré (pid %s)", self._process.pid)
+                stderr_reader = threading.Thread(
+                    target=self._log_stderr, args=(self._process,), name="telegraf-stderr", daemon=True
+                )
+                stderr_reader.start()
+                self._pump(self._process)
+                code = self._process.wait()
+                stderr_reader.join(timeout=1.0)
+                if self._stopping.is_set():
+                    break
+                logger.warning("Telegraf s'est arrêté (code %s), redémarrage", code)
+                self.restarts += 1
+
+            # A child that stayed up for a while gets a fresh backoff
+            if time.monotonic() - started > self.max_restart_backoff:
+                backoff = self.restart_backoff
+            self._stopping.wait(backoff)
+            backoff = min(backoff * 2, self.max_restart_backoff)
+
+    def _pump(self, process):
+        for line in process.stdout:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            # Blocking put: a full queue stops reading the pipe (back-pressure)
+            while not self._stopping.is_set():
+                try:
+                    self.lines.put(line, timeout=1.0)
+                    break
+                except queue.Full:
+                    continue
+            if self._stopping.is_set():
+                return
+
+    @staticmethod
+    def _log_stderr(process):
+        # Erreurs de config, timeouts SNMP, échecs d'authentification...
+        for line in process.stderr:
+            line = line.rstrip("\n")
+            if not line:
+                continue
+            level = next((lvl for tag, lvl in TELEGRAF_LOG_LEVELS.items() if f" {tag} " in f" {line} "),
+                         logging.WARNING)
+            logger.log(level, "telegraf: %s", line)
+
+    def batches(self, interval=5.0):
+        """
+        Yield the list of lines received during each ``interval`` window.
+
+        Windows are aligned on a monotonic deadline so the cadence does not
+        drift with processing time.
+        """
+        deadline = time.monotonic() + interval
+        while not self._stopping.is_set():
+            batch = []
+            while True:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.lines.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            yield batch
+            deadline += interval
+            # Skip missed windows instead of bursting to catch up
+            now = time.monotonic()
+            if deadline <= now:
+                deadline = now + interval
@@ -0,0 +1,47 @@
+import tempfile
+import unittest
+
+from collector.influx_writer import InfluxWriter
+from collector.spool import Spool
+
+
+class FailingWriter(InfluxWriter):
+    """Accepts the first ``accepted`` requests, then fails."""
+
+    def __init__(self, accepted, **kwargs):
+        super().__init__("http://localhost:8086", "token", "org", "bucket", **kwargs)
+        self.accepted = accepted
+        self.written = []
+
+    def write_lines(self, records):
+        if len(self.written) >= self.accepted:
+            raise ConnectionError("influxdb down")
+        self.written.append(list(records))
+
+
+class FlushTests(unittest.TestCase):
+    def lines(self, count):
+        return [f"cpu,router=R1 value={i} {i}" for i in range(count)]
+
+    def test_only_unwritten_chunks_are_spooled(self):
+        spool = Spool(tempfile.mkdtemp())
+        writer = FailingWriter(accepted=2, batch_size=3, spool=spool)
+        self.addCleanup(writer.client.close)
+        writer._pending = self.lines(8)
+
+        self.assertEqual(writer.flush(), 6)
+        self.assertEqual(writer.written, [self.lines(8)[0:3], self.lines(8)[3:6]])
+        spooled, _ = spool.read()
+        self.assertEqual(spooled, self.lines(8)[6:])
+        self.assertEqual(writer.stats["points_written"], 6)
+
+    def test_failure_raised_without_spool(self):
+        writer = FailingWriter(accepted=0, batch_size=3)
+        self.addCleanup(writer.client.close)
+        writer._pending = self.lines(2)
+        with self.assertRaises(ConnectionError):
+            writer.flush()
+
+
+if __name__ == "__main__":
+    unittest.main()
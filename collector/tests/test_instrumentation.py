@@ -0,0 +1,74 @@
+import threading
+import unittest
+
+from collector.instrumentation import Counter, Histogram, Registry
+
+
+class RenderTests(unittest.TestCase):
+    def test_label_values_are_escaped(self):
+        counter = Counter("polls_total", "Polls", labels=("router",))
+        counter.inc(router='R1 "core"\\edge\nlab')
+        self.assertEqual(counter.render()[-1], 'polls_total{router="R1 \\"core\\"\\\\edge\\nlab"} 1')
+
+    def test_histogram_buckets(self):
+        histogram = Histogram("latency_seconds", "Latency", buckets=(0.1, 1))
+        histogram.observe(0.05)
+        histogram.observe(0.5)
+        histogram.observe(5)
+        self.assertEqual(histogram.render()[2:], [
+            'latency_seconds_bucket{le="0.1"} 1',
+            'latency_seconds_bucket{le="1"} 2',
+            'latency_seconds_bucket{le="+Inf"} 3',
+            'latency_seconds_sum 5.55',
+            'latency_seconds_count 3',
+        ])
+
+    def test_points_are_stamped(self):
+        registry = Registry()
+        registry.register(Counter("lines_total", "Lines")).inc(3)
+        point, = registry.to_points(timestamp=1_700_000_000_000_000_000)
+        self.assertEqual(point.to_line_protocol(),
+                         "pipeline_stats,metric=lines_total value=3 1700000000000000000")
+
+
+class InterleavingValues(dict):
+    """Values whose iteration lets another thread record a new label set midway."""
+
+    def __init__(self, record, values):
+        super().__init__(values)
+        self.record = record
+        self.threads = []
+
+    def items(self):
+        iterator = iter(super().items())
+        yield next(iterator)
+        thread = threading.Thread(target=self.record, kwargs={"router": "new"})
+        thread.start()
+        thread.join(0.2)
+        self.threads.append(thread)
+        yield from iterator
+
+
+class ConcurrencyTests(unittest.TestCase):
+    def check(self, metric, record):
+        record(router="R1")
+        record(router="R2")
+        metric._values = values = InterleavingValues(record, metric._values)
+        registry = Registry()
+        registry.register(metric)
+        registry.render()
+        registry.to_points(timestamp=1)
+        for thread in values.threads:
+            thread.join()
+        self.assertEqual(len(metric.fields()), 3)
+
+    def test_counter_scrape_while_recording(self):
+        counter = Counter("polls_total", "Polls", labels=("router",))
+        self.check(counter, counter.inc)
+
+    def test_histogram_scrape_while_recording(self):
+        histogram = Histogram("poll_seconds", "Poll", labels=("router",))
+        self.check(histogram, lambda **labels: histogram.observe(0.1, **labels))
+
+if __name__ == "__main__":
+    unittest.main()
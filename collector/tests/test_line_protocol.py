@@ -0,0 +1,55 @@
+import unittest
+
+from collector.line_protocol import parse_line, parse_lines
+
+
+class ParseLineTests(unittest.TestCase):
+    def test_plain_line(self):
+        metric = parse_line("snmp,agent_host=172.16.10.41,hostname=R1 uptime=123456i,cpu_5min=7 1700000000000000000")
+        self.assertEqual(metric.measurement, "snmp")
+        self.assertEqual(metric.tags, {"agent_host": "172.16.10.41", "hostname": "R1"})
+        self.assertEqual(metric.fields, {"uptime": 123456, "cpu_5min": 7.0})
+        self.assertEqual(metric.timestamp, 1700000000000000000)
+
+    def test_field_types(self):
+        metric = parse_line("m f=1.5,i=-3i,u=4u,t=t,T=TRUE,f2=false,e=1e3")
+        self.assertEqual(metric.fields, {"f": 1.5, "i": -3, "u": 4, "t": True, "T": True, "f2": False, "e": 1000.0})
+        self.assertIsInstance(metric.fields["i"], int)
+        self.assertIsNone(metric.timestamp)
+
+    def test_escaped_tags_and_measurement(self):
+        metric = parse_line(r"inter\ faces,ifDescr=GigabitEthernet0/0\ uplink,note=a\,b\=c ifInOctets=1i 1")
+        self.assertEqual(metric.measurement, "inter faces")
+        self.assertEqual(metric.tags, {"ifDescr": "GigabitEthernet0/0 uplink", "note": "a,b=c"})
+        self.assertEqual(metric.fields, {"ifInOctets": 1})
+
+    def test_escaped_backslash(self):
+        metric = parse_line(r"m,path=C:\\temp value=1")
+        self.assertEqual(metric.tags, {"path": "C:\\temp"})
+
+    def test_quoted_string_fields(self):
+        metric = parse_line(r'syslog,host=R1 message="link down, Gi0/1 = \"up\" \\ ok",severity=3i 5')
+        self.assertEqual(metric.fields, {"message": 'link down, Gi0/1 = "up" \\ ok', "severity": 3})
+        self.assertEqual(metric.tags, {"host": "R1"})
+        self.assertEqual(metric.timestamp, 5)
+
+    def test_quoted_string_with_escaped_tag(self):
+        metric = parse_line(r'interfaces,ifDescr=Gi0/0\ uplink alias="core link" 1')
+        self.assertEqual(metric.tags, {"ifDescr": "Gi0/0 uplink"})
+        self.assertEqual(metric.fields, {"alias": "core link"})
+
+    def test_telegraf_test_prefix(self):
+        self.assertEqual(parse_line("> ping,url=10.0.0.1 average_response_ms=1.2 1\n").fields,
+                         {"average_response_ms": 1.2})
+
+    def test_ignored_lines(self):
+        for line in ("", "# comment", "measurement_only", "m f=notanumber"):
+            self.assertIsNone(parse_line(line), line)
+
+    def test_parse_lines_skips_invalid(self):
+        text = "snmp uptime=1i 1\n\n2025-01-01 I! Starting Telegraf\nsnmp uptime=2i 2\n"
+        self.assertEqual([m.fields["uptime"] for m in parse_lines(text)], [1, 2])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+try:
+    import tomllib
+except ModuleNotFoundError:  # Python < 3.11 (image almalinux:9)
+    import tomli as tomllib
+
+from collector.line_protocol import parse_lines
+from collector.mapping import compile_mapping, load_mapping, map_metrics
+
+CONFIG = tomllib.loads('''
+[snmp]
+drop_if_empty = true
+
+[snmp.fields]
+cpu_5min = { type = "float", round = 2 }
+uptime = "int"
+ram_mb = { type = "float", source = "ram_used", scale = 0.000001, round = 1 }
+
+[interfaces]
+key_tag = { tag = "ifDescr", as = "interface" }
+
+[interfaces.fields]
+ifInOctets = "float"
+
+[ping_latency.fields]
+latency_ms = { type = "float", source = "value" }
+''')
+
+
+class MappingTests(unittest.TestCase):
+    def setUp(self):
+        self.table = compile_mapping(CONFIG)
+
+    def map(self, text):
+        return map_metrics(parse_lines(text), self.table)
+
+    def test_types_scale_and_round(self):
+        entry, = self.map("snmp,hostname=R1 cpu_5min=12.3456,uptime=42.0,ram_used=123456789i 7")
+        self.assertEqual(entry, {
+            "measurement": "snmp",
+            "data": {"cpu_5min": 12.35, "uptime": 42, "ram_mb": 123.5, "timestamp": 7},
+        })
+
+    def test_source_field(self):
+        entry, = self.map("ping_latency,host=c value=3.5 1")
+        self.assertEqual(entry["data"], {"latency_ms": 3.5, "timestamp": 1})
+
+    def test_key_tag_and_router_passthrough(self):
+        entry, = self.map("interfaces,ifDescr=Gi0/0,router=R1 ifInOctets=10i 1")
+        self.assertEqual(entry["interface"], "Gi0/0")
+        self.assertEqual(entry["router"], "R1")
+        self.assertEqual(entry["data"]["ifInOctets"], 10.0)
+
+    def test_missing_key_tag_is_dropped(self):
+        self.assertEqual(self.map("interfaces ifInOctets=10i 1"), [])
+
+    def test_unknown_measurement_is_dropped(self):
+        self.assertEqual(self.map("cpu,cpu=cpu0 usage_idle=90 1"), [])
+
+    def test_drop_if_empty(self):
+        self.assertEqual(self.map("snmp,hostname=R1 unrelated=1 1"), [])
+
+    def test_absent_and_unconvertible_fields_are_none(self):
+        entry, = self.map('snmp cpu_5min="n/a",uptime=5i 1')
+        self.assertIsNone(entry["data"]["cpu_5min"])
+        self.assertIsNone(entry["data"]["ram_mb"])
+        self.assertEqual(entry["data"]["uptime"], 5)
+
+    def test_shipped_mapping_loads(self):
+        table = load_mapping()
+        self.assertIn("snmp", table)
+        self.assertEqual(table["interfaces"].key_name, "interface")
+
+
+if __name__ == "__main__":
+    unittest.main()
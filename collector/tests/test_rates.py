@@ -0,0 +1,90 @@
+import unittest
+
+from collector.rates import WRAP_32, RateEngine
+
+SECOND = 1_000_000_000
+GIGABIT = 1_000_000_000
+
+
+def interface(ts, in_octets, out_octets=0, errors=0, speed=GIGABIT, router="R1"):
+    return {
+        "measurement": "interfaces",
+        "interface": "Gi0/0",
+        "router": router,
+        "data": {
+            "ifInOctets": in_octets, "ifOutOctets": out_octets,
+            "ifInErrors": errors, "ifOutErrors": 0,
+            "ifSpeed": speed, "timestamp": ts,
+        },
+    }
+
+
+def uptime(ts, centiseconds, router="R1"):
+    return {"measurement": "snmp", "router": router, "data": {"uptime": centiseconds, "timestamp": ts}}
+
+
+class RateEngineTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = RateEngine()
+
+    def rates(self, *entries):
+        return self.engine.apply(list(entries))[-1]["data"]
+
+    def test_first_sample_has_no_rate(self):
+        self.assertNotIn("in_mbps", self.rates(interface(10 * SECOND, 1000)))
+
+    def test_rate(self):
+        self.rates(interface(10 * SECOND, 0))
+        data = self.rates(interface(20 * SECOND, 12_500_000, 2_500_000, errors=30))
+        self.assertEqual(data["in_mbps"], 10.0)
+        self.assertEqual(data["out_mbps"], 2.0)
+        self.assertEqual(data["err_rate"], 3.0)
+
+    def test_counter32_wrap(self):
+        self.rates(interface(10 * SECOND, WRAP_32 - 1_000_000))
+        data = self.rates(interface(20 * SECOND, 1_500_000))
+        self.assertEqual(data["in_mbps"], 2.0)
+
+    def test_counter64_wrap(self):
+        engine = RateEngine({"in_mbps": (("ifHCInOctets",), 8 / 1_000_000)})
+        first = {"measurement": "interfaces", "interface": "Te0/0", "router": "R1",
+                 "data": {"ifHCInOctets": 2 ** 64 - 500, "timestamp": 10 * SECOND}}
+        second = {"measurement": "interfaces", "interface": "Te0/0", "router": "R1",
+                  "data": {"ifHCInOctets": 1_249_500, "timestamp": 20 * SECOND}}
+        engine.apply([first])
+        self.assertEqual(engine.apply([second])[0]["data"]["in_mbps"], 1.0)
+
+    def test_reset_larger_than_link_speed_is_dropped(self):
+        # Redémarrage sans uptime : le "wrap" apparent dépasse ifSpeed * dt
+        self.rates(interface(10 * SECOND, 3_000_000_000))
+        data = self.rates(interface(20 * SECOND, 1_000, speed=100_000_000))
+        self.assertNotIn("in_mbps", data)
+
+    def test_restart_seen_in_earlier_batch(self):
+        self.rates(uptime(5 * SECOND, 100_000), interface(10 * SECOND, 1_000_000))
+        # L'uptime arrive seul, dans un lot distinct des compteurs
+        self.engine.apply([uptime(15 * SECOND, 300)])
+        data = self.rates(interface(20 * SECOND, 5_000_000))
+        self.assertNotIn("in_mbps", data)
+        data = self.rates(interface(30 * SECOND, 6_250_000))
+        self.assertEqual(data["in_mbps"], 1.0)
+
+    def test_uptime_jitter_is_not_a_restart(self):
+        self.rates(uptime(10 * SECOND, 100_000), interface(10 * SECOND, 0))
+        # 0,4 s de latence de collecte de plus qu'au cycle précédent
+        self.engine.apply([uptime(int(20.4 * SECOND), 101_000)])
+        self.assertEqual(self.rates(interface(20 * SECOND, 1_250_000))["in_mbps"], 1.0)
+
+    def test_error_rate_is_capped(self):
+        self.rates(interface(10 * SECOND, 0, errors=0))
+        data = self.rates(interface(20 * SECOND, 0, errors=10 ** 9, speed=100_000_000))
+        self.assertNotIn("err_rate", data)
+
+    def test_unknown_speed_falls_back_to_plausible_maximum(self):
+        self.rates(interface(10 * SECOND, 0, speed=None))
+        data = self.rates(interface(20 * SECOND, 10 ** 9, speed=None))
+        self.assertEqual(data["in_mbps"], 800.0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,49 @@
+import json
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from collector.scheduler import RouterTarget, routers_from_env, routers_from_url
+
+
+class InventoryHandler(BaseHTTPRequestHandler):
+    routers = [{"name": "R1", "address": "172.16.10.41"}, {"name": "R2", "address": ""}]
+
+    def do_GET(self):
+        if self.headers.get("Authorization") != "Bearer secret":
+            self.send_response(401)
+            self.end_headers()
+            return
+        body = json.dumps({"routers": self.routers}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class RouterInventoryTests(unittest.TestCase):
+    def setUp(self):
+        self.server = HTTPServer(("127.0.0.1", 0), InventoryHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}/api/routers/"
+
+    def test_routers_from_url_skips_routers_without_address(self):
+        self.assertEqual(routers_from_url(self.url, "secret"), [RouterTarget("R1", "172.16.10.41")])
+
+    def test_routers_from_url_raises_on_refusal(self):
+        # Le scheduler garde alors les routeurs déjà interrogés
+        with self.assertRaises(OSError):
+            routers_from_url(self.url, "wrong")
+
+    def test_routers_from_env(self):
+        self.assertEqual(routers_from_env("R1=172.16.10.41, 10.0.0.2"),
+                         [RouterTarget("R1", "172.16.10.41"), RouterTarget("10.0.0.2", "10.0.0.2")])
+
+
+if __name__ == "__main__":
+    unittest.main()
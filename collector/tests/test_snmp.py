@@ -0,0 +1,205 @@
+import asyncio
+import unittest
+
+from collector import snmp
+from collector.scheduler import RouterTarget
+
+
+def _varbind(oid, tag, payload):
+    return snmp._tlv(snmp._SEQUENCE, snmp._encode_oid(oid) + snmp._tlv(tag, payload))
+
+
+def _response(request_id, varbinds, status=0):
+    pdu = snmp._tlv(
+        snmp._RESPONSE,
+        snmp._encode_integer(request_id)
+        + snmp._encode_integer(status)
+        + snmp._encode_integer(0)
+        + snmp._tlv(snmp._SEQUENCE, b"".join(varbinds)),
+    )
+    return snmp._tlv(
+        snmp._SEQUENCE,
+        snmp._encode_integer(snmp.SNMP_VERSION_2C) + snmp._tlv(snmp._OCTET_STRING, b"public") + pdu,
+    )
+
+
+def _decode_request(data):
+    """(pdu_type, request_id, non_repeaters, max_repetitions, [oid...]) of a request."""
+    _, message, _ = snmp._read_tlv(data, 0)
+    _, _, offset = snmp._read_tlv(message, 0)
+    _, _, offset = snmp._read_tlv(message, offset)
+    pdu_type, pdu, _ = snmp._read_tlv(message, offset)
+    fields = []
+    offset = 0
+    for _ in range(3):
+        _, raw, offset = snmp._read_tlv(pdu, offset)
+        fields.append(int.from_bytes(raw, "big", signed=True))
+    _, varbind_list, _ = snmp._read_tlv(pdu, offset)
+    oids = []
+    offset = 0
+    while offset < len(varbind_list):
+        _, varbind, offset = snmp._read_tlv(varbind_list, offset)
+        _, raw_oid, _ = snmp._read_tlv(varbind, 0)
+        oids.append(snmp._decode_oid(raw_oid))
+    return (pdu_type, *fields, oids)
+
+
+def _oid_key(oid):
+    return tuple(int(part) for part in oid.split("."))
+
+
+class FakeAgent(asyncio.DatagramProtocol):
+    """Minimal v2c agent answering GET and GETBULK from a {oid: (tag, payload)} MIB."""
+
+    def __init__(self, mib):
+        self.mib = mib
+        self.order = sorted(mib, key=_oid_key)
+        self.requests = []
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def _next(self, oid):
+        for candidate in self.order:
+            if _oid_key(candidate) > _oid_key(oid):
+                return candidate
+        return None
+
+    def datagram_received(self, data, addr):
+        pdu_type, request_id, non_repeaters, max_repetitions, oids = _decode_request(data)
+        self.requests.append(pdu_type)
+        varbinds = []
+        if pdu_type == snmp._GET_REQUEST:
+            for oid in oids:
+                tag, payload = self.mib.get(oid, (snmp._NO_SUCH_OBJECT, b""))
+                varbinds.append(_varbind(oid, tag, payload))
+        else:
+            cursors = list(oids)
+            for _ in range(max_repetitions):
+                for i, oid in enumerate(cursors):
+                    following = self._next(oid)
+                    if following is None:
+                        varbinds.append(_varbind(oid, snmp._END_OF_MIB_VIEW, b""))
+                    else:
+                        varbinds.append(_varbind(following, *self.mib[following]))
+                        cursors[i] = following
+        self.transport.sendto(_response(request_id, varbinds), addr)
+
+
+def _unsigned(tag, value):
+    return tag, value.to_bytes(max(1, (value.bit_length() + 8) // 8), "big")
+
+
+class BerTests(unittest.TestCase):
+    def test_integer_round_trip(self):
+        for value in (0, 1, 127, 128, 255, 256, -1, -128, -129, 2**31 - 1, -(2**31)):
+            tag, payload, _ = snmp._read_tlv(snmp._encode_integer(value), 0)
+            self.assertEqual(tag, snmp._INTEGER)
+            self.assertEqual(snmp._decode_value(tag, payload), value)
+
+    def test_oid_round_trip(self):
+        for oid in ("1.3.6.1.2.1.1.3.0", "1.3.6.1.4.1.9.9.109.1.1.1.1.8.1", "1.3.6.1.2.1.2.2.1.10.4294967295"):
+            tag, payload, _ = snmp._read_tlv(snmp._encode_oid(oid), 0)
+            self.assertEqual(tag, snmp._OID)
+            self.assertEqual(snmp._decode_oid(payload), oid)
+
+    def test_long_length(self):
+        payload = b"x" * 300
+        tag, decoded, end = snmp._read_tlv(snmp._tlv(snmp._OCTET_STRING, payload), 0)
+        self.assertEqual(decoded, payload)
+        self.assertEqual(end, 304)
+
+    def test_request_round_trip(self):
+        data = snmp.encode_request(snmp._GET_BULK_REQUEST, 4242, "public",
+                                   ["1.3.6.1.2.1.2.2.1.2", "1.3.6.1.2.1.2.2.1.10"], 0, 25)
+        self.assertEqual(
+            _decode_request(data),
+            (snmp._GET_BULK_REQUEST, 4242, 0, 25, ["1.3.6.1.2.1.2.2.1.2", "1.3.6.1.2.1.2.2.1.10"]),
+        )
+
+    def test_response_values(self):
+        data = _response(7, [
+            _varbind("1.3.6.1.2.1.1.3.0", *_unsigned(snmp._TIMETICKS, 123456)),
+            _varbind("1.3.6.1.2.1.2.2.1.10.1", *_unsigned(snmp._COUNTER32, 2**32 - 1)),
+            _varbind("1.3.6.1.2.1.31.1.1.1.6.1", *_unsigned(snmp._COUNTER64, 2**64 - 1)),
+            _varbind("1.3.6.1.2.1.2.2.1.2.1", snmp._OCTET_STRING, b"Gi0/0"),
+            _varbind("1.3.6.1.2.1.4.20.1.1.1", snmp._IP_ADDRESS, bytes((10, 0, 0, 1))),
+            _varbind("1.3.6.1.2.1.1.4.0", snmp._NO_SUCH_OBJECT, b""),
+            _varbind("1.3.6.1.2.1.9", snmp._END_OF_MIB_VIEW, b""),
+        ])
+        request_id, status, varbinds = snmp.decode_response(data)
+        self.assertEqual((request_id, status), (7, 0))
+        self.assertEqual(varbinds[:6], [
+            ("1.3.6.1.2.1.1.3.0", 123456),
+            ("1.3.6.1.2.1.2.2.1.10.1", 2**32 - 1),
+            ("1.3.6.1.2.1.31.1.1.1.6.1", 2**64 - 1),
+            ("1.3.6.1.2.1.2.2.1.2.1", "Gi0/0"),
+            ("1.3.6.1.2.1.4.20.1.1.1", "10.0.0.1"),
+            ("1.3.6.1.2.1.1.4.0", None),
+        ])
+        self.assertIs(varbinds[6][1], snmp._END)
+
+    def test_value_130_is_not_end_of_mib(self):
+        # 130 == 0x82, the endOfMibView tag: it must stay a plain value
+        data = _response(1, [_varbind("1.3.6.1.2.1.2.2.1.10.1", *_unsigned(snmp._COUNTER32, 130))])
+        self.assertEqual(snmp.decode_response(data)[2], [("1.3.6.1.2.1.2.2.1.10.1", 130)])
+
+    def test_rejects_request_pdu(self):
+        data = snmp.encode_request(snmp._GET_REQUEST, 1, "public", ["1.3.6.1.2.1.1.3.0"])
+        with self.assertRaises(snmp.SnmpError):
+            snmp.decode_response(data)
+
+
+IF_DESCR = "1.3.6.1.2.1.2.2.1.2"
+IF_IN_OCTETS = "1.3.6.1.2.1.2.2.1.10"
+UPTIME = "1.3.6.1.2.1.1.3.0"
+
+
+class GetBulkWalkTests(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        mib = {UPTIME: _unsigned(snmp._TIMETICKS, 5000)}
+        for index in range(1, 8):
+            mib[f"{IF_DESCR}.{index}"] = (snmp._OCTET_STRING, f"Gi0/{index}".encode())
+            # Index 3 vaut 130 (0x82) : ne doit pas arrêter le parcours
+            mib[f"{IF_IN_OCTETS}.{index}"] = _unsigned(snmp._COUNTER32, 130 if index == 3 else index * 1000)
+        mib["1.3.6.1.2.1.2.2.1.11.1"] = _unsigned(snmp._COUNTER32, 1)
+        loop = asyncio.get_running_loop()
+        self.endpoint, self.agent = await loop.create_datagram_endpoint(
+            lambda: FakeAgent(mib), local_addr=("127.0.0.1", 0)
+        )
+        host, port = self.endpoint.get_extra_info("sockname")[:2]
+        self.router = RouterTarget("R1", f"{host}:{port}")
+        self.poller = snmp.SnmpPoller(
+            [("uptime", UPTIME, False)],
+            [("interface", ["hostname"], [("ifDescr", IF_DESCR, True), ("ifInOctets", IF_IN_OCTETS, False)])],
+            timeout=1.0, retries=0, max_repetitions=3,
+        )
+
+    async def asyncTearDown(self):
+        self.poller.close()
+        self.endpoint.close()
+
+    async def test_walk_table(self):
+        metrics = await self.poller(self.router, 2.0)
+        scalar = [m for m in metrics if m.measurement == "snmp"]
+        self.assertEqual(scalar[0].fields, {"uptime": 5000})
+        rows = {m.tags["ifDescr"]: m.fields["ifInOctets"] for m in metrics if m.measurement == "interface"}
+        self.assertEqual(rows, {f"Gi0/{i}": 130 if i == 3 else i * 1000 for i in range(1, 8)})
+        # 7 lignes par paquets de 3 : plusieurs GETBULK
+        self.assertEqual(self.agent.requests.count(snmp._GET_BULK_REQUEST), 3)
+
+    async def test_walk_to_end_of_mib(self):
+        walked = await self.poller._walk_columns(self.poller._address(self.router), ["1.3.6.1.2.1.2.2.1.11"])
+        self.assertEqual(walked, {"1.3.6.1.2.1.2.2.1.11": {"1": 1}})
+
+    async def test_timeout_bounds_the_poll(self):
+        self.endpoint.close()
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        with self.assertRaises(asyncio.TimeoutError):
+            await self.poller(self.router, 0.2)
+        self.assertLess(loop.time() - started, 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
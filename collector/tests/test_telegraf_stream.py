@@ -0,0 +1,27 @@
+import subprocess
+import sys
+import unittest
+
+from collector.telegraf_stream import TelegrafStream
+
+
+class StderrLoggingTests(unittest.TestCase):
+    def test_stderr_lines_are_logged_at_their_level(self):
+        script = (
+            "import sys\n"
+            "print('2024-01-01T00:00:00Z E! [inputs.snmp] timeout', file=sys.stderr)\n"
+            "print('2024-01-01T00:00:00Z I! Starting Telegraf', file=sys.stderr)\n"
+            "print('panic: runtime error', file=sys.stderr)\n"
+        )
+        process = subprocess.Popen([sys.executable, "-c", script],
+                                   stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        with self.assertLogs("collector.telegraf_stream", level="DEBUG") as logs:
+            TelegrafStream._log_stderr(process)
+        process.wait()
+
+        self.assertEqual([record.levelname for record in logs.records], ["ERROR", "INFO", "WARNING"])
+        self.assertIn("[inputs.snmp] timeout", logs.records[0].getMessage())
+
+
+if __name__ == "__main__":
+    unittest.main()
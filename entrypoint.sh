@@ -136,6 +136,9 @@ handle_migrations() {
     echo "🚀 Application des migrations..."
     cd /code && python3 router_supervisor/manage.py migrate
     
+    # Table du cache partagé (utile seulement avec CACHE_BACKEND=db)
+    cd /code && python3 router_supervisor/manage.py createcachetable
+    
     echo "✅ Migrations terminées avec succès!"
 }
 
@@ -191,6 +194,10 @@ echo "Starting pipeline data collection..."
 touch /code/run.flag
 # Start pipeline as background process
 cd /code && python3 pipeline.py &
+# Start ingest workers (drain the receive_metrics queue)
+cd /code && python3 router_supervisor/manage.py ingest_worker &
+# Start dashboard refresher (pre-computed payloads in the shared cache)
+cd /code && python3 router_supervisor/manage.py refresh_dashboard &
 
 echo "Current directory: $(pwd)"
 echo "Directory contents: $(ls -la)"
@@ -8,7 +8,8 @@ backlog = 2048
 
 # Worker processes
 workers = int(os.environ.get('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
-worker_class = "sync"
+# Workers ASGI : nécessaires au flux temps réel du dashboard (/api/stream/)
+worker_class = "uvicorn.workers.UvicornWorker"
 worker_connections = 1000
 timeout = 30
 keepalive = 5
@@ -29,6 +30,14 @@ access_log_format = '%(h)s %(l)s %(u)s %(t)s "%(r)s" %(s)s %(b)s "%(f)s" "%(a)s"
 # Process naming
 proc_name = 'supervision-routeur-cisco'
 
+# Préchargement du cache d'identité (routeurs, KPI, interfaces) dans chaque worker
+def post_fork(server, worker):
+    try:
+        from router_supervisor.api_app.identity_cache import IDENTITY_CACHE
+        IDENTITY_CACHE.warm()
+    except Exception as e:
+        server.log.warning(f"Identity cache warm-up failed: {e}")
+
 # Server mechanics
 daemon = False
 pidfile = None
@@ -1,13 +1,28 @@
 #!/usr/bin/env python3
+import contextlib
+import logging
 import subprocess
 import time
-import json
 import os
-import re
 import signal
 import sys
-from influxdb_client import Point, WritePrecision, InfluxDBClient
-from influxdb_client.client.write_api import SYNCHRONOUS
+from influxdb_client import Point, WritePrecision
+
+from collector.influx_writer import InfluxWriter
+from collector.instrumentation import (
+    CYCLE_LAG, LINES_PARSED, POINTS_DROPPED, POLL_DURATION, REGISTRY, SPOOL_DEPTH,
+    STAGE_DURATION, start_metrics_server,
+)
+from collector.line_protocol import parse_lines
+from collector.mapping import map_metrics
+from collector.rates import RateEngine
+from collector.scheduler import (
+    RouterScheduler, TelegrafPoller, routers_from_env, routers_from_url,
+)
+from collector.snapshot import SnapshotWriter
+from collector.snmp import SnmpPoller
+from collector.spool import Spool, SpoolDrainer
+from collector.telegraf_stream import TelegrafStream
 
 
 INFLUX_URL = "http://influxdb:8086"
@@ -15,120 +30,58 @@ INFLUX_TOKEN = "BQSixul3bdmN-KtFDG_BPfUgSDGc1ZIntJ-QYa2fiIQjA_2psFN2z21AOmxD2s8f
 INFLUX_ORG = "telecom-sudparis"
 INFLUX_BUCKET = "router-metrics"
 
+TELEGRAF_CONFIG = "/etc/telegraf/telegraf.conf"
+# "stream" : un seul processus Telegraf permanent ; "test" : telegraf --test à chaque cycle
+# "fleet" : tous les routeurs interrogés en parallèle (voir collector/scheduler.py)
+TELEGRAF_MODE = os.getenv("TELEGRAF_MODE", "test")
+CYCLE_SECONDS = 5
+# Mode fleet : table Router lue via l'API Django, relue toutes les ROUTERS_REFRESH secondes
+ROUTERS_URL = os.getenv("PIPELINE_ROUTERS_URL", "http://router_django:8080/api/routers/")
+ROUTERS_TOKEN = os.getenv("PIPELINE_API_TOKEN", "")
+ROUTERS_REFRESH = float(os.getenv("PIPELINE_ROUTERS_REFRESH", "60"))
+# Surcharge : "R1=172.16.10.41,R2=..." remplace la table Router
+PIPELINE_ROUTERS = os.getenv("PIPELINE_ROUTERS", "")
+ROUTER_TIMEOUT = float(os.getenv("PIPELINE_ROUTER_TIMEOUT", "4"))
+MAX_CONCURRENT_POLLS = int(os.getenv("PIPELINE_MAX_CONCURRENT_POLLS", "32"))
+# Mode fleet : "telegraf" (telegraf --test par routeur) ou "snmp" (poller asyncio intégré)
+PIPELINE_POLLER = os.getenv("PIPELINE_POLLER", "telegraf")
+WRITE_BATCH_SIZE = int(os.getenv("INFLUX_BATCH_SIZE", "5000"))
+DEBUG_POINTS = os.getenv("PIPELINE_DEBUG_POINTS", "") == "1"
+# Spool disque des points non acceptés par InfluxDB (rejoués en arrière-plan)
+SPOOL_DIR = os.getenv("PIPELINE_SPOOL_DIR", "spool")
+SPOOL_MAX_MB = int(os.getenv("PIPELINE_SPOOL_MAX_MB", "512"))
+# Port de l'endpoint Prometheus /metrics du pipeline (0 pour désactiver)
+METRICS_PORT = int(os.getenv("PIPELINE_METRICS_PORT", "9108"))
+LOG_LEVEL = os.getenv("PIPELINE_LOG_LEVEL", "INFO")
+
+logger = logging.getLogger("pipeline")
+
+_writer = None
+_drainer = None
+_rates = RateEngine()
+
 def parse_telegraf_output(output):
-    results = []
-    lines = output.splitlines()
-    for line in lines:
-        if not line.startswith(">"):
-            continue
-        line = line[2:]
-        parts = line.split(" ")
-        if len(parts) < 3:
-            continue
-        measurement = parts[0].split(",")[0]
-        tags = dict(item.split("=") for item in parts[0].split(",")[1:] if "=" in item)
-        fields_raw = parts[1].split(",")
-        fields = {}
-        for kv in fields_raw:
-            if "=" in kv:
-                key, value = kv.split("=")
-                value = re.sub(r"[ui]$", "", value)
-                try:
-                    fields[key] = float(value)
-                except ValueError:
-                    fields[key] = value
-        timestamp = parts[2]
-
-        if measurement == "snmp":
-            filtered = {
-                "cpu_5min": float(fields.get("cpu_5min")) if fields.get("cpu_5min") is not None else None,
-                "cpu_0_usage": float(fields.get("cpu_0_usage")) if fields.get("cpu_0_usage") is not None else None,
-                "cpu_0_index": float(fields.get("cpu_0_index")) if fields.get("cpu_0_index") is not None else None,
-                "ram_used": float(fields.get("ram_used")) if fields.get("ram_used") is not None else None,
-                "ram_free": float(fields.get("ram_free")) if fields.get("ram_free") is not None else None,
-                "timestamp": timestamp,
-            }
-            if any(v is not None for v in filtered.values()):
-                results.append({"measurement": "snmp", "data": filtered})
-
-        elif measurement == "interfaces" and "ifDescr" in tags:
-            filtered = {
-                "ifInOctets": float(fields.get("ifInOctets")) if fields.get("ifInOctets") is not None else None,
-                "ifOutOctets": float(fields.get("ifOutOctets")) if fields.get("ifOutOctets") is not None else None,
-                "ifInErrors": float(fields.get("ifInErrors")) if fields.get("ifInErrors") is not None else None,
-                "ifOutErrors": float(fields.get("ifOutErrors")) if fields.get("ifOutErrors") is not None else None,
-                "timestamp": timestamp,
-            }
-            results.append({
-                "measurement": "interfaces",
-                "interface": tags["ifDescr"],
-                "data": filtered
-            })
-
-        elif measurement == "ping_latency":
-            results.append({
-                "measurement": "ping_latency",
-                "data": {
-                    "latency_ms": float(fields.get("value")) if fields.get("value") is not None else None,
-                    "timestamp": timestamp,
-                }
-            })
-
-        elif measurement == "cpu-total":
-            results.append({
-                "measurement": "cpu-total",
-                "data": {
-                    "usage_percent": float(fields.get("usage_percent")) if fields.get("usage_percent") is not None else None,
-                    "usage_idle": float(fields.get("usage_idle")) if fields.get("usage_idle") is not None else None,
-                    "usage_user": float(fields.get("usage_user")) if fields.get("usage_user") is not None else None,
-                    "usage_system": float(fields.get("usage_system")) if fields.get("usage_system") is not None else None,
-                    "timestamp": timestamp,
-                }
-            })
-
-        elif measurement == "mem":
-            results.append({
-                "measurement": "mem",
-                "data": {
-                    "used": float(fields.get("used")) if fields.get("used") is not None else None,
-                    "free": float(fields.get("free")) if fields.get("free") is not None else None,
-                    "used_percent": float(fields.get("used_percent")) if fields.get("used_percent") is not None else None,
-                    "timestamp": timestamp,
-                }
-            })
-
-        elif measurement == "system":
-            filtered = {
-                "n_users": float(fields.get("n_users")) if fields.get("n_users") is not None else None,
-                "load1": float(fields.get("load1")) if fields.get("load1") is not None else None,
-                "uptime": float(fields.get("uptime")) if fields.get("uptime") is not None else None,
-                "timestamp": timestamp,
-            }
-            if any(v is not None for v in [filtered["n_users"], filtered["load1"], filtered["uptime"]]):
-                results.append({
-                    "measurement": "system",
-                    "data": filtered
-                })
-
-    return results
-
-def format_value(key, value):
-    if "percent" in key or "cpu" in key:
-        try:
-            return round(float(value), 2)
-        except Exception:
-            return value
-    if key in ("in_bytes", "out_bytes", "in_octets", "out_octets"):
-        try:
-            return round(float(value) * 8 / 1_000_000, 3)  # Convertir en Mbit/s
-        except Exception:
-            return value
-    return value
+    """Parse Telegraf line protocol and keep the fields listed in measurements.toml."""
+    return map_metrics(parse_lines(output))
+
+
+def get_writer():
+    """Return the process-wide InfluxDB writer, creating it on first use."""
+    global _writer, _drainer
+    if _writer is None:
+        spool = Spool(SPOOL_DIR, max_bytes=SPOOL_MAX_MB * 1024 * 1024)
+        _writer = InfluxWriter(
+            INFLUX_URL, INFLUX_TOKEN, INFLUX_ORG, INFLUX_BUCKET,
+            batch_size=WRITE_BATCH_SIZE,
+            spool=spool,
+        )
+        _drainer = SpoolDrainer(spool, _writer.write_lines)
+        _drainer.start()
+    return _writer
 
-def send_to_influx(metrics):
-    client = InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG)
-    write_api = client.write_api(write_options=SYNCHRONOUS)
 
+def build_points(metrics):
+    points = []
     for entry in metrics:
         measurement = entry["measurement"]
         data = entry.get("data", {})
@@ -139,6 +92,8 @@ def send_to_influx(metrics):
             tags["type"] = "interface"
         else:
             tags["type"] = measurement
+        if "router" in entry:
+            tags["router"] = entry["router"]
 
         ts = data.get("timestamp")
         timestamp = int(ts) if ts and str(ts).isdigit() else None
@@ -147,55 +102,164 @@ def send_to_influx(metrics):
         for k, v in data.items():
             if k == "timestamp" or v is None:
                 continue
-            point = point.field(k, format_value(k, v))
+            point = point.field(k, v)
         for tag, value in tags.items():
             point = point.tag(tag, value)
         if timestamp:
             point = point.time(timestamp, WritePrecision.NS)
 
-        # 🟡 Ajout ICI du print debug :
-        print("➡️ Sending to InfluxDB:", point.to_line_protocol())
+        if DEBUG_POINTS:
+            logger.info("Point envoyé à InfluxDB: %s", point.to_line_protocol())
+        points.append(point)
+    return points
 
-        write_api.write(bucket=INFLUX_BUCKET, org=INFLUX_ORG, record=point)
 
-    client.close()
+def send_to_influx(metrics):
+    writer = get_writer()
+    writer.add(build_points(metrics))
+    # Lots écrits : journalisés par InfluxWriter.flush()
+    if not writer.flush() and writer.spool.pending_bytes():
+        logger.warning("InfluxDB indisponible, %d octets en spool", writer.spool.pending_bytes())
+
+
+def close_writer():
+    global _writer, _drainer
+    if _drainer is not None:
+        _drainer.stop()
+        _drainer = None
+    if _writer is not None:
+        _writer.close()
+        _writer = None
+
+
+def collection_cycles():
+    """Yield the parsed metrics of each cycle until run.flag disappears."""
+    if TELEGRAF_MODE == "fleet":
+        if PIPELINE_ROUTERS:
+            load_routers = lambda: routers_from_env(PIPELINE_ROUTERS)
+        else:
+            load_routers = lambda: routers_from_url(ROUTERS_URL, ROUTERS_TOKEN)
+        if PIPELINE_POLLER == "snmp":
+            # Two tries per router must fit in the scheduler timeout
+            poller = SnmpPoller.from_telegraf_config(
+                TELEGRAF_CONFIG, timeout=ROUTER_TIMEOUT / 2, retries=1
+            )
+        else:
+            poller = TelegrafPoller(TELEGRAF_CONFIG)
+        scheduler = RouterScheduler(
+            load_routers,
+            poller,
+            interval=CYCLE_SECONDS,
+            timeout=ROUTER_TIMEOUT,
+            max_concurrency=MAX_CONCURRENT_POLLS,
+            refresh_interval=ROUTERS_REFRESH,
+        )
+        scheduler.start()
+        try:
+            for metrics in scheduler.batches():
+                if not os.path.exists("run.flag"):
+                    break
+                yield metrics
+        finally:
+            scheduler.stop()
+        return
+
+    if TELEGRAF_MODE == "stream":
+        # Intervalle Telegraf aligné sur la fenêtre de lot (voir telegraf.conf)
+        stream = TelegrafStream(TELEGRAF_CONFIG, interval=CYCLE_SECONDS)
+        stream.start()
+        try:
+            for lines in stream.batches(CYCLE_SECONDS):
+                if not os.path.exists("run.flag"):
+                    break
+                LINES_PARSED.inc(len(lines))
+                yield parse_lines(lines)
+        finally:
+            stream.stop()
+        return
+
+    while os.path.exists("run.flag"):
+        started = time.monotonic()
+        result = subprocess.run(
+            ["telegraf", "--config", TELEGRAF_CONFIG, "--test"],
+            capture_output=True,
+            text=True,
+            env={**os.environ, "MIBS": ""}
+        )
+        POLL_DURATION.observe(time.monotonic() - started, router="local")
+        lines = result.stdout.splitlines()
+        LINES_PARSED.inc(len(lines))
+        yield parse_lines(lines)
+        time.sleep(CYCLE_SECONDS)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time one pipeline stage into STAGE_DURATION."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_DURATION.observe(time.perf_counter() - started, stage=name)
 
 
 def signal_handler(signum, frame):
     """Handle graceful shutdown"""
-    print(f"\n🛑 Received signal {signum}. Stopping pipeline...")
+    logger.info("Signal %s reçu, arrêt du pipeline", signum)
     if os.path.exists("run.flag"):
         os.remove("run.flag")
     sys.exit(0)
 
 
 def main():
+    logging.basicConfig(level=LOG_LEVEL, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+
     # Set up signal handlers for graceful shutdown
     signal.signal(signal.SIGTERM, signal_handler)
     signal.signal(signal.SIGINT, signal_handler)
 
     if not os.path.exists("run.flag"):
-        print("❌ run.flag manquant. Créez-le avec : touch run.flag")
+        logger.error("run.flag manquant. Créez-le avec : touch run.flag")
         return
 
+    if TELEGRAF_MODE == "fleet" and not PIPELINE_ROUTERS and not ROUTERS_URL:
+        logger.error("TELEGRAF_MODE=fleet nécessite PIPELINE_ROUTERS_URL ou PIPELINE_ROUTERS, ex. : PIPELINE_ROUTERS=R1=172.16.10.41,R2=172.16.10.42")
+        sys.exit(1)
+
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT)
+
+    snapshot = SnapshotWriter()
+    last_cycle = None
     try:
-        while os.path.exists("run.flag"):
-            result = subprocess.run(
-                ["telegraf", "--config", "/etc/telegraf/telegraf.conf", "--test"],
-                capture_output=True,
-                text=True,
-                env={**os.environ, "MIBS": ""}
-            )
-            parsed_metrics = parse_telegraf_output(result.stdout)
-            send_to_influx(parsed_metrics)
+        for metrics in collection_cycles():
+            cycle_start = time.monotonic()
+            if last_cycle is not None:
+                CYCLE_LAG.set(round(cycle_start - last_cycle - CYCLE_SECONDS, 3))
+            last_cycle = cycle_start
 
-            with open("latest_metrics.json", "w") as f:
-                json.dump(parsed_metrics, f, indent=2)
+            with stage("parse"):
+                metrics = list(metrics)
+            with stage("map"):
+                parsed_metrics = _rates.apply(map_metrics(metrics))
+            POINTS_DROPPED.inc(len(metrics) - len(parsed_metrics), reason="unmapped")
+            with stage("write"):
+                send_to_influx(parsed_metrics)
+            with stage("snapshot"):
+                snapshot.update(parsed_metrics)
+                snapshot.publish()
 
-            print("✅ Données envoyées à InfluxDB.")
-            time.sleep(5)
+            writer = get_writer()
+            SPOOL_DEPTH.set(writer.spool.pending_bytes())
+            # Auto-instrumentation écrite dans le même bucket, datée de la fin du cycle
+            writer.add(REGISTRY.to_points(timestamp=time.time_ns()))
+            writer.flush()
+
+            logger.debug("Cycle terminé: %d points", len(parsed_metrics))
     finally:
-        print("🛑 Pipeline arrêté (run.flag supprimé).")
+        close_writer()
+        logger.info("Pipeline arrêté (run.flag supprimé)")
+
 
 if __name__ == "__main__":
     main()
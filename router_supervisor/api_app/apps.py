@@ -3,4 +3,9 @@ from django.apps import AppConfig
 
 class ApiAppConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'api_app'
\ No newline at end of file
+    name = 'router_supervisor.api_app'
+    label = 'api_app'
+
+    def ready(self):
+        from .identity_cache import connect_signals
+        connect_signals()
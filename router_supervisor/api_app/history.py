@@ -0,0 +1,146 @@
+"""
+Historical series for charts, downsampled on the server.
+
+The ``aggregateWindow`` size is derived from the time range and the number
+of points the chart can draw (its pixel width), so InfluxDB returns about
+``points`` rows whatever the range: a 30-day chart gets ~1000 points, not
+millions of raw samples. With ``lttb`` the query over-samples and
+largest-triangle-three-buckets (NumPy, optional) keeps the points that
+preserve the visual shape, peaks included.
+
+When the rollup tiers are enabled, the query router in :mod:`.rollups`
+reads the coarsest pre-aggregated bucket that still fits the window.
+
+Series are returned in columnar form: ``{"t": [epoch ms...], "v": [...]}``.
+"""
+
+import math
+import re
+from datetime import datetime, timedelta, timezone
+
+from .rollups import select_source
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+DEFAULT_POINTS = 1000
+MAX_POINTS = 5000
+# Facteur de sur-échantillonnage avant décimation LTTB
+LTTB_OVERSAMPLE = 4
+AGGREGATES = ('mean', 'max', 'min', 'last', 'sum')
+
+_RELATIVE = re.compile(r'^-(\d+)(s|m|h|d|w)$')
+_UNITS = {'s': 'seconds', 'm': 'minutes', 'h': 'hours', 'd': 'days', 'w': 'weeks'}
+
+
+def parse_time(value, now=None):
+    """Relative duration (``-30d``), ``now``, epoch seconds or ISO 8601 → aware UTC datetime."""
+    now = now or datetime.now(timezone.utc)
+    value = value.strip()
+    if value in ('', 'now', 'now()'):
+        return now
+    match = _RELATIVE.match(value)
+    if match:
+        return now - timedelta(**{_UNITS[match.group(2)]: int(match.group(1))})
+    if re.fullmatch(r'\d+(\.\d+)?', value):
+        return datetime.fromtimestamp(float(value), timezone.utc)
+    parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+
+def window_seconds(start, stop, points):
+    """Smallest whole-second window giving at most ``points`` windows over [start, stop)."""
+    span = (stop - start).total_seconds()
+    return max(1, math.ceil(span / points))
+
+
+def _flux_string(value):
+    escaped = value.replace('\\', '\\\\').replace('"', '\\"').replace('${', '\\${')
+    return f'"{escaped}"'
+
+
+def _flux_time(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def build_history_query(bucket, measurement, field, start, stop, every,
+                        router=None, interface=None, fn='mean', agg=None):
+    """
+    Flux query for one field, merged into a single series of ``every``-second
+    windows (sorted by time first: group() leaves the merged series interleaved).
+    """
+    filters = [f'r._measurement == {_flux_string(measurement)} and r._field == {_flux_string(field)}']
+    if agg:
+        # Bucket d'agrégats : on relit l'agrégat de même nature (max des max, ...)
+        filters.append(f'r.agg == {_flux_string(agg)}')
+    if router:
+        filters.append(f'r.router == {_flux_string(router)}')
+    if interface:
+        filters.append(
+            f'(r.interface_name == {_flux_string(interface)} or r.ifDescr == {_flux_string(interface)})'
+        )
+    predicate = ' and '.join(filters)
+    return f'''
+        from(bucket: {_flux_string(bucket)})
+          |> range(start: {_flux_time(start)}, stop: {_flux_time(stop)})
+          |> filter(fn: (r) => {predicate})
+          |> group()
+          |> sort(columns: ["_time"])
+          |> aggregateWindow(every: {every}s, fn: {fn}, createEmpty: false)
+          |> keep(columns: ["_time", "_value"])
+    '''
+
+
+def lttb(t, v, threshold):
+    """Largest-triangle-three-buckets decimation of the series (t, v) to ``threshold`` points."""
+    n = len(t)
+    if threshold >= n or threshold < 3:
+        return t, v
+    x = np.asarray(t, dtype=np.float64)
+    y = np.asarray(v, dtype=np.float64)
+    keep = np.empty(threshold, dtype=np.int64)
+    keep[0], keep[-1] = 0, n - 1
+
+    # Bornes des seaux intermédiaires (le premier et le dernier point sont conservés)
+    edges = np.linspace(1, n - 1, threshold - 1).astype(np.int64)
+    previous = 0
+    for i in range(threshold - 2):
+        lo, hi = edges[i], edges[i + 1]
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        # Aire (au facteur 1/2 près) du triangle point retenu / candidat / moyenne du seau suivant
+        area = np.abs(
+            (x[previous] - avg_x) * (y[lo:hi] - y[previous])
+            - (x[previous] - x[lo:hi]) * (avg_y - y[previous])
+        )
+        previous = lo + int(area.argmax())
+        keep[i + 1] = previous
+    return x[keep].astype(np.int64).tolist(), y[keep].tolist()
+
+
+def fetch_history(query_fn, bucket, measurement, field, start, stop, points=DEFAULT_POINTS,
+                  router=None, interface=None, fn='mean', decimate=False, rollups=False):
+    """Run the downsampled query with ``query_fn`` and return the columnar series."""
+    target = points * LTTB_OVERSAMPLE if decimate and NUMPY_AVAILABLE else points
+    source = select_source(bucket, start, window_seconds(start, stop, target), fn, enabled=rollups)
+    every = source.every
+    flux = build_history_query(source.bucket, measurement, field, start, stop, every,
+                               router, interface, fn, source.agg)
+
+    t, v = [], []
+    for table in query_fn(flux):
+        for record in table.records:
+            value = record.get_value()
+            if value is None:
+                continue
+            t.append(int(record.get_time().timestamp() * 1000))
+            v.append(value)
+    if decimate and NUMPY_AVAILABLE:
+        t, v = lttb(t, v, points)
+    return {'every': f'{every}s', 'source': source.bucket, 't': t, 'v': v}
@@ -0,0 +1,149 @@
+"""
+In-process identity cache for the rows every ingest path looks up.
+
+Routers (with their threshold), KPIs and interfaces are loaded once as full
+snapshots keyed by name and (router_id, interface name), so steady-state
+lookups issue no query at all. post_save/post_delete on the underlying models
+(connected in ``ApiAppConfig.ready()``) bump a version counter once the
+transaction commits; the next lookup sees the version change and reloads.
+The counter is also mirrored in the Django cache (read at most once per
+VERSION_CHECK_INTERVAL) so that, with a cache backend shared between workers,
+a change made in one process invalidates the others too.
+"""
+
+import logging
+import threading
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from router_supervisor.core_models.models import KPI, Interface, Router, Threshold
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'identity_cache:version'
+VERSION_CHECK_INTERVAL = 1.0
+
+# Champs qui changent l'identité d'une ligne ; une sauvegarde limitée à
+# d'autres champs (ex. traffic) n'invalide pas le cache.
+IDENTITY_FIELDS = {
+    Router: {'name', 'ip_address', 'threshold'},
+    KPI: {'name'},
+    Interface: {'name', 'router'},
+    Threshold: {'cpu', 'ram', 'traffic'},
+}
+
+
+class IdentityCache:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local_version = 0
+        self._loaded = None
+        self.routers = {}
+        self.kpis = {}
+        self.interfaces = {}
+        self.reloads = 0
+        self._shared_version = 0
+        self._shared_checked = 0.0
+
+    def _current_version(self):
+        now = time.monotonic()
+        if now - self._shared_checked >= VERSION_CHECK_INTERVAL:
+            try:
+                self._shared_version = cache.get(VERSION_KEY, 0)
+            except Exception:
+                self._shared_version = 0
+            self._shared_checked = now
+        return (self._local_version, self._shared_version)
+
+    def invalidate(self):
+        """Mark every snapshot stale, here and (if shared) in other workers."""
+        with self._lock:
+            self._local_version += 1
+        try:
+            if not cache.add(VERSION_KEY, 1, timeout=None):
+                cache.incr(VERSION_KEY)
+        except Exception:
+            logger.debug("Identity cache version not shared", exc_info=True)
+
+    def warm(self):
+        """Load all snapshots now (called at worker start)."""
+        self.ensure_fresh(force=True)
+        logger.info(
+            f"Identity cache warmed: {len(self.routers)} routers, "
+            f"{len(self.kpis)} KPIs, {len(self.interfaces)} interfaces"
+        )
+
+    def ensure_fresh(self, force=False):
+        version = self._current_version()
+        if not force and version == self._loaded:
+            return
+        with self._lock:
+            if not force and version == self._loaded:
+                return
+            routers = {}
+            for router in Router.objects.select_related('threshold').order_by('pk'):
+                routers.setdefault(router.name, router)
+            # Adresse en repli (tag agent_host de Telegraf) ; un nom identique reste prioritaire
+            for router in list(routers.values()):
+                if router.ip_address:
+                    routers.setdefault(router.ip_address, router)
+            kpis = {}
+            for kpi in KPI.objects.order_by('pk'):
+                kpis.setdefault(kpi.name, kpi)
+            interfaces = {}
+            for interface in Interface.objects.order_by('pk'):
+                interfaces.setdefault((interface.router_id, interface.name), interface)
+            self.routers, self.kpis, self.interfaces = routers, kpis, interfaces
+            self._loaded = version
+            self.reloads += 1
+
+    def router(self, name):
+        self.ensure_fresh()
+        return self.routers.get(name)
+
+    def kpi(self, name):
+        self.ensure_fresh()
+        kpi = self.kpis.get(name)
+        if kpi is None:
+            kpi, _ = KPI.objects.get_or_create(name=name)
+            # Publié seulement une fois la ligne validée (pas d'id d'une transaction annulée)
+            transaction.on_commit(lambda: self._remember_kpi(name, kpi))
+        return kpi
+
+    def _remember_kpi(self, name, kpi):
+        with self._lock:
+            self.kpis.setdefault(name, kpi)
+
+    def interface(self, router_id, name):
+        self.ensure_fresh()
+        return self.interfaces.get((router_id, name))
+
+    def default_interface(self, router_id):
+        """Interface named 'default', where the router-level KPIs are logged."""
+        return self.interface(router_id, 'default')
+
+
+IDENTITY_CACHE = IdentityCache()
+
+
+def _on_save(sender, update_fields=None, **kwargs):
+    fields = IDENTITY_FIELDS.get(sender)
+    if fields is None:
+        return
+    if update_fields and not fields.intersection(update_fields):
+        return
+    transaction.on_commit(IDENTITY_CACHE.invalidate)
+
+
+def _on_delete(sender, **kwargs):
+    if sender in IDENTITY_FIELDS:
+        transaction.on_commit(IDENTITY_CACHE.invalidate)
+
+
+def connect_signals():
+    """Invalidate the cache when a Router, KPI, Interface or Threshold changes."""
+    post_save.connect(_on_save, dispatch_uid='identity_cache_post_save')
+    post_delete.connect(_on_delete, dispatch_uid='identity_cache_post_delete')
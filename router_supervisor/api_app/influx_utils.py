@@ -1,68 +1,83 @@
+"""
+Shared InfluxDB access for every Django view and command.
+
+One InfluxDBClient per process, created on first use and re-created after a
+fork (gunicorn preload_app), so its urllib3 pool keeps HTTP connections alive
+between dashboard refreshes instead of opening a new one per query.
+Connection settings come from Django settings (INFLUXDB_*).
+"""
+
+import logging
 import os
+import threading
+
+from django.conf import settings
 from influxdb_client import InfluxDBClient
 
+logger = logging.getLogger(__name__)
+
 # Constants for InfluxDB configuration
-INFLUXDB_URL = os.getenv('INFLUXDB_URL', 'http://influxdb:8086')
-INFLUXDB_TOKEN = os.getenv('INFLUXDB_TOKEN', 'BQSixul3bdmN-KtFDG_BPfUgSDGc1ZIntJ-QYa2fiIQjA_2psFN2z21AOmxD2s8fpStGlj8YWyvTCckOeCrFJA==')
-INFLUXDB_ORG = os.getenv('INFLUXDB_ORG', 'telecom-sudparis')
-INFLUXDB_BUCKET = os.getenv('INFLUXDB_BUCKET', 'router-metrics')
+INFLUXDB_URL = settings.INFLUXDB_URL
+INFLUXDB_TOKEN = settings.INFLUXDB_TOKEN
+INFLUXDB_ORG = settings.INFLUXDB_ORG
+INFLUXDB_BUCKET = settings.INFLUXDB_BUCKET
+
+_client = None
+_client_pid = None
+_client_lock = threading.Lock()
+
 
 def get_influx_client():
-    """Get an InfluxDB client instance"""
-    try:
-        client = InfluxDBClient(url=INFLUXDB_URL, token=INFLUXDB_TOKEN, org=INFLUXDB_ORG)
-        # Test the connection
-        client.ping()
-        return client
-    except Exception as e:
-        print(f"Failed to connect to InfluxDB: {e}")
-        return None
+    """Get the process-wide InfluxDB client (do not close it)"""
+    global _client, _client_pid
+    if _client is not None and _client_pid == os.getpid():
+        return _client
+    with _client_lock:
+        if _client is None or _client_pid != os.getpid():
+            try:
+                # Après un fork, le pool hérité du parent est abandonné sans être fermé
+                _client = InfluxDBClient(
+                    url=INFLUXDB_URL,
+                    token=INFLUXDB_TOKEN,
+                    org=INFLUXDB_ORG,
+                    timeout=settings.INFLUXDB_TIMEOUT_MS,
+                    connection_pool_maxsize=settings.INFLUXDB_POOL_SIZE,
+                    enable_gzip=True,
+                )
+                _client_pid = os.getpid()
+            except Exception as e:
+                logger.error(f"Failed to create InfluxDB client: {e}")
+                return None
+    return _client
+
+
+def get_query_api():
+    client = get_influx_client()
+    return client.query_api() if client else None
+
 
 class InfluxDBDashboard:
     def __init__(self):
-        self.url = os.getenv('INFLUXDB_URL', 'http://influxdb:8086')
-        self.token = os.getenv('INFLUXDB_TOKEN', 'BQSixul3bdmN-KtFDG_BPfUgSDGc1ZIntJ-QYa2fiIQjA_2psFN2z21AOmxD2s8fpStGlj8YWyvTCckOeCrFJA==')
-        self.org = os.getenv('INFLUXDB_ORG', 'telecom-sudparis')
-        self.bucket = os.getenv('INFLUXDB_BUCKET', 'router-metrics')
-        self.client = InfluxDBClient(url=self.url, token=self.token, org=self.org)
-        self.query_api = self.client.query_api()
+        self.org = INFLUXDB_ORG
+        self.bucket = INFLUXDB_BUCKET
+        self.client = get_influx_client()
+        # Client indisponible (InfluxDB injoignable) : tableau de bord vide plutôt qu'une erreur
+        self.query_api = self.client.query_api() if self.client else None
 
     def get_interfaces_mbps(self):
-        query = f'''
-        import "influxdata/influxdb/schema"
-        from(bucket: "{self.bucket}")
-          |> range(start: -2m)
-          |> filter(fn: (r) => r._measurement == "interfaces")
-          |> filter(fn: (r) => r._field == "ifInOctets" or r._field == "ifOutOctets")
-          |> group(columns: ["interface_name", "_field"])
-          |> sort(columns: ["_time"])
-          |> tail(n:2)
-        '''
-        result = self.query_api.query(org=self.org, query=query)
+        if self.client is None:
+            return {}
+        # Débits calculés par InfluxDB (derivative) pour toutes les interfaces en une requête
+        from router_supervisor.dashboard_app.influx_utils import get_interface_rates
         # Dictionnaire {iface: {"in": Mbps, "out": Mbps}}
-        stats = {}
-        for table in result:
-            iface = None
-            field = None
-            if len(table.records) < 2:
-                continue
-            t0, v0 = table.records[0].get_time(), table.records[0].get_value()
-            t1, v1 = table.records[1].get_time(), table.records[1].get_value()
-            iface = table.records[0].values.get("interface_name")
-            field = table.records[0].values.get("_field")
-            delta_octets = v1 - v0
-            delta_sec = (t1 - t0).total_seconds()
-            mbps = (delta_octets * 8 / 1_000_000) / delta_sec if delta_sec > 0 else 0
-            if iface not in stats:
-                stats[iface] = {}
-            if field == "ifInOctets":
-                stats[iface]["in"] = mbps
-            elif field == "ifOutOctets":
-                stats[iface]["out"] = mbps
-        return stats
+        return {
+            rates["name"]: {"in": rates["in_mbps"], "out": rates["out_mbps"]}
+            for rates in get_interface_rates()
+        }
 
     def close(self):
-        self.client.close()
+        # Client partagé par le processus : rien à fermer ici
+        pass
 
 def get_influx_dashboard_context():
     # Get the latest data from InfluxDB for the dashboard
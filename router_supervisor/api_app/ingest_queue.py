@@ -0,0 +1,164 @@
+"""
+File-backed ingest queue between receive_metrics and the ingest workers.
+
+Each accepted payload is written as one JSON file (tmp + rename) into
+``incoming/``; names start with a nanosecond timestamp so a sorted listing is
+FIFO. Workers claim files by renaming them into ``processing/`` (atomic, so
+two workers never get the same file), delete them once written to the
+database and move them back on failure. No broker is needed and several
+gunicorn workers can enqueue concurrently.
+
+Failed attempts are counted in the file name (``<name>.a<n>.json``); after
+``max_attempts`` the payload goes to ``dead/`` for inspection instead of
+being retried forever.
+"""
+
+import itertools
+import json
+import logging
+import os
+import re
+import time
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+_sequence = itertools.count()
+_ATTEMPTS_RE = re.compile(r'\.a(\d+)\.json$')
+
+
+class QueueFull(Exception):
+    pass
+
+
+class IngestQueue:
+    def __init__(self, directory, max_items=10000, max_attempts=5):
+        self.directory = directory
+        self.max_items = max_items
+        self.max_attempts = max_attempts
+        self.incoming = os.path.join(directory, 'incoming')
+        self.processing = os.path.join(directory, 'processing')
+        self.tmp = os.path.join(directory, 'tmp')
+        self.dead = os.path.join(directory, 'dead')
+        for path in (self.incoming, self.processing, self.tmp, self.dead):
+            os.makedirs(path, exist_ok=True)
+
+    def _entries(self):
+        with os.scandir(self.incoming) as entries:
+            return sorted(entry.name for entry in entries if entry.name.endswith('.json'))
+
+    def depth(self):
+        with os.scandir(self.incoming) as entries:
+            return sum(1 for entry in entries if entry.name.endswith('.json'))
+
+    def put(self, metrics, key=None):
+        """Enqueue normalized metrics with their batch key; raises QueueFull when over max_items."""
+        if self.depth() >= self.max_items:
+            raise QueueFull(f"ingest queue full ({self.max_items} items)")
+        name = f"{time.time_ns():020d}-{os.getpid()}-{next(_sequence):06d}.json"
+        tmp_path = os.path.join(self.tmp, name)
+        with open(tmp_path, 'w') as handle:
+            json.dump({'key': key, 'metrics': metrics}, handle, separators=(',', ':'))
+        os.replace(tmp_path, os.path.join(self.incoming, name))
+        return name
+
+    def claim(self, max_items):
+        """Move up to max_items of the oldest files to processing/ and return their names."""
+        claimed = []
+        for name in self._entries():
+            try:
+                os.rename(os.path.join(self.incoming, name), os.path.join(self.processing, name))
+            except FileNotFoundError:
+                continue  # pris par un autre worker
+            claimed.append(name)
+            if len(claimed) >= max_items:
+                break
+        return claimed
+
+    def load(self, name):
+        """Return (batch_key, metrics) for a claimed file."""
+        with open(os.path.join(self.processing, name)) as handle:
+            payload = json.load(handle)
+        if isinstance(payload, list):
+            return None, payload
+        return payload.get('key'), payload.get('metrics', [])
+
+    def ack(self, name):
+        try:
+            os.unlink(os.path.join(self.processing, name))
+        except FileNotFoundError:
+            pass
+
+    def release(self, name):
+        """Put a claimed file back at its original place in the queue."""
+        try:
+            os.rename(os.path.join(self.processing, name), os.path.join(self.incoming, name))
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def attempts(name):
+        """Failed attempts already recorded for a queued file."""
+        match = _ATTEMPTS_RE.search(name)
+        return int(match.group(1)) if match else 0
+
+    def fail(self, name):
+        """
+        Record a failed attempt for a claimed file: requeue it at its place
+        with the attempt count bumped, or move it to dead/ once max_attempts
+        is reached. Returns True when the file was dead-lettered.
+        """
+        attempts = self.attempts(name) + 1
+        base = _ATTEMPTS_RE.sub('.json', name)
+        try:
+            if attempts >= self.max_attempts:
+                os.rename(os.path.join(self.processing, name), os.path.join(self.dead, base))
+                return True
+            os.rename(os.path.join(self.processing, name),
+                      os.path.join(self.incoming, base[:-len('.json')] + f'.a{attempts}.json'))
+        except FileNotFoundError:
+            pass
+        return False
+
+    def recover(self):
+        """Requeue files left in processing/ by a worker that died mid-batch."""
+        with os.scandir(self.processing) as entries:
+            names = [entry.name for entry in entries]
+        for name in names:
+            self.release(name)
+        return len(names)
+
+    def stats(self):
+        depth, size, oldest = 0, 0, None
+        with os.scandir(self.incoming) as entries:
+            for entry in entries:
+                if not entry.name.endswith('.json'):
+                    continue
+                depth += 1
+                size += entry.stat().st_size
+                enqueued = int(entry.name.split('-', 1)[0]) / 1e9
+                oldest = enqueued if oldest is None else min(oldest, enqueued)
+        with os.scandir(self.processing) as entries:
+            in_flight = sum(1 for _ in entries)
+        with os.scandir(self.dead) as entries:
+            dead = sum(1 for _ in entries)
+        return {
+            'depth': depth,
+            'bytes': size,
+            'in_flight': in_flight,
+            'dead': dead,
+            'oldest_age_seconds': round(time.time() - oldest, 3) if oldest is not None else 0.0,
+            'max_items': self.max_items,
+        }
+
+
+_queue = None
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        _queue = IngestQueue(settings.INGEST_QUEUE_DIR, settings.INGEST_QUEUE_MAX_ITEMS,
+                             settings.INGEST_MAX_ATTEMPTS)
+    return _queue
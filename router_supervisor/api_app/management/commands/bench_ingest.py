@@ -0,0 +1,102 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+import random
+import time
+
+from router_supervisor.api_app.identity_cache import IDENTITY_CACHE
+from router_supervisor.api_app.metrics_handlers import MetricsProcessor, BulkMetricsProcessor
+from router_supervisor.core_models.models import Router
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare per-row and bulk metrics ingest (queries and wall time); all writes are rolled back'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--routers',
+            type=int,
+            default=10,
+            help='Number of synthetic routers (default: 10)',
+        )
+        parser.add_argument(
+            '--interfaces',
+            type=int,
+            default=8,
+            help='Interfaces per router (default: 8)',
+        )
+        parser.add_argument(
+            '--samples',
+            type=int,
+            default=5,
+            help='Timestamps per router (default: 5)',
+        )
+
+    def handle(self, *args, **options):
+        payload = self.build_payload(options['routers'], options['interfaces'], options['samples'])
+        values = sum(3 + 2 * len(m['router_metrics']['interfaces']) for m in payload)
+        self.stdout.write(f"Payload: {len(payload)} metrics, ~{values} values")
+
+        for label, ingest in (
+            ('per-row', lambda: [MetricsProcessor.process_router_metrics(m) for m in payload]),
+            ('bulk', lambda: BulkMetricsProcessor.ingest(payload)),
+        ):
+            for run, (queries, elapsed) in zip(('cold', 'warm'), self.measure(options['routers'], ingest)):
+                self.stdout.write(self.style.SUCCESS(
+                    f"{label:>8} {run}: {queries:6d} queries, {elapsed * 1000:8.1f} ms "
+                    f"({values / elapsed:,.0f} values/s)"
+                ))
+
+    def build_payload(self, routers, interfaces, samples):
+        now = int(time.time())
+        payload = []
+        for sample in range(samples):
+            for index in range(routers):
+                payload.append({
+                    'router_name': f'bench-router-{index}',
+                    'timestamp': str(now - sample * 10),
+                    'router_metrics': {
+                        'cpu_usage': round(random.uniform(5, 95), 1),
+                        'memory_usage': round(random.uniform(20, 80), 1),
+                        'traffic_mbps': round(random.uniform(0, 500), 2),
+                        'interfaces': [
+                            {
+                                'name': f'GigabitEthernet0/{i}',
+                                'input_rate': round(random.uniform(0, 100), 2),
+                                'output_rate': round(random.uniform(0, 100), 2),
+                                'errors': random.choice((0, 0, 0, 1, 3)),
+                            }
+                            for i in range(interfaces)
+                        ],
+                    },
+                })
+        return payload
+
+    def measure(self, routers, ingest):
+        """
+        Run ingest twice against freshly created routers (first run creates
+        interfaces and KPIs, second is steady state), then roll back.
+        """
+        results = []
+        try:
+            with transaction.atomic():
+                Router.objects.bulk_create([
+                    Router(name=f'bench-router-{i}', ip_address=f'10.255.{i // 250}.{i % 250 + 1}')
+                    for i in range(routers)
+                ])
+                IDENTITY_CACHE.invalidate()
+                IDENTITY_CACHE.ensure_fresh()
+                for _ in range(2):
+                    with CaptureQueriesContext(connection) as captured:
+                        start = time.perf_counter()
+                        ingest()
+                        elapsed = time.perf_counter() - start
+                    results.append((len(captured.captured_queries), elapsed))
+                raise _Rollback
+        except _Rollback:
+            IDENTITY_CACHE.invalidate()
+        return results
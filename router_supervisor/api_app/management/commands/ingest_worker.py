@@ -0,0 +1,162 @@
+from django.core.management.base import BaseCommand
+from django.db import InterfaceError, OperationalError, close_old_connections, connection
+import threading
+import time
+
+from collector.instrumentation import REGISTRY, Counter, Gauge, Histogram, start_metrics_server
+from router_supervisor.api_app.ingest_queue import get_queue
+from router_supervisor.api_app.metrics_handlers import BulkMetricsProcessor
+
+QUEUE_DEPTH = REGISTRY.register(Gauge(
+    "ingest_queue_depth", "Payloads en attente dans la file d'ingestion"))
+QUEUE_AGE = REGISTRY.register(Gauge(
+    "ingest_queue_oldest_age_seconds", "Âge du plus ancien payload en attente"))
+PAYLOADS = REGISTRY.register(Counter(
+    "ingest_payloads_total", "Payloads traités par les workers", labels=("result",)))
+BATCH_LATENCY = REGISTRY.register(Histogram(
+    "ingest_batch_seconds", "Durée d'écriture d'un lot en base"))
+DEAD_LETTERS = REGISTRY.register(Gauge(
+    "ingest_dead_letters", "Payloads abandonnés dans dead/ après trop d'échecs"))
+
+# Base injoignable : rien à reprocher aux payloads, on réessaie sans compter l'échec
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+class Command(BaseCommand):
+    help = 'Drain the receive_metrics ingest queue into the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=2,
+            help='Number of ingest threads (default: 2)',
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=50,
+            help='Payloads merged into one database transaction (default: 50)',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=0.5,
+            help='Sleep when the queue is empty, in seconds (default: 0.5)',
+        )
+        parser.add_argument(
+            '--metrics-port',
+            type=int,
+            default=0,
+            help='Serve /metrics on this port (default: disabled)',
+        )
+
+    def handle(self, *args, **options):
+        queue = get_queue()
+        recovered = queue.recover()
+        if recovered:
+            self.stdout.write(self.style.WARNING(f"{recovered} payload(s) remis en file après arrêt brutal"))
+        if options['metrics_port']:
+            start_metrics_server(options['metrics_port'])
+
+        self.stop = threading.Event()
+        threads = [
+            threading.Thread(
+                target=self.work,
+                args=(queue, options['batch_size'], options['poll_interval']),
+                name=f"ingest-{index}",
+                daemon=True,
+            )
+            for index in range(options['workers'])
+        ]
+        for thread in threads:
+            thread.start()
+        self.stdout.write(self.style.SUCCESS(
+            f"🚀 {len(threads)} worker(s) d'ingestion démarrés sur {queue.directory}"
+        ))
+
+        try:
+            while True:
+                stats = queue.stats()
+                QUEUE_DEPTH.set(stats['depth'])
+                QUEUE_AGE.set(stats['oldest_age_seconds'])
+                DEAD_LETTERS.set(stats['dead'])
+                time.sleep(5)
+        except KeyboardInterrupt:
+            self.stop.set()
+            for thread in threads:
+                thread.join(timeout=10)
+
+    def work(self, queue, batch_size, poll_interval):
+        backoff = poll_interval
+        try:
+            while not self.stop.is_set():
+                names = queue.claim(batch_size)
+                if not names:
+                    self.stop.wait(poll_interval)
+                    continue
+
+                batches, loaded = [], []
+                for name in names:
+                    try:
+                        batches.append(queue.load(name))
+                        loaded.append(name)
+                    except ValueError:
+                        self.stderr.write(f"❌ Payload illisible abandonné : {name}")
+                        PAYLOADS.inc(result="invalid")
+                        queue.ack(name)
+
+                close_old_connections()
+                start = time.perf_counter()
+                try:
+                    BulkMetricsProcessor.ingest_batches(batches)
+                except TRANSIENT_ERRORS as e:
+                    self.stderr.write(f"❌ Base indisponible ({len(loaded)} payloads), nouvel essai dans {backoff:.1f}s : {e}")
+                    PAYLOADS.inc(len(loaded), result="retried")
+                    for name in loaded:
+                        queue.release(name)
+                    self.stop.wait(backoff)
+                    backoff = min(backoff * 2, 30)
+                    continue
+                except Exception as e:
+                    # Un payload invalide ne doit pas bloquer le lot : on les reprend un par un
+                    self.stderr.write(f"⚠️ Échec du lot ({len(loaded)} payloads), reprise payload par payload : {e}")
+                    if not self.write_one_by_one(queue, loaded, batches):
+                        self.stop.wait(backoff)
+                        backoff = min(backoff * 2, 30)
+                        continue
+                else:
+                    BATCH_LATENCY.observe(time.perf_counter() - start)
+                    PAYLOADS.inc(len(loaded), result="written")
+                    for name in loaded:
+                        queue.ack(name)
+                backoff = poll_interval
+        finally:
+            connection.close()
+
+    def write_one_by_one(self, queue, names, batches):
+        """
+        Write each payload in its own transaction. A payload that fails is
+        requeued with its attempt count bumped, or dead-lettered after
+        max_attempts. Returns False if the database went away meanwhile.
+        """
+        for position, (name, batch) in enumerate(zip(names, batches)):
+            try:
+                BulkMetricsProcessor.ingest_batches([batch])
+            except TRANSIENT_ERRORS as e:
+                self.stderr.write(f"❌ Base indisponible, {len(names) - position} payload(s) remis en file : {e}")
+                PAYLOADS.inc(len(names) - position, result="retried")
+                for remaining in names[position:]:
+                    queue.release(remaining)
+                return False
+            except Exception as e:
+                if queue.fail(name):
+                    self.stderr.write(f"❌ Payload {name} abandonné après {queue.max_attempts} échecs, déplacé dans dead/ : {e}")
+                    PAYLOADS.inc(result="dead")
+                else:
+                    self.stderr.write(f"⚠️ Payload {name} en échec ({queue.attempts(name) + 1}/{queue.max_attempts}) : {e}")
+                    PAYLOADS.inc(result="failed")
+                continue
+            PAYLOADS.inc(result="written")
+            queue.ack(name)
+        return True
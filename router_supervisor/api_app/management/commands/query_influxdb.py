@@ -1,6 +1,5 @@
 from django.core.management.base import BaseCommand
-from influxdb_client import InfluxDBClient
-import os
+from router_supervisor.api_app.influx_utils import get_influx_client, INFLUXDB_BUCKET, INFLUXDB_ORG
 
 
 class Command(BaseCommand):
@@ -25,14 +24,10 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        # InfluxDB connection settings
-        url = os.getenv('INFLUXDB_URL', 'http://localhost:8086')
-        token = os.getenv('INFLUXDB_TOKEN', 'my-super-secret-auth-token')
-        org = os.getenv('INFLUXDB_ORG', 'telecom-sudparis')
-        bucket = os.getenv('INFLUXDB_BUCKET', 'router-metrics')
-
-        client = InfluxDBClient(url=url, token=token, org=org)
-        query_api = client.query_api()
+        # InfluxDB connection settings (Django settings INFLUXDB_*)
+        org = INFLUXDB_ORG
+        bucket = INFLUXDB_BUCKET
+        query_api = get_influx_client().query_api()
 
         try:
             if options['stats']:
@@ -43,8 +38,6 @@ class Command(BaseCommand):
             self.stdout.write(
                 self.style.ERROR(f'Error querying InfluxDB: {e}')
             )
-        finally:
-            client.close()
 
     def show_metrics(self, query_api, bucket, org, router_name, hours):
         """Show recent router metrics"""
@@ -0,0 +1,88 @@
+from datetime import datetime, timedelta, timezone
+
+from django.core.management.base import BaseCommand
+from influxdb_client import BucketRetentionRules, TaskCreateRequest, TaskUpdateRequest
+
+from router_supervisor.api_app.influx_utils import get_influx_client, INFLUXDB_BUCKET, INFLUXDB_ORG
+from router_supervisor.api_app.rollups import TIERS, rollup_flux, task_flux, task_name, tier_bucket
+
+
+class Command(BaseCommand):
+    help = 'Create the 1m/5m/1h rollup buckets and the InfluxDB tasks that fill them'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--backfill',
+            type=int,
+            default=0,
+            help='Days of existing raw data to roll up now (default: 0)',
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Print the task Flux without touching InfluxDB',
+        )
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            for tier in TIERS:
+                self.stdout.write(f'// {task_name(INFLUXDB_BUCKET, tier)} -> {tier_bucket(INFLUXDB_BUCKET, tier)}')
+                self.stdout.write(task_flux(INFLUXDB_BUCKET, tier))
+            return
+
+        client = get_influx_client()
+        try:
+            for tier in TIERS:
+                self.ensure_bucket(client, tier)
+                self.ensure_task(client, tier)
+            if options['backfill']:
+                self.backfill(client, options['backfill'])
+        except Exception as e:
+            self.stdout.write(self.style.ERROR(f'Error setting up rollups: {e}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS(
+            '✅ Paliers prêts : activez INFLUXDB_ROLLUPS=1 pour que l\'API d\'historique les utilise'
+        ))
+
+    def ensure_bucket(self, client, tier):
+        buckets_api = client.buckets_api()
+        name = tier_bucket(INFLUXDB_BUCKET, tier)
+        retention = BucketRetentionRules(type='expire', every_seconds=int(tier.retention.total_seconds()))
+        bucket = buckets_api.find_bucket_by_name(name)
+        if bucket is None:
+            buckets_api.create_bucket(bucket_name=name, retention_rules=retention, org=INFLUXDB_ORG)
+            self.stdout.write(f'📦 Bucket {name} créé (rétention {tier.retention.days} j)')
+        else:
+            bucket.retention_rules = [retention]
+            buckets_api.update_bucket(bucket)
+            self.stdout.write(f'✅ Bucket {name} déjà présent')
+
+    def ensure_task(self, client, tier):
+        tasks_api = client.tasks_api()
+        name = task_name(INFLUXDB_BUCKET, tier)
+        flux = task_flux(INFLUXDB_BUCKET, tier)
+        existing = tasks_api.find_tasks(name=name)
+        if existing:
+            # Réexécution : on remet la requête à jour plutôt que de dupliquer la tâche
+            tasks_api.update_task_request(existing[0].id, TaskUpdateRequest(flux=flux, status='active'))
+            self.stdout.write(f'🔄 Tâche {name} mise à jour')
+        else:
+            tasks_api.create_task(task_create_request=TaskCreateRequest(
+                org=INFLUXDB_ORG, flux=flux, status='active',
+                description=f'Rollup {tier.name} of {INFLUXDB_BUCKET}',
+            ))
+            self.stdout.write(f'⏱️ Tâche {name} créée (toutes les {tier.every}s)')
+
+    def backfill(self, client, days):
+        query_api = client.query_api()
+        now = datetime.now(timezone.utc)
+        for tier in TIERS:
+            start = max(now - timedelta(days=days), now - tier.retention)
+            # Par tranches d'un jour pour rester sous le délai max d'une requête
+            chunk_start = start
+            while chunk_start < now:
+                chunk_stop = min(chunk_start + timedelta(days=1), now)
+                query_api.query(rollup_flux(INFLUXDB_BUCKET, tier, chunk_start, chunk_stop), org=INFLUXDB_ORG)
+                chunk_start = chunk_stop
+            self.stdout.write(f'📈 {tier_bucket(INFLUXDB_BUCKET, tier)} rempli depuis {start:%Y-%m-%d %H:%M}')
@@ -1,9 +1,15 @@
+import json
 import logging
+import threading
+from collections import Counter, OrderedDict
 from datetime import datetime
+from decimal import Decimal, InvalidOperation
 from router_supervisor.core_models.models import Router, Interface, KPI, KPI_Interface_Log
-from django.db import transaction
+from django.db import connection, transaction
 from django.utils import timezone
 
+from .identity_cache import IDENTITY_CACHE
+
 logger = logging.getLogger(__name__)
 
 class MetricsProcessor:
@@ -71,25 +77,22 @@ class MetricsProcessor:
     @staticmethod
     def _get_or_create_router(router_name):
         """Get or create a router instance"""
-        try:
-            return Router.objects.get(name=router_name)
-        except Router.DoesNotExist:
+        router = IDENTITY_CACHE.router(router_name)
+        if router is None:
             logger.warning(f"Router {router_name} not found in database")
             # We don't create router automatically as it should have threshold configured
-            return None
+        return router
     
     @staticmethod
     def _get_or_create_kpi(kpi_name):
         """Get or create a KPI instance"""
-        kpi, created = KPI.objects.get_or_create(name=kpi_name)
-        return kpi
+        return IDENTITY_CACHE.kpi(kpi_name)
     
     @staticmethod
     def _get_or_create_interface(router, interface_name, initial_traffic=0):
         """Get or create an interface instance"""
-        try:
-            return Interface.objects.get(router=router, name=interface_name)
-        except Interface.DoesNotExist:
+        interface = IDENTITY_CACHE.interface(router.pk, interface_name)
+        if interface is None:
             # Create new interface with default traffic
             interface = Interface(
                 router=router,
@@ -97,11 +100,7 @@ class MetricsProcessor:
                 traffic=initial_traffic
             )
             interface.save()
-            return interface
-        except Interface.MultipleObjectsReturned:
-            # If multiple exist, return the first one
-            logger.warning(f"Multiple interfaces found for {interface_name} on router {router.name}")
-            return Interface.objects.filter(router=router, name=interface_name).first()
+        return interface
     
     @staticmethod
     def _process_cpu_metric(router, cpu_usage, timestamp):
@@ -180,7 +179,7 @@ class MetricsProcessor:
             
             # Update interface traffic
             default_interface.traffic = traffic_mbps
-            default_interface.save()
+            default_interface.save(update_fields=['traffic', 'last_updated'])
             
             # Create log entry
             log_id = int(timestamp.timestamp())
@@ -220,7 +219,7 @@ class MetricsProcessor:
             
             # Update interface traffic
             interface.traffic = total_traffic
-            interface.save()
+            interface.save(update_fields=['traffic', 'last_updated'])
             
             # Process interface traffic
             kpi = MetricsProcessor._get_or_create_kpi("Interface Traffic")
@@ -268,9 +267,345 @@ class MetricsProcessor:
         """Get or create a default interface for a router"""
         try:
             # Try to get an existing interface
-            return Interface.objects.filter(router=router).first() or \
+            return IDENTITY_CACHE.default_interface(router.pk) or \
                    MetricsProcessor._get_or_create_interface(router, "default")
         except Exception as e:
             logger.exception(f"Error getting default interface: {str(e)}")
             # Create a new default interface
-            return MetricsProcessor._get_or_create_interface(router, "default")
\ No newline at end of file
+            return MetricsProcessor._get_or_create_interface(router, "default")
+
+# Tags identifiant le routeur d'un point Telegraf, par priorité (router : posé par le pipeline)
+ROUTER_TAGS = ('router', 'agent_host', 'host')
+TELEGRAF_ROUTER_FIELDS = ('cpu_usage', 'memory_usage', 'traffic_mbps')
+# Métriques écartées depuis le démarrage du worker, par raison (voir ingest-status)
+DROPPED_METRICS = Counter()
+
+
+def normalize_metrics(data):
+    """
+    Flatten a receive-metrics payload into standard router metric dicts
+    ({'router_name', 'router_metrics', 'timestamp'}). Points that cannot be
+    ingested are counted in DROPPED_METRICS and logged once per payload.
+    """
+    if isinstance(data, dict):
+        items = data['metrics'] if 'metrics' in data else data
+        items = items if isinstance(items, list) else [items]
+    elif isinstance(data, list):
+        items = data
+    else:
+        logger.warning(f"Unexpected data format: {type(data)}")
+        return []
+
+    normalized = []
+    dropped = Counter()
+    for metric in items:
+        if not isinstance(metric, dict):
+            dropped['unknown_format'] += 1
+            continue
+        if 'fields' in metric and 'name' in metric:
+            fields = metric.get('fields', {})
+            tags = metric.get('tags', {})
+            router_name = next((tags[tag] for tag in ROUTER_TAGS if tags.get(tag)), None)
+            router_metrics = {key: fields[key] for key in TELEGRAF_ROUTER_FIELDS if key in fields}
+            if router_name is None:
+                dropped['no_router_tag'] += 1
+            elif not router_metrics:
+                # Mesure sans KPI routeur (interfaces, ping...) : rien à écrire en base
+                dropped['no_router_fields'] += 1
+            else:
+                normalized.append({
+                    'router_name': router_name,
+                    'router_metrics': router_metrics,
+                    'timestamp': metric.get('timestamp'),
+                })
+            continue
+        if 'router_metrics' in metric:
+            normalized.append(metric)
+        elif 'simulated_router_metrics' in metric:
+            simulated = metric['simulated_router_metrics']
+            if isinstance(simulated, str):
+                try:
+                    simulated = json.loads(simulated)
+                except json.JSONDecodeError:
+                    dropped['invalid_simulated'] += 1
+                    continue
+                normalized.append(simulated)
+            else:
+                normalized.append(metric)
+        else:
+            dropped['unknown_format'] += 1
+
+    if dropped:
+        DROPPED_METRICS.update(dropped)
+        # Une push Telegraf ordinaire contient toujours des mesures sans KPI routeur
+        unexpected = sum(count for reason, count in dropped.items() if reason != 'no_router_fields')
+        log = logger.warning if unexpected else logger.debug
+        log(f"Dropped {sum(dropped.values())} of {len(items)} metrics: {dict(dropped)}")
+    return normalized
+
+
+def _parse_timestamp(timestamp):
+    if isinstance(timestamp, (int, float)) or (isinstance(timestamp, str) and timestamp.isdigit()):
+        return datetime.fromtimestamp(int(timestamp))
+    return timezone.now()
+
+
+def _decimal(value):
+    """Quantize like the DecimalField(decimal_places=2) columns so equal values compare equal."""
+    try:
+        result = Decimal(str(value)).quantize(Decimal('0.01'))
+    except (InvalidOperation, ValueError):
+        return Decimal(0)
+    # NaN passe quantize() mais ne peut pas être écrit dans la colonne
+    return result if result.is_finite() else Decimal(0)
+
+
+class RecentKeys:
+    """Bounded LRU of recently written keys (and their values), one per worker process."""
+
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                return default
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def __contains__(self, key):
+        return self.get(key, self) is not self
+
+    def update(self, items):
+        with self._lock:
+            for key, value in items:
+                self._items[key] = value
+                self._items.move_to_end(key)
+            while len(self._items) > self.capacity:
+                self._items.popitem(last=False)
+
+
+class BulkMetricsProcessor:
+    """
+    Set-based ingest of a whole payload.
+
+    Routers, KPIs and interfaces come from the shared identity cache (no
+    query in steady state; missing interfaces are created in one
+    bulk_create), and every KPI_Interface_Log row is written with a single conflict-aware
+    bulk_create (INSERT ... ON CONFLICT DO UPDATE), instead of the
+    get/get_or_create/save sequence MetricsProcessor runs for each value.
+    """
+
+    ROUTER_KPIS = (
+        ('cpu_usage', 'CPU', 'cpu'),
+        ('memory_usage', 'RAM', 'ram'),
+        ('traffic_mbps', 'Traffic', 'traffic'),
+    )
+    KPI_NAMES = ('CPU', 'RAM', 'Traffic', 'Interface Traffic', 'Interface Errors')
+
+    # Lots et lignes déjà écrits par ce worker : un rejeu ne coûte qu'une recherche en mémoire
+    seen_batches = RecentKeys(10000)
+    seen_rows = RecentKeys(100000)
+
+    @classmethod
+    def ingest(cls, data):
+        """Ingest a raw payload; returns the number of log rows written."""
+        return cls.ingest_normalized(normalize_metrics(data))
+
+    @classmethod
+    def ingest_batches(cls, batches):
+        """
+        Ingest (batch_key, metrics) pairs in one transaction, skipping batches
+        this worker already committed. Returns the number of log rows written.
+        """
+        keys, metrics = [], []
+        for key, batch in batches:
+            if key is not None and (key in cls.seen_batches or key in keys):
+                logger.debug(f"Skipping replayed batch {key}")
+                continue
+            keys.append(key)
+            metrics.extend(batch)
+        written = cls.ingest_normalized(metrics) if metrics else 0
+        transaction.on_commit(lambda: cls.seen_batches.update((key, True) for key in keys if key is not None))
+        return written
+
+    @classmethod
+    def ingest_normalized(cls, metrics):
+        if not metrics:
+            return 0
+
+        try:
+            return cls._ingest(metrics)
+        except Exception:
+            # Le cache a pu retenir des lignes créées dans la transaction annulée
+            IDENTITY_CACHE.invalidate()
+            raise
+
+    @classmethod
+    def _ingest(cls, metrics):
+        with transaction.atomic():
+            routers = cls._resolve_routers({m.get('router_name', 'unknown') for m in metrics})
+            kpis = {name: IDENTITY_CACHE.kpi(name) for name in cls.KPI_NAMES}
+            interfaces, defaults = cls._resolve_interfaces(routers.values(), metrics)
+
+            rows = {}
+            touched_interfaces = {}
+            unknown = Counter()
+            for metric in metrics:
+                router = routers.get(metric.get('router_name', 'unknown'))
+                if router is None:
+                    unknown[metric.get('router_name')] += 1
+                    continue
+                log_id = int(_parse_timestamp(metric.get('timestamp')).timestamp())
+                values = metric.get('router_metrics', {})
+                default_interface = defaults[router.pk]
+
+                for key, kpi_name, threshold_field in cls.ROUTER_KPIS:
+                    value = values.get(key)
+                    if value is None:
+                        continue
+                    cls._check_threshold(router, kpi_name, threshold_field, value)
+                    rows[(default_interface.pk, log_id, kpis[kpi_name].pk)] = _decimal(value)
+                    if key == 'traffic_mbps':
+                        cls._set_traffic(default_interface, value, touched_interfaces)
+
+                for interface_data in values.get('interfaces', []) or []:
+                    interface = interfaces[(router.pk, interface_data.get('name', 'unknown'))]
+                    total_traffic = interface_data.get('input_rate', 0) + interface_data.get('output_rate', 0)
+                    errors = interface_data.get('errors', 0)
+                    cls._check_threshold(router, 'Interface Traffic', 'traffic', total_traffic)
+                    cls._set_traffic(interface, total_traffic, touched_interfaces)
+                    rows[(interface.pk, log_id, kpis['Interface Traffic'].pk)] = _decimal(total_traffic)
+                    if errors > 0:
+                        rows[(interface.pk, log_id, kpis['Interface Errors'].pk)] = _decimal(errors)
+
+            if unknown:
+                DROPPED_METRICS['unknown_router'] += sum(unknown.values())
+                logger.warning(f"Routers not found in database: {dict(unknown)}")
+
+            # Lignes identiques à ce que ce worker a déjà écrit : rien à envoyer
+            rows = {key: value for key, value in rows.items() if cls.seen_rows.get(key) != value}
+
+            if touched_interfaces:
+                Interface.objects.bulk_update(list(touched_interfaces.values()), ['traffic', 'last_updated'])
+            written = cls._upsert_logs(rows) if rows else 0
+            transaction.on_commit(lambda: cls.seen_rows.update(rows.items()))
+        return written
+
+    @staticmethod
+    def _set_traffic(interface, value, touched_interfaces):
+        value = _decimal(value)
+        if interface.traffic is None or _decimal(interface.traffic) != value:
+            interface.traffic = value
+            # bulk_update n'applique pas auto_now
+            interface.last_updated = timezone.now()
+            touched_interfaces[interface.pk] = interface
+
+    @staticmethod
+    def _upsert_logs(rows, chunk_size=500):
+        """
+        Insert new log rows and update changed ones in one statement per chunk;
+        rows whose value is unchanged are left alone (ON CONFLICT ... WHERE).
+        Returns the number of rows inserted or updated.
+        """
+        if connection.vendor not in ('postgresql', 'sqlite'):
+            KPI_Interface_Log.objects.bulk_create(
+                [
+                    KPI_Interface_Log(interface_id=interface_id, log_id=log_id, kpi_id=kpi_id, value=value)
+                    for (interface_id, log_id, kpi_id), value in rows.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['interface', 'log_id', 'kpi'],
+                update_fields=['value'],
+            )
+            return len(rows)
+
+        quote = connection.ops.quote_name
+        table = quote(KPI_Interface_Log._meta.db_table)
+        columns = [
+            quote(KPI_Interface_Log._meta.get_field(name).column)
+            for name in ('interface', 'log_id', 'kpi', 'value', 'timestamp')
+        ]
+        interface_col, log_col, kpi_col, value_col = columns[:4]
+        now = connection.ops.adapt_datetimefield_value(timezone.now())
+        items = list(rows.items())
+        written = 0
+        with connection.cursor() as cursor:
+            for start in range(0, len(items), chunk_size):
+                chunk = items[start:start + chunk_size]
+                params = []
+                for (interface_id, log_id, kpi_id), value in chunk:
+                    params.extend((interface_id, log_id, kpi_id,
+                                   connection.ops.adapt_decimalfield_value(value, 15, 2), now))
+                cursor.execute(
+                    f"INSERT INTO {table} ({', '.join(columns)}) "
+                    f"VALUES {', '.join(['(%s, %s, %s, %s, %s)'] * len(chunk))} "
+                    f"ON CONFLICT ({interface_col}, {log_col}, {kpi_col}) "
+                    f"DO UPDATE SET {value_col} = EXCLUDED.{value_col} "
+                    f"WHERE {table}.{value_col} <> EXCLUDED.{value_col}",
+                    params,
+                )
+                written += max(cursor.rowcount, 0)
+        return written
+
+    @staticmethod
+    def _check_threshold(router, kpi_name, threshold_field, value):
+        threshold = router.threshold
+        if threshold and value > getattr(threshold, threshold_field):
+            logger.warning(
+                f"{kpi_name} threshold exceeded for {router.name}: "
+                f"{value} > {getattr(threshold, threshold_field)}"
+            )
+
+    @staticmethod
+    def _resolve_routers(names):
+        routers = {}
+        for name in names:
+            router = IDENTITY_CACHE.router(name)
+            if router is not None:
+                routers[name] = router
+        return routers
+
+    @staticmethod
+    def _resolve_interfaces(routers, metrics):
+        """Return ({(router_id, name): Interface}, {router_id: default Interface})."""
+        by_name = {}
+        for router in routers:
+            by_name[router.name] = router
+            # Métriques identifiées par l'adresse du routeur (tag agent_host)
+            if router.ip_address:
+                by_name.setdefault(router.ip_address, router)
+        wanted = {(router.pk, 'default') for router in by_name.values()}
+        for metric in metrics:
+            router = by_name.get(metric.get('router_name', 'unknown'))
+            if router is None:
+                continue
+            for interface_data in metric.get('router_metrics', {}).get('interfaces', []) or []:
+                wanted.add((router.pk, interface_data.get('name', 'unknown')))
+
+        IDENTITY_CACHE.ensure_fresh()
+        missing = [
+            (router_id, name) for router_id, name in wanted
+            if IDENTITY_CACHE.interface(router_id, name) is None
+        ]
+        interfaces = IDENTITY_CACHE.interfaces
+        if missing:
+            Interface.objects.bulk_create(
+                [Interface(router_id=router_id, name=name, traffic=0) for router_id, name in missing],
+                ignore_conflicts=True,
+            )
+            # Lignes non validées : copie locale pour ce lot, le cache partagé
+            # n'est rechargé qu'après le commit (bulk_create n'émet pas post_save)
+            interfaces = dict(interfaces)
+            created = Interface.objects.filter(
+                router_id__in={router_id for router_id, _ in missing},
+                name__in={name for _, name in missing},
+            ).order_by('pk')
+            for interface in created:
+                interfaces.setdefault((interface.router_id, interface.name), interface)
+            transaction.on_commit(IDENTITY_CACHE.invalidate)
+        # KPI du routeur : toujours sur l'interface nommée 'default', jamais sur une autre
+        defaults = {router.pk: interfaces[(router.pk, 'default')] for router in by_name.values()}
+        return interfaces, defaults
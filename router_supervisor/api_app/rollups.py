@@ -0,0 +1,111 @@
+"""
+Rollup tiers of the raw ``router-metrics`` bucket.
+
+Each tier is a bucket (``<bucket>_1m``, ``_5m``, ``_1h``) holding, for every
+numeric field, one point per window and per aggregate, tagged
+``agg=min|max|mean|last``. The 1 min tier is computed from the raw samples
+and each coarser tier from the previous one (min of mins, max of maxes,
+mean of means, last of lasts), by InfluxDB tasks created with
+``manage.py setup_rollups``. Rollup points are stamped with the start of
+their window so a coarser window contains exactly its finer ones.
+
+:func:`select_source` is the query router: it picks the coarsest tier whose
+window still fits the requested resolution and whose retention covers the
+requested start, falling back to the raw bucket.
+"""
+
+from collections import namedtuple
+from datetime import datetime, timedelta, timezone
+
+Tier = namedtuple('Tier', 'name every retention source offset')
+
+# Du plus fin au plus grossier ; chaque palier est calculé depuis le précédent
+TIERS = (
+    Tier('1m', 60, timedelta(days=30), None, 15),
+    Tier('5m', 300, timedelta(days=90), '1m', 30),
+    Tier('1h', 3600, timedelta(days=400), '5m', 60),
+)
+AGGREGATES = ('min', 'max', 'mean', 'last')
+# Fenêtres recalculées à chaque exécution, pour les points arrivés en retard
+LOOKBACK_WINDOWS = 3
+
+Source = namedtuple('Source', 'bucket agg every')
+
+
+def tier_bucket(bucket, tier):
+    return f'{bucket}_{tier.name}'
+
+
+def _tiers_by_name():
+    return {tier.name: tier for tier in TIERS}
+
+
+def rollup_flux(bucket, tier, start=None, stop=None):
+    """
+    Flux computing ``tier`` into its bucket. Without ``start``/``stop`` the
+    range is the last LOOKBACK_WINDOWS complete windows (task mode);
+    otherwise it covers [start, stop) for a backfill.
+    """
+    every = f'{tier.every}s'
+    if start is None:
+        range_clause = (
+            f'stop = date.truncate(t: now(), unit: {every})\n'
+            f'start = date.sub(d: {tier.every * LOOKBACK_WINDOWS}s, from: stop)\n'
+        )
+    else:
+        range_clause = (
+            f'stop = date.truncate(t: {stop.strftime("%Y-%m-%dT%H:%M:%SZ")}, unit: {every})\n'
+            f'start = date.truncate(t: {start.strftime("%Y-%m-%dT%H:%M:%SZ")}, unit: {every})\n'
+        )
+
+    if tier.source is None:
+        source = f'''from(bucket: "{bucket}")
+  |> range(start: start, stop: stop)
+  |> filter(fn: (r) => types.isNumeric(v: r._value))
+  |> toFloat()'''
+    else:
+        source = f'''from(bucket: "{tier_bucket(bucket, _tiers_by_name()[tier.source])}")
+  |> range(start: start, stop: stop)'''
+
+    outputs = []
+    for agg in AGGREGATES:
+        selected = 'data' if tier.source is None else f'data\n  |> filter(fn: (r) => r.agg == "{agg}")'
+        outputs.append(f'''{selected}
+  |> aggregateWindow(every: {every}, fn: {agg}, timeSrc: "_start", createEmpty: false)
+  |> set(key: "agg", value: "{agg}")
+  |> to(bucket: "{tier_bucket(bucket, tier)}")''')
+
+    return (
+        'import "date"\nimport "types"\n\n'
+        + range_clause
+        + f'\ndata = {source}\n\n'
+        + '\n\n'.join(outputs)
+        + '\n'
+    )
+
+
+def task_flux(bucket, tier):
+    """Flux of the InfluxDB task keeping ``tier`` up to date."""
+    header = f'option task = {{name: "{task_name(bucket, tier)}", every: {tier.every}s, offset: {tier.offset}s}}\n\n'
+    return header + rollup_flux(bucket, tier)
+
+
+def task_name(bucket, tier):
+    return f'rollup_{bucket}_{tier.name}'
+
+
+def select_source(bucket, start, every, fn, enabled=True, now=None):
+    """
+    Bucket to query for windows of ``every`` seconds starting at ``start``.
+
+    The coarsest tier whose window divides into ``every`` and whose retention
+    still covers ``start``; ``every`` is rounded up to a multiple of the
+    tier window so no output window straddles two rollup points.
+    """
+    if enabled and fn in AGGREGATES:
+        now = now or datetime.now(timezone.utc)
+        for tier in reversed(TIERS):
+            if tier.every <= every and start >= now - tier.retention:
+                every = -(-every // tier.every) * tier.every
+                return Source(tier_bucket(bucket, tier), fn, every)
+    return Source(bucket, None, every)
@@ -0,0 +1,332 @@
+import io
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+
+from unittest import skipUnless
+
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from router_supervisor.core_models.models import KPI, KPI_Interface_Log, Interface, Router, Threshold
+
+from router_supervisor.api_app.history import (NUMPY_AVAILABLE, build_history_query, fetch_history, lttb,
+                                              window_seconds)
+from router_supervisor.api_app.identity_cache import IDENTITY_CACHE
+from router_supervisor.api_app.ingest_queue import IngestQueue
+from router_supervisor.api_app.management.commands.ingest_worker import Command as IngestWorker
+from router_supervisor.api_app.metrics_handlers import DROPPED_METRICS, BulkMetricsProcessor, _decimal, normalize_metrics
+from router_supervisor.api_app.views import batch_key
+from router_supervisor.api_app.wire_formats import MSGPACK_AVAILABLE, decode_msgpack
+
+
+class IdentityCacheTests(TestCase):
+    def setUp(self):
+        threshold = Threshold.objects.create(name='default', cpu=80, ram=80, traffic=100)
+        self.router = Router.objects.create(name='R1', ip_address='10.0.0.1', username='u',
+                                            password='p', secret='s', threshold=threshold)
+        IDENTITY_CACHE.invalidate()
+
+    def test_save_invalidates_after_commit(self):
+        self.assertEqual(IDENTITY_CACHE.router('R1').pk, self.router.pk)
+        reloads = IDENTITY_CACHE.reloads
+        with self.captureOnCommitCallbacks(execute=True):
+            Router.objects.create(name='R2', ip_address='10.0.0.2', username='u',
+                                  password='p', secret='s', threshold=self.router.threshold)
+            # Pas encore validé : le cache n'est pas rechargé
+            self.assertIsNone(IDENTITY_CACHE.router('R2'))
+        self.assertIsNotNone(IDENTITY_CACHE.router('R2'))
+        self.assertEqual(IDENTITY_CACHE.reloads, reloads + 1)
+
+    def test_unrelated_update_fields_keep_cache(self):
+        interface = Interface.objects.create(router=self.router, name='Gi0/0', traffic=0)
+        IDENTITY_CACHE.router('R1')
+        reloads = IDENTITY_CACHE.reloads
+        with self.captureOnCommitCallbacks(execute=True):
+            interface.traffic = 5
+            interface.save(update_fields=['traffic'])
+        IDENTITY_CACHE.router('R1')
+        self.assertEqual(IDENTITY_CACHE.reloads, reloads)
+
+    def test_kpi_published_after_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            kpi = IDENTITY_CACHE.kpi('Latency')
+            self.assertNotIn('Latency', IDENTITY_CACHE.kpis)
+        self.assertEqual(IDENTITY_CACHE.kpis['Latency'].pk, kpi.pk)
+        self.assertEqual(KPI.objects.filter(name='Latency').count(), 1)
+
+    def test_bulk_ingest_publishes_interfaces_after_commit(self):
+        metrics = [{'router_name': 'R1', 'timestamp': 1700000000,
+                    'router_metrics': {'interfaces': [{'name': 'Gi0/1', 'input_rate': 1, 'output_rate': 2}]}}]
+        with self.captureOnCommitCallbacks(execute=True):
+            interfaces, _ = BulkMetricsProcessor._resolve_interfaces([self.router], metrics)
+            self.assertIn((self.router.pk, 'Gi0/1'), interfaces)
+            self.assertIsNone(IDENTITY_CACHE.interface(self.router.pk, 'Gi0/1'))
+        self.assertIsNotNone(IDENTITY_CACHE.interface(self.router.pk, 'Gi0/1'))
+
+    def test_router_kpis_go_to_the_default_interface(self):
+        Interface.objects.create(router=self.router, name='Gi0/0', traffic=0)
+        metrics = [{'router_name': 'R1', 'timestamp': 1700000000,
+                    'router_metrics': {'cpu_usage': 5, 'traffic_mbps': 12,
+                                       'interfaces': [{'name': 'Gi0/1', 'input_rate': 1, 'output_rate': 2}]}}]
+        with self.captureOnCommitCallbacks(execute=True):
+            BulkMetricsProcessor.ingest_batches([(None, metrics)])
+        default = Interface.objects.get(router=self.router, name='default')
+        self.assertEqual(set(KPI_Interface_Log.objects.filter(kpi__name='CPU').values_list('interface', flat=True)),
+                         {default.pk})
+        self.assertEqual(IDENTITY_CACHE.default_interface(self.router.pk).pk, default.pk)
+
+    def test_traffic_update_refreshes_last_updated(self):
+        interface = Interface.objects.create(router=self.router, name='default', traffic=0)
+        Interface.objects.filter(pk=interface.pk).update(last_updated=datetime(2020, 1, 1, tzinfo=timezone.utc))
+        IDENTITY_CACHE.invalidate()
+        metrics = [{'router_name': 'R1', 'timestamp': 1700000000, 'router_metrics': {'traffic_mbps': 12}}]
+        with self.captureOnCommitCallbacks(execute=True):
+            BulkMetricsProcessor.ingest_batches([(None, metrics)])
+        interface.refresh_from_db()
+        self.assertEqual(interface.traffic, Decimal('12.00'))
+        self.assertGreater(interface.last_updated.year, 2020)
+
+
+class DecimalTests(SimpleTestCase):
+    def test_quantized_like_the_columns(self):
+        self.assertEqual(_decimal(12.346), Decimal('12.35'))
+        self.assertEqual(_decimal('7'), Decimal('7.00'))
+        self.assertEqual(_decimal(0.1 + 0.2), _decimal(0.3))
+
+    def test_invalid_values_are_zero(self):
+        for value in ('n/a', None, float('nan'), float('inf')):
+            self.assertEqual(_decimal(value), Decimal(0), value)
+
+
+class UpsertLogsTests(TestCase):
+    def setUp(self):
+        threshold = Threshold.objects.create(name='default', cpu=80, ram=80, traffic=100)
+        router = Router.objects.create(name='R1', ip_address='10.0.0.1', username='u',
+                                       password='p', secret='s', threshold=threshold)
+        self.interface = Interface.objects.create(router=router, name='default', traffic=0)
+        self.kpi = KPI.objects.create(name='CPU')
+
+    def values(self):
+        return dict(KPI_Interface_Log.objects.values_list('log_id', 'value'))
+
+    def test_insert_update_and_skip_unchanged(self):
+        key = lambda log_id: (self.interface.pk, log_id, self.kpi.pk)
+        written = BulkMetricsProcessor._upsert_logs({key(1): _decimal(10), key(2): _decimal(20)})
+        self.assertEqual(written, 2)
+        self.assertEqual(self.values(), {1: Decimal('10.00'), 2: Decimal('20.00')})
+
+        # Une ligne modifiée, une identique, une nouvelle ; lots de 2 lignes
+        written = BulkMetricsProcessor._upsert_logs(
+            {key(1): _decimal(11), key(2): _decimal(20), key(3): _decimal(30)}, chunk_size=2,
+        )
+        self.assertEqual(written, 2)
+        self.assertEqual(self.values(), {1: Decimal('11.00'), 2: Decimal('20.00'), 3: Decimal('30.00')})
+        self.assertEqual(KPI_Interface_Log.objects.count(), 3)
+
+    def test_router_matched_by_address(self):
+        IDENTITY_CACHE.invalidate()
+        payload = [{'router_name': '10.0.0.1', 'timestamp': 1700000000, 'router_metrics': {'cpu_usage': 7}}]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(BulkMetricsProcessor.ingest_batches([(None, payload)]), 1)
+
+    def test_ingest_is_idempotent(self):
+        IDENTITY_CACHE.invalidate()
+        payload = [{'router_name': 'R1', 'timestamp': 1700000000,
+                    'router_metrics': {'cpu_usage': 42.5, 'memory_usage': 60}}]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(BulkMetricsProcessor.ingest_batches([('batch-a', payload)]), 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(BulkMetricsProcessor.ingest_batches([('batch-a', payload)]), 0)
+        self.assertEqual(KPI_Interface_Log.objects.filter(log_id=1700000000).count(), 2)
+
+
+class BatchKeyTests(SimpleTestCase):
+    def request(self, **headers):
+        return RequestFactory().post('/api/receive-metrics/', **headers)
+
+    def test_header_wins(self):
+        self.assertEqual(batch_key(self.request(HTTP_IDEMPOTENCY_KEY='abc'), []), 'abc')
+
+    def test_digest_only_when_every_metric_is_timestamped(self):
+        stamped = [{'router_name': 'R1', 'timestamp': 1700000000, 'router_metrics': {'cpu_usage': 5}}]
+        self.assertEqual(batch_key(self.request(), stamped), batch_key(self.request(), list(stamped)))
+        # Même valeur sans horodatage : deux vrais échantillons, pas un rejeu
+        unstamped = [{'router_name': 'R1', 'router_metrics': {'cpu_usage': 5}}]
+        self.assertIsNone(batch_key(self.request(), unstamped))
+        self.assertIsNone(batch_key(self.request(), stamped + unstamped))
+
+
+class IngestQueueTests(SimpleTestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = IngestQueue(self.tmp.name, max_attempts=3)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_failed_payload_is_dead_lettered(self):
+        self.queue.put([{'router_name': 'R1'}], 'k')
+        for attempt in range(1, 3):
+            name, = self.queue.claim(10)
+            self.assertFalse(self.queue.fail(name))
+            self.assertEqual(self.queue.attempts(self.queue._entries()[0]), attempt)
+        name, = self.queue.claim(10)
+        self.assertTrue(self.queue.fail(name))
+        self.assertEqual(self.queue.claim(10), [])
+        self.assertEqual(len(os.listdir(self.queue.dead)), 1)
+        self.assertEqual(self.queue.stats()['dead'], 1)
+
+    def test_requeued_payload_keeps_its_place(self):
+        first = self.queue.put([], 'a')
+        self.queue.put([], 'b')
+        name = self.queue.claim(1)[0]
+        self.assertEqual(name, first)
+        self.queue.fail(name)
+        self.assertTrue(self.queue.claim(1)[0].startswith(first[:-len('.json')]))
+
+
+class IngestWorkerTests(TestCase):
+    def setUp(self):
+        threshold = Threshold.objects.create(name='default', cpu=80, ram=80, traffic=100)
+        Router.objects.create(name='R1', ip_address='10.0.0.1', username='u',
+                              password='p', secret='s', threshold=threshold)
+        IDENTITY_CACHE.invalidate()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.queue = IngestQueue(self.tmp.name, max_attempts=2)
+        self.worker = IngestWorker(stdout=io.StringIO(), stderr=io.StringIO())
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def test_bad_payload_does_not_block_the_others(self):
+        good = {'router_name': 'R1', 'timestamp': 1700000000, 'router_metrics': {'cpu_usage': 10}}
+        bad = {'router_name': 'R1', 'timestamp': 1700000005,
+               'router_metrics': {'interfaces': [{'name': 'Gi0/0', 'input_rate': 'n/a', 'output_rate': 1}]}}
+        self.queue.put([good], 'good')
+        self.queue.put([bad], 'bad')
+        for _ in range(2):
+            names = self.queue.claim(10)
+            batches = [self.queue.load(name) for name in names]
+            with self.assertRaises(TypeError):
+                BulkMetricsProcessor.ingest_batches(batches)
+            self.assertTrue(self.worker.write_one_by_one(self.queue, names, batches))
+        self.assertEqual(KPI_Interface_Log.objects.filter(log_id=1700000000).count(), 1)
+        self.assertEqual(self.queue.stats()['depth'], 0)
+        self.assertEqual(len(os.listdir(self.queue.dead)), 1)
+
+
+@skipUnless(MSGPACK_AVAILABLE, "msgpack not installed")
+class MsgpackTests(SimpleTestCase):
+    def decode(self, time):
+        import msgpack
+        body = msgpack.packb({'name': 'router', 'tags': {'router': 'R1'}, 'fields': {'cpu_usage': 5}, 'time': time})
+        return list(decode_msgpack(io.BytesIO(body)))[0]['timestamp']
+
+    def test_integer_times_are_normalised_to_seconds(self):
+        for time in (1700000000, 1700000000123, 1700000000123456, 1700000000123456789):
+            self.assertEqual(self.decode(time), 1700000000, time)
+
+    def test_timestamp_extension(self):
+        import msgpack
+        self.assertEqual(self.decode(msgpack.Timestamp(1700000000, 5)), 1700000000)
+
+    def test_invalid_time_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.decode('yesterday')
+
+
+class NormalizeTelegrafTests(SimpleTestCase):
+    def point(self, tags, fields):
+        return {'name': 'snmp', 'tags': tags, 'fields': fields, 'timestamp': 1700000000}
+
+    def test_router_from_agent_host_or_host(self):
+        metrics = normalize_metrics([
+            self.point({'agent_host': '10.0.0.1', 'host': 'telegraf'}, {'cpu_usage': 5}),
+            self.point({'host': 'R2'}, {'memory_usage': 40}),
+        ])
+        self.assertEqual([(m['router_name'], m['router_metrics']) for m in metrics],
+                         [('10.0.0.1', {'cpu_usage': 5}), ('R2', {'memory_usage': 40})])
+
+    def test_drops_counted_and_logged_once(self):
+        before = DROPPED_METRICS.copy()
+        points = [self.point({}, {'cpu_usage': 5})] * 500 + [self.point({'host': 'R1'}, {'ifInOctets': 1})] * 500
+        with self.assertLogs('router_supervisor.api_app.metrics_handlers', 'WARNING') as logs:
+            self.assertEqual(normalize_metrics(points), [])
+        self.assertEqual(len(logs.output), 1)
+        self.assertEqual(DROPPED_METRICS['no_router_tag'] - before['no_router_tag'], 500)
+        self.assertEqual(DROPPED_METRICS['no_router_fields'] - before['no_router_fields'], 500)
+
+
+class WindowSecondsTests(SimpleTestCase):
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def test_window_fits_the_requested_points(self):
+        self.assertEqual(window_seconds(self.start, self.start + timedelta(days=30), 1000), 2592)
+        self.assertEqual(window_seconds(self.start, self.start + timedelta(seconds=1001), 1000), 2)
+
+    def test_at_least_one_second(self):
+        self.assertEqual(window_seconds(self.start, self.start + timedelta(seconds=10), 1000), 1)
+        self.assertEqual(window_seconds(self.start, self.start, 1000), 1)
+
+
+class HistoryQueryTests(SimpleTestCase):
+    def test_merged_series_sorted_before_aggregate(self):
+        start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+        flux = build_history_query('router-metrics', 'snmp', 'cpu_0_usage', start, start + timedelta(days=1), 60)
+        self.assertLess(flux.index('group()'), flux.index('sort(columns: ["_time"])'))
+        self.assertLess(flux.index('sort(columns: ["_time"])'), flux.index('aggregateWindow('))
+
+
+@skipUnless(NUMPY_AVAILABLE, 'numpy is not installed')
+class LttbTests(SimpleTestCase):
+    def series(self, n=1000, spike=437):
+        t = [i * 1000 for i in range(n)]
+        v = [float(i % 7) for i in range(n)]
+        v[spike] = 500.0
+        return t, v
+
+    def test_keeps_endpoints_and_spike(self):
+        t, v = self.series()
+        dt, dv = lttb(t, v, 100)
+        self.assertEqual(len(dt), 100)
+        self.assertEqual(len(dv), 100)
+        self.assertEqual((dt[0], dt[-1]), (t[0], t[-1]))
+        self.assertIn(437000, dt)
+        self.assertIn(500.0, dv)
+        self.assertEqual(dt, sorted(dt))
+
+    def test_short_series_unchanged(self):
+        t, v = self.series(n=50, spike=10)
+        self.assertEqual(lttb(t, v, 100), (t, v))
+
+    def test_fetch_history_decimates_to_points(self):
+        t, v = self.series()
+        start = datetime.fromtimestamp(0, timezone.utc)
+        records = [SimpleNamespace(get_value=lambda value=value: value,
+                                   get_time=lambda ms=ms: datetime.fromtimestamp(ms / 1000, timezone.utc))
+                   for ms, value in zip(t, v)]
+        result = fetch_history(lambda flux: [SimpleNamespace(records=records)], 'router-metrics', 'snmp', 'cpu_0_usage',
+                               start, start + timedelta(seconds=1000), points=100, decimate=True)
+        self.assertEqual(result['every'], '3s')
+        self.assertEqual(len(result['t']), 100)
+        self.assertIn(500.0, result['v'])
+
+
+@override_settings(PIPELINE_API_TOKEN='secret')
+class PipelineRoutersTests(TestCase):
+    def setUp(self):
+        for name, address in (('R2', '10.0.0.2'), ('R1', '10.0.0.1'), ('lab', '')):
+            Router.objects.create(name=name, ip_address=address, username='u', password='p', secret='s')
+
+    def test_inventory_with_token(self):
+        response = self.client.get('/api/routers/', HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'routers': [
+            {'name': 'R1', 'address': '10.0.0.1'}, {'name': 'R2', 'address': '10.0.0.2'},
+        ]})
+
+    def test_wrong_token_rejected(self):
+        self.assertEqual(self.client.get('/api/routers/', HTTP_AUTHORIZATION='Bearer nope').status_code, 401)
+        self.assertEqual(self.client.get('/api/routers/').status_code, 401)
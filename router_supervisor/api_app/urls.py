@@ -1,7 +1,10 @@
 from django.urls import path
-from .views import receive_metrics, get_latest_metrics
+from .views import receive_metrics, get_latest_metrics, ingest_status, history, pipeline_routers
 
 urlpatterns = [
     path('receive-metrics/', receive_metrics, name='receive_metrics'),
     path('latest-metrics/', get_latest_metrics, name='get_latest_metrics'),
+    path('ingest-status/', ingest_status, name='ingest_status'),
+    path('history/', history, name='history'),
+    path('routers/', pipeline_routers, name='pipeline_routers'),
 ]
\ No newline at end of file
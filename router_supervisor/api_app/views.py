@@ -1,231 +1,165 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
-from django.views.decorators.http import require_POST
+from django.views.decorators.http import require_GET, require_POST
+import hashlib
+import hmac
 import json
 import logging
-import time
+import random
 from datetime import datetime
-from .metrics_handlers import MetricsProcessor
+from .metrics_handlers import DROPPED_METRICS, BulkMetricsProcessor, RecentKeys, normalize_metrics
+from .ingest_queue import QueueFull, get_queue
+from .wire_formats import UnsupportedFormat, decode_body
 import os
 from django.conf import settings
-from influxdb_client import InfluxDBClient
+from router_supervisor.core_models.models import Router
+from router_supervisor.dashboard_app.influx_utils import coalesced_query, get_dashboard_snapshot
+from .history import AGGREGATES, DEFAULT_POINTS, MAX_POINTS, fetch_history, parse_time
 from django.contrib.auth.decorators import login_required
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Clés des lots déjà acceptés par ce worker gunicorn (rejeux Telegraf après coupure réseau)
+ACCEPTED_BATCHES = RecentKeys(10000)
+
+
+def batch_key(request, metrics):
+    """
+    Idempotency key of a batch: the Idempotency-Key header, else a digest of
+    its content when every metric carries its own timestamp, else None
+    """
+    key = request.headers.get('Idempotency-Key')
+    if key:
+        return key[:128]
+    # Sans horodatage, deux vrais échantillons identiques (CPU stable) auraient la même clé :
+    # pas de clé, l'upsert ON CONFLICT suffit à rendre le rejeu idempotent
+    if not metrics or not all(metric.get('timestamp') for metric in metrics):
+        return None
+    canonical = json.dumps(metrics, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.blake2b(canonical.encode('utf-8'), digest_size=16).hexdigest()
+
 @csrf_exempt
 @require_POST
 @login_required
 def receive_metrics(request):
     """
     API endpoint to receive metrics from Telegraf
+    (JSON, Influx line protocol or msgpack, optionally gzip-encoded)
     """
-    # Log the raw request data
-    logger.info(f"Received request from: {request.META.get('REMOTE_ADDR')}")
-    logger.info(f"Request content type: {request.content_type}")
-    logger.info(f"Request headers: {dict(request.headers)}")
-    logger.info(f"Raw request body: {request.body.decode('utf-8', errors='replace')}")
+    # Journalisation du corps brut seulement pour une fraction des requêtes, en DEBUG
+    raw = None
+    if settings.INGEST_DEBUG_SAMPLE_RATE and logger.isEnabledFor(logging.DEBUG) \
+            and random.random() < settings.INGEST_DEBUG_SAMPLE_RATE:
+        raw = request.body
+        logger.debug(f"Received request from: {request.META.get('REMOTE_ADDR')}")
+        logger.debug(f"Request headers: {dict(request.headers)}")
+        logger.debug(f"Raw request body: {raw[:4096]!r}")
     
     try:
-        # Parse the JSON data from the request body
-        data = json.loads(request.body)
+        # Décodage en flux selon Content-Type / Content-Encoding
+        data = decode_body(request, raw)
+        metrics = normalize_metrics(data)
+        key = batch_key(request, metrics)
+        if key is not None and key in ACCEPTED_BATCHES:
+            return JsonResponse({"status": "accepted", "message": "Duplicate batch ignored", "batch": key}, status=202)
         
-        # Log the received data for debugging
-        logger.info(f"Parsed JSON data: {data}")
-        logger.info(f"Data type: {type(data)}")
+        if not settings.INGEST_ASYNC:
+            # Traitement ensembliste : quelques requêtes par lot au lieu de plusieurs par valeur
+            written = BulkMetricsProcessor.ingest_batches([(key, metrics)])
+            if key is not None:
+                ACCEPTED_BATCHES.update([(key, True)])
+            return JsonResponse({"status": "success", "message": "Metrics received", "rows": written, "batch": key})
         
-        # Process the metrics
-        process_metrics(data)
+        # Mise en file : les workers d'ingestion écrivent en base
+        if metrics:
+            try:
+                get_queue().put(metrics, key)
+            except QueueFull as e:
+                logger.warning(f"Load shedding: {e}")
+                response = JsonResponse({"status": "error", "message": str(e)}, status=503)
+                response['Retry-After'] = '5'
+                return response
+            if key is not None:
+                ACCEPTED_BATCHES.update([(key, True)])
         
-        return JsonResponse({"status": "success", "message": "Metrics received"})
+        return JsonResponse({"status": "accepted", "message": "Metrics queued", "metrics": len(metrics), "batch": key}, status=202)
+    
+    except UnsupportedFormat as e:
+        logger.error(str(e))
+        return JsonResponse({"status": "error", "message": str(e)}, status=415)
     
     except json.JSONDecodeError as e:
         error_msg = f"Invalid JSON received: {str(e)}"
         logger.error(error_msg)
         return JsonResponse({"status": "error", "message": error_msg}, status=400)
     
+    except (OSError, EOFError, ValueError) as e:
+        error_msg = f"Invalid payload received: {str(e)}"
+        logger.error(error_msg)
+        return JsonResponse({"status": "error", "message": error_msg}, status=400)
+    
     except Exception as e:
         logger.exception(f"Error processing metrics: {str(e)}")
         return JsonResponse({"status": "error", "message": str(e)}, status=500)
-@login_required
-def process_metrics(data):
+
+
+@require_GET
+def pipeline_routers(request):
     """
-    Process the received metrics data
+    Router inventory polled by the pipeline in fleet mode:
+    {"routers": [{"name", "address"}]}, re-read on every scheduler refresh
     """
-    # Example implementation to process metrics
-    # This would depend on your specific requirements
-    
-    logger.info(f"Processing metrics data of type: {type(data)}")
-    
-    if isinstance(data, list):
-        # Handle list of metrics
-        logger.info(f"Processing metrics as list with {len(data)} items")
-        for item in data:
-            process_single_metric(item)
-    elif isinstance(data, dict):
-        # Check if it's a Telegraf format with 'metrics' key
-        if 'metrics' in data:
-            logger.info("Processing data with 'metrics' key")
-            metrics = data.get('metrics', [])
-            if isinstance(metrics, list):
-                for item in metrics:
-                    process_single_metric(item)
-            else:
-                process_single_metric(metrics)
-        else:
-            # Handle single metric
-            logger.info("Processing single metric item")
-            process_single_metric(data)
-    else:
-        logger.warning(f"Unexpected data format: {type(data)}")
+    token = settings.PIPELINE_API_TOKEN
+    authorization = request.headers.get('Authorization', '')
+    if not request.user.is_authenticated and not (token and hmac.compare_digest(authorization, f'Bearer {token}')):
+        return JsonResponse({"status": "error", "message": "Authentication required"}, status=401)
+
+    routers = [
+        {"name": name, "address": address}
+        for name, address in Router.objects.order_by('name').values_list('name', 'ip_address')
+        if address
+    ]
+    return JsonResponse({"routers": routers})
+
 @login_required
-def process_single_metric(metric):
+def ingest_status(request):
     """
-    Process a single metric entry
+    Depth and age of the ingest queue, metrics dropped by this worker
     """
-    # Log the metric we're processing
-    logger.info(f"Processing single metric: {metric}")
-    
-    try:
-        # Handle Telegraf-specific format
-        if 'fields' in metric and 'name' in metric:
-            logger.info(f"Processing Telegraf native format metric: {metric['name']}")
-            # Extract fields from Telegraf format
-            fields = metric.get('fields', {})
-            tags = metric.get('tags', {})
-            
-            # Create a more generic format that our processor can handle
-            if 'router' in tags:
-                router_name = tags.get('router')
-                router_metrics = {
-                    'cpu_usage': fields.get('cpu_usage', 0),
-                    'memory_usage': fields.get('memory_usage', 0),
-                    'traffic_mbps': fields.get('traffic_mbps', 0),
-                }
-                
-                # Log the transformed data
-                logger.info(f"Transformed Telegraf data: {router_name} - {router_metrics}")
-                
-                # Process with our metrics processor
-                processed_metric = {
-                    'router_name': router_name,
-                    'router_metrics': router_metrics,
-                    'timestamp': metric.get('timestamp', str(int(time.time())))
-                }
-                
-                MetricsProcessor.process_router_metrics(processed_metric)
-                return
-        
-        # Standard format processing
-        # Extract router name if available
-        router_name = metric.get('router_name', 'unknown')
-        
-        # Example processing for different metric types
-        if 'router_metrics' in metric:
-            # Use the metrics processor to handle router metrics
-            success = MetricsProcessor.process_router_metrics(metric)
-            
-            if success:
-                router_metrics = metric['router_metrics']
-                cpu_usage = router_metrics.get('cpu_usage')
-                memory_usage = router_metrics.get('memory_usage')
-                traffic = router_metrics.get('traffic_mbps')
-                
-                logger.info(f"Router {router_name}: CPU: {cpu_usage}%, Memory: {memory_usage}%, Traffic: {traffic} Mbps")
-            else:
-                logger.warning(f"Failed to process metrics for router: {router_name}")
-        
-        # Handle simulated metrics from exec input plugin
-        elif 'simulated_router_metrics' in metric:
-            logger.info(f"Received simulated metrics: {metric}")
-            # Extract fields from the simulated_router_metrics
-            if isinstance(metric['simulated_router_metrics'], str):
-                # Try to parse it as JSON if it's a string
-                try:
-                    router_data = json.loads(metric['simulated_router_metrics'])
-                    MetricsProcessor.process_router_metrics(router_data)
-                except json.JSONDecodeError:
-                    logger.warning(f"Could not parse simulated metrics: {metric['simulated_router_metrics']}")
-            else:
-                logger.info(f"Using simulated metrics directly")
-                MetricsProcessor.process_router_metrics(metric)
-        else:
-            logger.warning(f"Unknown metric format: {metric}")
-            
-    except Exception as e:
-        logger.exception(f"Error processing single metric: {str(e)}")
+    return JsonResponse({**get_queue().stats(), "dropped": dict(DROPPED_METRICS)})
+
 @login_required
 def get_latest_metrics(request):
     """
     API endpoint to get the latest router metrics for the dashboard
     """
     try:
-        # Connect to InfluxDB
-        influx_url = os.environ.get('INFLUXDB_URL', 'http://localhost:8086')
-        influx_token = os.environ.get('INFLUXDB_TOKEN', 'my-super-secret-auth-token')
-        influx_org = os.environ.get('INFLUXDB_ORG', 'telecom-sudparis')
-        influx_bucket = os.environ.get('INFLUXDB_BUCKET', 'router-metrics')
-        
-        client = InfluxDBClient(url=influx_url, token=influx_token, org=influx_org)
-        query_api = client.query_api()
-        
-        # Query for SNMP router metrics
-        snmp_query = f'''
-        from(bucket: "{influx_bucket}")
-          |> range(start: -1h)
-          |> filter(fn: (r) => r["_measurement"] == "snmp")
-          |> sort(columns: ["_time"], desc: true)
-          |> limit(n: 1)
-        '''
-        
-        # Query for ping metrics
-        ping_query = f'''
-        from(bucket: "{influx_bucket}")
-          |> range(start: -1h)
-          |> filter(fn: (r) => r["_measurement"] == "ping")
-          |> sort(columns: ["_time"], desc: true)
-          |> limit(n: 1)
-        '''
-        
-        # Query for interfaces metrics
-        interfaces_query = f'''
-        from(bucket: "{influx_bucket}")
-          |> range(start: -1h)
-          |> filter(fn: (r) => r["_measurement"] == "interfaces")
-          |> sort(columns: ["_time"], desc: true)
-          |> limit(n: 20)
-        '''
-        
-        # Execute the queries
-        snmp_result = query_api.query(org=influx_org, query=snmp_query)
-        ping_result = query_api.query(org=influx_org, query=ping_query)
-        interfaces_result = query_api.query(org=influx_org, query=interfaces_query)
+        # Une seule requête Flux (last + pivot) pour toutes les valeurs du routeur
+        requested = request.GET.get('router')
+        snapshot = get_dashboard_snapshot([requested] if requested else None)
+        router_name = requested if requested in snapshot else next(iter(snapshot), None)
+        values = snapshot.get(router_name, {})
         
         # Process the results
         metrics = {
             'timestamp': datetime.now().isoformat(),
         }
+        if router_name and router_name != 'default':
+            metrics["router_name"] = router_name
         
         # Process SNMP data
-        for table in snmp_result:
-            for record in table.records:
-                field = record.get_field()
-                if field == "hostname":
-                    metrics["router_name"] = record.get_value()
-                elif field == "cpu_5min":
-                    metrics["cpu_5min"] = record.get_value()
-                elif field == "cpu_0_usage":
-                    metrics["cpu_0_usage"] = record.get_value()
-                elif field == "uptime":
-                    # Convert uptime from centiseconds to hours
-                    uptime_centiseconds = record.get_value()
-                    uptime_hours = uptime_centiseconds / 100 / 3600
-                    metrics["uptime"] = round(uptime_hours, 2)
-                elif field == "ram_used":
-                    metrics["ram_used_bytes"] = record.get_value()
-                elif field == "ram_free":
-                    metrics["ram_free_bytes"] = record.get_value()
+        snmp = values.get("snmp", {})
+        for field in ("cpu_5min", "cpu_0_usage"):
+            if field in snmp:
+                metrics[field] = snmp[field]
+        if "uptime" in snmp:
+            # Convert uptime from centiseconds to hours
+            metrics["uptime"] = round(snmp["uptime"] / 100 / 3600, 2)
+        if "ram_used" in snmp:
+            metrics["ram_used_bytes"] = snmp["ram_used"]
+        if "ram_free" in snmp:
+            metrics["ram_free_bytes"] = snmp["ram_free"]
         
         # Calculate RAM usage percentage
         if "ram_used_bytes" in metrics and "ram_free_bytes" in metrics:
@@ -234,41 +168,28 @@ def get_latest_metrics(request):
             metrics["used_percent"] = metrics["ram_used"]
         
         # Process ping data
-        for table in ping_result:
-            for record in table.records:
-                field = record.get_field()
-                if field == "average_response_ms":
-                    metrics["latency_ms"] = record.get_value()
-                elif field == "percent_packet_loss":
-                    metrics["packet_loss"] = record.get_value()
+        ping = values.get("ping", {})
+        if "average_response_ms" in ping:
+            metrics["latency_ms"] = ping["average_response_ms"]
+        if "percent_packet_loss" in ping:
+            metrics["packet_loss"] = ping["percent_packet_loss"]
         
         # Process interfaces data
+        interface_fields = {
+            "ifInOctets": "in_octets",
+            "ifOutOctets": "out_octets",
+            "ifInErrors": "in_errors",
+            "ifOutErrors": "out_errors",
+        }
         interfaces = {}
-        for table in interfaces_result:
-            for record in table.records:
-                # Get interface name from tags
-                tags = record.values
-                if_descr = tags.get("ifDescr", "unknown")
-                
-                if if_descr not in interfaces:
-                    interfaces[if_descr] = {}
-                
-                field = record.get_field()
-                if field == "ifInOctets":
-                    interfaces[if_descr]["in_octets"] = record.get_value()
-                elif field == "ifOutOctets":
-                    interfaces[if_descr]["out_octets"] = record.get_value()
-                elif field == "ifInErrors":
-                    interfaces[if_descr]["in_errors"] = record.get_value()
-                elif field == "ifOutErrors":
-                    interfaces[if_descr]["out_errors"] = record.get_value()
+        for if_descr, fields in values.get("interfaces", {}).items():
+            interfaces[if_descr] = {
+                name: fields[field] for field, name in interface_fields.items() if field in fields
+            }
         
         # Add interfaces to metrics
         metrics["interfaces"] = interfaces
         
-        # Close the client
-        client.close()
-        
         # Fallback values if no data is found
         if not metrics.get("cpu_5min"):
             metrics["cpu_5min"] = 0
@@ -298,4 +219,62 @@ def get_latest_metrics(request):
             "router_name": "Unknown Router",
             "interfaces": {},
             "error": str(e)
-        })
\ No newline at end of file
+        })
+
+
+def iter_columnar(meta, series, chunk_size=1000):
+    """Columnar JSON ({...meta, "t": [...], "v": [...]}) encoded chunk by chunk."""
+    head = json.dumps(meta, separators=(',', ':'), default=str)
+    yield head[:-1] + ','
+    for index, column in enumerate(('t', 'v')):
+        values = series[column]
+        yield f'"{column}":['
+        for offset in range(0, len(values), chunk_size):
+            prefix = ',' if offset else ''
+            yield prefix + ','.join(json.dumps(value) for value in values[offset:offset + chunk_size])
+        yield ']' + (',' if index == 0 else '}')
+
+
+@login_required
+def history(request):
+    """
+    Downsampled history of one field:
+    ?field=<measurement>.<field>&router=&interface=&start=-30d&stop=now&points=1000&fn=mean&lttb=1
+    """
+    params = request.GET
+    measurement, _, field = params.get('field', '').partition('.')
+    if not measurement or not field:
+        return JsonResponse({"status": "error", "message": "field must be <measurement>.<field>"}, status=400)
+    fn = params.get('fn', 'mean')
+    if fn not in AGGREGATES:
+        return JsonResponse({"status": "error", "message": f"fn must be one of {', '.join(AGGREGATES)}"}, status=400)
+    try:
+        start = parse_time(params.get('start', '-1h'))
+        stop = parse_time(params.get('stop', 'now'))
+        points = min(max(int(params.get('points', DEFAULT_POINTS)), 2), MAX_POINTS)
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": f"Invalid parameter: {e}"}, status=400)
+    if stop <= start:
+        return JsonResponse({"status": "error", "message": "start must be before stop"}, status=400)
+    
+    router = params.get('router') or None
+    try:
+        series = fetch_history(
+            coalesced_query, settings.INFLUXDB_BUCKET, measurement, field, start, stop, points,
+            router=router, interface=params.get('interface') or None, fn=fn,
+            decimate=params.get('lttb') in ('1', 'true'), rollups=settings.INFLUXDB_ROLLUPS,
+        )
+    except Exception as e:
+        logger.exception(f"Error getting history: {str(e)}")
+        return JsonResponse({"status": "error", "message": str(e)}, status=502)
+    
+    meta = {
+        "router": router,
+        "field": f"{measurement}.{field}",
+        "start": start.isoformat(),
+        "stop": stop.isoformat(),
+        "every": series['every'],
+        "source": series['source'],
+        "points": len(series['t']),
+    }
+    return StreamingHttpResponse(iter_columnar(meta, series), content_type='application/json')
@@ -0,0 +1,85 @@
+"""
+Request body decoders for receive_metrics.
+
+The body is read as a stream (optionally through gzip) and decoded according
+to its Content-Type: JSON, Influx line protocol (Telegraf ``data_format =
+"influx"``) or msgpack (Telegraf ``data_format = "msgpack"``, needs the
+optional ``msgpack`` package). Line protocol and msgpack metrics are turned
+into the Telegraf native dicts ({name, tags, fields, timestamp}) that
+normalize_metrics already understands.
+"""
+
+import gzip
+import io
+import json
+
+from collector.line_protocol import parse_lines
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+JSON_TYPES = ('application/json', '')
+LINE_PROTOCOL_TYPES = ('text/plain', 'application/x-influx-line-protocol', 'application/vnd.influx')
+MSGPACK_TYPES = ('application/msgpack', 'application/x-msgpack')
+
+
+class UnsupportedFormat(Exception):
+    pass
+
+
+def open_body(request, raw=None):
+    """File-like view of the request body, gunzipped when Content-Encoding says so."""
+    stream = io.BytesIO(raw) if raw is not None else request
+    if request.headers.get('Content-Encoding', '').lower() in ('gzip', 'x-gzip'):
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    return stream
+
+
+def _epoch_seconds(value):
+    """Integer epoch seconds from a timestamp in s, ms, µs or ns (guessed from its magnitude)."""
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ValueError(f"invalid msgpack time: {value!r}")
+    for divisor in (1_000_000_000, 1_000_000, 1_000):
+        # Au-delà de l'an 5000 en secondes : la valeur est dans une unité plus fine
+        if abs(value) >= 100_000_000_000 * divisor // 1_000:
+            return int(value // divisor)
+    return int(value)
+
+
+def _telegraf_dict(name, tags, fields, timestamp):
+    return {'name': name, 'tags': tags, 'fields': fields, 'timestamp': timestamp}
+
+
+def decode_line_protocol(stream):
+    lines = (line.decode('utf-8', errors='replace') for line in stream)
+    for metric in parse_lines(lines):
+        timestamp = metric.timestamp // 1_000_000_000 if metric.timestamp is not None else None
+        yield _telegraf_dict(metric.measurement, metric.tags, metric.fields, timestamp)
+
+
+def decode_msgpack(stream):
+    if not MSGPACK_AVAILABLE:
+        raise UnsupportedFormat("msgpack payloads need the 'msgpack' package")
+    for item in msgpack.Unpacker(stream, raw=False):
+        timestamp = item.get('time')
+        if isinstance(timestamp, msgpack.Timestamp):
+            timestamp = timestamp.seconds
+        elif timestamp is not None:
+            timestamp = _epoch_seconds(timestamp)
+        yield _telegraf_dict(item.get('name'), item.get('tags', {}), item.get('fields', {}), timestamp)
+
+
+def decode_body(request, raw=None):
+    """Decode the request body into the data accepted by normalize_metrics."""
+    content_type = request.content_type or ''
+    stream = open_body(request, raw)
+    if content_type in JSON_TYPES:
+        return json.load(stream)
+    if content_type in LINE_PROTOCOL_TYPES:
+        return list(decode_line_protocol(stream))
+    if content_type in MSGPACK_TYPES:
+        return list(decode_msgpack(stream))
+    raise UnsupportedFormat(f"Unsupported content type: {content_type}")
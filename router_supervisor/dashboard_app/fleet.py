@@ -0,0 +1,166 @@
+"""
+Fleet overview: one summary row per router (last CPU, RAM, latency, uptime,
+active alerts, threshold breaches).
+
+The rows are computed by ``manage.py refresh_dashboard`` from the metrics it
+already fetches, plus two small queries (routers with their thresholds,
+active alert counts), and stored as a plain list in the shared cache.
+``/api/fleet/`` only sorts, filters and slices that list, so a page of
+2,000 routers never touches InfluxDB or the metrics tables.
+
+Metric series are matched to a Router by its configured identity: the
+series name (``hostname`` tag) against ``Router.name`` or
+``Router.ip_address``, else the ``agent_host`` tag against
+``Router.ip_address``. Untagged series (``default``) belong to the router
+when only one is configured. Series matching no router are kept as rows
+flagged ``unmatched`` rather than dropped.
+
+Pagination is keyset-based: the cursor holds the sort value and name of the
+last row returned, so pages stay consistent when the summary is refreshed
+between two requests.
+"""
+
+import base64
+import json
+from bisect import bisect_left, bisect_right
+
+from django.db.models import Count
+
+FLEET_KEY = 'dashboard:fleet'
+SORT_FIELDS = ('name', 'cpu', 'ram', 'latency', 'uptime', 'alerts')
+# Métriques comparées aux seuils du routeur (Threshold.cpu / Threshold.ram, en %)
+BREACH_FIELDS = ('cpu', 'ram')
+DEFAULT_LIMIT = 100
+MAX_LIMIT = 2000
+# Nom des séries sans tag router (influx_utils.DEFAULT_ROUTER)
+UNTAGGED_ROUTER = 'default'
+
+
+def _router_row(name, values):
+    """Summary row from the {"measurement.field": value} of one router."""
+    cpu = values.get('snmp.cpu_0_usage', values.get('snmp.cpu_5min'))
+    ram = None
+    used, free = values.get('snmp.ram_used'), values.get('snmp.ram_free')
+    if used is not None and free:
+        ram = round(used / (used + free) * 100, 2)
+    latency = values.get('ping.average_response_ms', values.get('ping_latency.latency_ms'))
+    uptime = values.get('snmp.uptime')
+    return {
+        'name': name,
+        'cpu': cpu,
+        'ram': ram,
+        'latency': latency,
+        # sysUpTime SNMP en centisecondes → heures
+        'uptime': round(uptime / 360000, 2) if uptime is not None else None,
+        'alerts': 0,
+        'breaches': [],
+        'unmatched': False,
+    }
+
+
+def build_fleet_summary(metrics_data):
+    """One row per router from the latest-metrics records and the database."""
+    from router_supervisor.alerts_app.models import AlertInstance
+    from router_supervisor.core_models.models import Router
+
+    series = {}
+    for metric in metrics_data:
+        tags = metric.get('tags', {})
+        # Valeurs d'interface ignorées : la vue d'ensemble ne garde que le niveau routeur
+        if not tags.get('hostname') or tags.get('ifDescr'):
+            continue
+        values, addresses = series.setdefault(tags['hostname'], ({}, set()))
+        values[f"{metric.get('measurement')}.{metric.get('field')}"] = metric.get('value')
+        if tags.get('agent_host'):
+            addresses.add(tags['agent_host'])
+
+    routers = list(Router.objects.select_related('threshold')
+                   .only('name', 'ip_address', 'threshold__cpu', 'threshold__ram'))
+    by_identity = {router.ip_address: router for router in routers if router.ip_address}
+    by_identity.update((router.name, router) for router in routers)
+
+    values_by_router, unmatched = {}, {}
+    for key, (values, addresses) in series.items():
+        router = by_identity.get(key) or next(
+            (by_identity[address] for address in sorted(addresses) if address in by_identity), None,
+        )
+        if router is None and key == UNTAGGED_ROUTER and len(routers) == 1:
+            router = routers[0]
+        if router is None:
+            unmatched[key] = values
+        else:
+            values_by_router.setdefault(router.name, {}).update(values)
+
+    rows = {}
+    # Routeurs déclarés sans métriques récentes : présents, valeurs à null
+    for router in routers:
+        row = rows[router.name] = _router_row(router.name, values_by_router.get(router.name, {}))
+        if router.threshold is not None:
+            for field in BREACH_FIELDS:
+                limit = getattr(router.threshold, field)
+                if row[field] is not None and limit is not None and row[field] > limit:
+                    row['breaches'].append(field)
+
+    # Séries sans routeur correspondant : signalées, pas fusionnées ni perdues
+    for key, values in unmatched.items():
+        rows[key] = dict(_router_row(key, values), unmatched=True)
+
+    active = (AlertInstance.objects.filter(status='active')
+              .values('router__name').annotate(count=Count('id')))
+    for item in active:
+        row = rows.get(item['router__name'])
+        if row is not None:
+            row['alerts'] = item['count']
+
+    return sorted(rows.values(), key=lambda row: row['name'])
+
+
+def encode_cursor(row, sort):
+    raw = json.dumps([row[sort], row['name']], separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(sort value, name) of the last row of the previous page; ValueError if malformed."""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        value, name = json.loads(base64.urlsafe_b64decode(padded))
+    except (TypeError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise ValueError(f"invalid cursor: {e}")
+    if not isinstance(name, str) or not (value is None or isinstance(value, (int, float, str))):
+        raise ValueError("invalid cursor")
+    return value, name
+
+
+def paginate(rows, sort='name', descending=False, breach=None, cursor=None, limit=DEFAULT_LIMIT):
+    """
+    One page of ``rows`` sorted by ``sort`` (rows without a value last,
+    ties broken by name), optionally only routers breaching a threshold.
+    Returns (page, count, next cursor or None).
+    """
+    if breach:
+        rows = [row for row in rows if row['breaches'] and (breach == 'any' or breach in row['breaches'])]
+
+    present = sorted(((row[sort], row['name']), row) for row in rows if row[sort] is not None)
+    missing = sorted((row['name'], row) for row in rows if row[sort] is None)
+    keys = [key for key, _ in present]
+    ordered = [row for _, row in (reversed(present) if descending else present)]
+    ordered += [row for _, row in missing]
+
+    start = 0
+    if cursor:
+        value, name = decode_cursor(cursor)
+        try:
+            if value is None:
+                start = len(present) + bisect_right([key for key, _ in missing], name)
+            elif descending:
+                start = len(keys) - bisect_left(keys, (value, name))
+            else:
+                start = bisect_right(keys, (value, name))
+        except TypeError:
+            raise ValueError(f"cursor does not match sort '{sort}'")
+
+    page = ordered[start:start + limit]
+    has_more = start + limit < len(ordered)
+    next_cursor = encode_cursor(page[-1], sort) if page and has_more else None
+    return page, len(ordered), next_cursor
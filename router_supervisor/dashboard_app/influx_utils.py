@@ -1,138 +1,170 @@
-from influxdb_client import InfluxDBClient
-
-INFLUX_URL = "http://localhost:8086"
-INFLUX_TOKEN = "BQSixul3bdmN-KtFDG_BPfUgSDGc1ZIntJ-QYa2fiIQjA_2psFN2z21AOmxD2s8fpStGlj8YWyvTCckOeCrFJA=="
-INFLUX_ORG = "telecom-sudparis"
-INFLUX_BUCKET = "router-metrics"
-
-def get_latest_octets():
-    with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-        query_api = client.query_api()
-        flux = f'''
-            from(bucket:"{INFLUX_BUCKET}")
-            |> range(start: -10m)
-            |> filter(fn: (r) => r._measurement == "snmp")
-            |> filter(fn: (r) => r._field == "octets_in")
-            |> sort(columns: ["_time"], desc:true)
-            |> limit(n:1)
-        '''
-        tables = query_api.query(flux)
-        for table in tables:
-            for record in table.records:
-                return float(record.get_value())
-    return 0
-
-def get_latest_cpu_usage():
-    with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-        query_api = client.query_api()
-        flux = f'''
-            from(bucket:"{INFLUX_BUCKET}")
-            |> range(start: -10m)
-            |> filter(fn: (r) => r._measurement == "snmp")
-            |> filter(fn: (r) => r._field == "cpu_0_usage")
-            |> sort(columns: ["_time"], desc:true)
-            |> limit(n:1)
-        '''
-        tables = query_api.query(flux)
-        for table in tables:
-            for record in table.records:
-                return float(record.get_value())
-    return 0
-
-def get_latest_ram_usage():
-    total_ram = 2 * 1024 * 1024 * 1024  # 2 Go en octets
-    with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-        query_api = client.query_api()
-        flux = f'''
-            from(bucket:"{INFLUX_BUCKET}")
-            |> range(start: -10m)
-            |> filter(fn: (r) => r._measurement == "snmp")
-            |> filter(fn: (r) => r._field == "ram_used")
-            |> sort(columns: ["_time"], desc:true)
-            |> limit(n:1)
-        '''
-        tables = query_api.query(flux)
-        for table in tables:
-            for record in table.records:
-                ram_used = float(record.get_value())
-                ram_percent = (ram_used / total_ram) * 100
-                return round(ram_percent, 2)
-    return 0
-
-def get_latest_latency():
-    with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-        query_api = client.query_api()
-        flux = f'''
-            from(bucket:"{INFLUX_BUCKET}")
-            |> range(start: -10m)
-            |> filter(fn: (r) => r._measurement == "ping_latency")
-            |> filter(fn: (r) => r._field == "value")
-            |> sort(columns: ["_time"], desc:true)
-            |> limit(n:1)
-        '''
-        tables = query_api.query(flux)
-        for table in tables:
-            for record in table.records:
-                return float(record.get_value())
-    return 0
-
-def get_latest_system_load():
-    with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-        query_api = client.query_api()
-        flux = f'''
-            from(bucket:"{INFLUX_BUCKET}")
-            |> range(start: -10m)
-            |> filter(fn: (r) => r._measurement == "system")
-            |> filter(fn: (r) => r._field == "load1")
-            |> sort(columns: ["_time"], desc:true)
-            |> limit(n:1)
-        '''
-        tables = query_api.query(flux)
-        for table in tables:
-            for record in table.records:
-                return float(record.get_value())
-    return 0
-
-def get_latest_system_cpu():
-    with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-        query_api = client.query_api()
-        flux = f'''
-            from(bucket:"{INFLUX_BUCKET}")
-            |> range(start: -10m)
-            |> filter(fn: (r) => r._measurement == "cpu-total")
-            |> filter(fn: (r) => r._field == "usage_user")
-            |> sort(columns: ["_time"], desc:true)
-            |> limit(n:1)
-        '''
-        tables = query_api.query(flux)
-        for table in tables:
-            for record in table.records:
-                return float(record.get_value())
-    return 0
-
-def get_latest_uptime():
-    with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-        query_api = client.query_api()
-        flux = f'''
-            from(bucket:"{INFLUX_BUCKET}")
-            |> range(start: -10m)
-            |> filter(fn: (r) => r._measurement == "snmp")
-            |> filter(fn: (r) => r._field == "uptime")
-            |> sort(columns: ["_time"], desc:true)
-            |> limit(n:1)
-        '''
-        tables = query_api.query(flux)
-        for table in tables:
-            for record in table.records:
-                uptime_centiseconds = float(record.get_value())
-                print(f"🔍 DEBUG get_latest_uptime - Valeur brute: {uptime_centiseconds} centisecondes")
-                # Convertir les centisecondes en heures
-                uptime_hours = uptime_centiseconds / 360000
-                print(f"🔍 DEBUG get_latest_uptime - Converti en heures: {uptime_hours}")
-                print(f"🔍 DEBUG get_latest_uptime - Converti en jours: {uptime_hours / 24}")
-                return uptime_hours
-    return 0
+from router_supervisor.api_app.influx_utils import get_influx_client, INFLUXDB_BUCKET as INFLUX_BUCKET
+from .shared_cache import flights, normalize_query
+
+# Valeurs affichées par les cartes du dashboard, par measurement
+SNAPSHOT_FIELDS = {
+    "snmp": ("cpu_0_usage", "cpu_5min", "ram_used", "ram_free", "uptime"),
+    "ping": ("average_response_ms", "percent_packet_loss"),
+    "ping_latency": ("value", "latency_ms"),
+    "system": ("load1",),
+    "cpu-total": ("usage_user",),
+    "interfaces": ("ifInOctets", "ifOutOctets", "ifInErrors", "ifOutErrors", "in_mbps", "out_mbps"),
+}
+
+DEFAULT_ROUTER = "default"
+
+# Deux écrivains dans le même bucket : le pipeline (tag "type" toujours posé,
+# interface_name / router) et la sortie influxdb_v2 de Telegraf (ifDescr,
+# hostname). Leurs séries sont gardées séparées et celles du pipeline priment.
+SOURCE_COLUMN = 'source: if exists r.type then "pipeline" else "telegraf"'
+PREFERRED_SOURCE = "pipeline"
+
+
+def _flux_set(values):
+    return "[" + ", ".join(f'"{value}"' for value in values) + "]"
+
+
+def _router_filter(routers):
+    """Filter keeping ``routers``; series without a router tag count as DEFAULT_ROUTER."""
+    if not routers:
+        return ""
+    predicate = f"contains(value: r.router, set: {_flux_set(routers)})"
+    if DEFAULT_ROUTER in routers:
+        predicate = f"not exists r.router or {predicate}"
+    return f"\n          |> filter(fn: (r) => {predicate})"
+
+
+def _by_source(records):
+    """Records ordered so that those of PREFERRED_SOURCE come last (and win when merged)."""
+    return sorted(records, key=lambda record: record.values.get("source") == PREFERRED_SOURCE)
+
+
+def build_snapshot_query(routers=None, start="-10m"):
+    """
+    One Flux query returning the last value of every card field, for every
+    router (or only ``routers``): one table per router, one row per source
+    for the router-level values (iface == "") and per interface, with a
+    "measurement.field" column per value.
+    """
+    predicate = " or\n               ".join(
+        f'(r._measurement == "{measurement}" and contains(value: r._field, set: {_flux_set(fields)}))'
+        for measurement, fields in SNAPSHOT_FIELDS.items()
+    )
+    return f'''
+        from(bucket: "{INFLUX_BUCKET}")
+          |> range(start: {start})
+          |> filter(fn: (r) => {predicate})''' + _router_filter(routers) + f'''
+          |> last()
+          |> map(fn: (r) => ({{
+              router: if exists r.router then r.router else "{DEFAULT_ROUTER}",
+              iface: if exists r.interface_name then r.interface_name
+                     else if exists r.ifDescr then r.ifDescr else "",
+              {SOURCE_COLUMN},
+              _field: r._measurement + "." + r._field,
+              _value: float(v: r._value),
+          }}))
+          |> group(columns: ["router"])
+          |> pivot(rowKey: ["iface", "source"], columnKey: ["_field"], valueColumn: "_value")
+    '''
+
+
+def coalesced_query(flux):
+    """Run a Flux query, sharing the result with concurrent identical queries in this process."""
+    return flights.do(
+        ('flux', normalize_query(flux)),
+        lambda: get_influx_client().query_api().query(flux),
+    )
+
+
+def get_dashboard_snapshot(routers=None, start="-10m"):
+    """
+    Latest card values in a single round-trip, shaped like the pipeline
+    snapshot: {router: {measurement: {field: value},
+    "interfaces": {interface: {field: value}}}}.
+    """
+    tables = coalesced_query(build_snapshot_query(routers, start))
+    snapshot = {}
+    for table in tables:
+        for record in _by_source(table.records):
+            values = record.values
+            router = snapshot.setdefault(values.get("router") or DEFAULT_ROUTER, {})
+            iface = values.get("iface")
+            for column, value in values.items():
+                if value is None or "." not in column or column.startswith("_"):
+                    continue
+                measurement, field = column.split(".", 1)
+                if iface:
+                    router.setdefault(measurement, {}).setdefault(iface, {})[field] = value
+                else:
+                    router.setdefault(measurement, {})[field] = value
+    return snapshot
+
+
+# Compteurs SNMP → colonnes de débit (octets convertis en Mbit/s, erreurs par seconde)
+RATE_COLUMNS = {
+    "ifInOctets": "in_mbps",
+    "ifOutOctets": "out_mbps",
+    "ifInErrors": "in_errors_per_s",
+    "ifOutErrors": "out_errors_per_s",
+}
+
+
+def build_interface_rates_query(routers=None, start="-2m"):
+    """
+    One Flux query computing the current rate of every interface counter
+    with derivative(nonNegative) (a counter reset yields no rate rather
+    than a negative one), pivoted to one row per router, interface and
+    source. Each series is sorted by time before the derivative so the
+    pipeline and Telegraf copies of a counter are never interleaved.
+    """
+    renames = "\n                     else ".join(
+        f'if r._field == "{counter}" then "{column}"' for counter, column in RATE_COLUMNS.items()
+    )
+    return f'''
+        from(bucket: "{INFLUX_BUCKET}")
+          |> range(start: {start})
+          |> filter(fn: (r) => r._measurement == "interfaces" and contains(value: r._field, set: {_flux_set(RATE_COLUMNS)}))''' + _router_filter(routers) + f'''
+          |> map(fn: (r) => ({{
+              _time: r._time,
+              router: if exists r.router then r.router else "{DEFAULT_ROUTER}",
+              iface: if exists r.interface_name then r.interface_name
+                     else if exists r.ifDescr then r.ifDescr else "",
+              {SOURCE_COLUMN},
+              _field: {renames}
+                     else r._field,
+              _value: float(v: r._value),
+          }}))
+          |> group(columns: ["router", "iface", "source", "_field"])
+          |> sort(columns: ["_time"])
+          |> derivative(unit: 1s, nonNegative: true)
+          |> last()
+          |> map(fn: (r) => ({{r with _value:
+              if r._field == "in_mbps" or r._field == "out_mbps" then r._value * 8.0 / 1000000.0 else r._value}}))
+          |> group()
+          |> pivot(rowKey: ["router", "iface", "source"], columnKey: ["_field"], valueColumn: "_value")
+    '''
+
+
+def get_interface_rates(routers=None, start="-2m"):
+    """
+    Current rates of every interface in a single round-trip:
+    [{"router", "name", "in_mbps", "out_mbps", "in_errors_per_s", "out_errors_per_s"}],
+    from the pipeline series when both writers have the interface.
+    """
+    rates = {}
+    for table in coalesced_query(build_interface_rates_query(routers, start)):
+        for record in _by_source(table.records):
+            values = record.values
+            if not values.get("iface"):
+                continue
+            row = {"router": values.get("router"), "name": values["iface"]}
+            for column in RATE_COLUMNS.values():
+                value = values.get(column)
+                row[column] = round(value, 3) if value is not None else None
+            rates[(row["router"], row["name"])] = row
+    return list(rates.values())
+
 
 def get_router_name():
     # Met un vrai nom si tu le connais, ou trouve le via une autre query ou setting
-    return "Cisco-Router"
\ No newline at end of file
+    return "Cisco-Router"
@@ -0,0 +1,181 @@
+"""
+Live dashboard stream (Server-Sent Events): the async view behind
+``/api/stream/``, served through the regular Django middleware.
+
+Each worker process runs one broadcast loop on the collection cadence
+(DASHBOARD_REFRESH_INTERVAL). For every router that has at least one
+subscriber it reads the payloads pre-computed by ``manage.py
+refresh_dashboard`` once, diffs them against the previous state and pushes
+only the changed fields to every subscriber. Clients never trigger a query:
+40 screens on the same router cost the same as one.
+
+Events: ``snapshot`` (full state, on connect or after falling behind) and
+``delta`` (changed fields only, removed keys set to null).
+
+Django 4.2 does not notice a client that disconnects mid-stream, so a
+stream ends after MAX_STREAM_SECONDS; EventSource reconnects on its own and
+gets a fresh snapshot, and abandoned subscriptions are reclaimed.
+"""
+
+import asyncio
+import json
+import logging
+
+from django.conf import settings
+from django.http import HttpResponseNotAllowed, StreamingHttpResponse
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+# Durée max d'une connexion : le navigateur se reconnecte, les abonnements orphelins sont libérés
+MAX_STREAM_SECONDS = 300
+# Au-delà, le client est trop lent : on vide sa file et on lui renvoie un snapshot
+MAX_PENDING_EVENTS = 8
+
+
+def load_state(router=None):
+    """Current dashboard state for ``router`` (None: all routers), from the shared cache."""
+    from .refresher import get_payload
+    from .shared_cache import get_or_refresh
+    from .views import build_latest_metrics_summary, get_cached_latest_metrics, get_interfaces_data
+
+    metrics = get_payload('latest_metrics_api', router, decode=True)
+    if metrics is None:
+        # Refresher arrêté : calcul via le cache partagé (une fois par processus et par intervalle)
+        records = get_cached_latest_metrics()
+        if router:
+            records = [m for m in records if m.get('tags', {}).get('hostname') == router]
+        metrics = build_latest_metrics_summary(records)
+
+    state = {'metrics': metrics}
+    if router is None:
+        interfaces = get_payload('interfaces', decode=True)
+        if interfaces is None:
+            interfaces = get_or_refresh('dashboard:interfaces', get_interfaces_data)
+        state['interfaces'] = {f"{item.get('router')}/{item['name']}": item for item in interfaces}
+    return state
+
+
+def diff(old, new):
+    """Fields of ``new`` that differ from ``old`` (nested dicts), removed keys as None."""
+    delta = {}
+    for key, value in new.items():
+        previous = old.get(key)
+        if isinstance(value, dict) and isinstance(previous, dict):
+            changed = diff(previous, value)
+            if changed:
+                delta[key] = changed
+        elif value != previous or key not in old:
+            delta[key] = value
+    for key in old.keys() - new.keys():
+        delta[key] = None
+    return delta
+
+
+class _Channel:
+    """Subscribers of one router and the last state sent to them."""
+
+    def __init__(self):
+        self.subscribers = set()
+        self.state = None
+        self.loading = None
+
+
+class Broadcaster:
+    """One state per router, fanned out to every subscriber of the process."""
+
+    def __init__(self, interval=None):
+        self.interval = interval
+        self.channels = {}
+        self._task = None
+
+    async def subscribe(self, router):
+        channel = self.channels.setdefault(router, _Channel())
+        if channel.state is None:
+            # Premiers abonnés simultanés : un seul chargement partagé
+            if channel.loading is None:
+                channel.loading = asyncio.ensure_future(asyncio.to_thread(load_state, router))
+            try:
+                state = await channel.loading
+            except Exception:
+                channel.loading = None
+                if not channel.subscribers:
+                    self.channels.pop(router, None)
+                raise
+            if channel.state is None:
+                channel.state = state
+        queue = asyncio.Queue(maxsize=MAX_PENDING_EVENTS)
+        queue.put_nowait(('snapshot', channel.state))
+        channel.subscribers.add(queue)
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self.run())
+        return queue
+
+    def unsubscribe(self, router, queue):
+        channel = self.channels.get(router)
+        if channel is None:
+            return
+        channel.subscribers.discard(queue)
+        if not channel.subscribers:
+            del self.channels[router]
+
+    def publish(self, channel, event):
+        for queue in channel.subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait(('snapshot', channel.state))
+
+    async def run(self):
+        interval = self.interval or settings.DASHBOARD_REFRESH_INTERVAL
+        while self.channels:
+            await asyncio.sleep(interval)
+            for router, channel in list(self.channels.items()):
+                try:
+                    state = await asyncio.to_thread(load_state, router)
+                except Exception as e:
+                    logger.error(f"Live stream refresh failed for {router or 'all routers'}: {e}")
+                    continue
+                delta = diff(channel.state or {}, state)
+                channel.state = state
+                if delta:
+                    self.publish(channel, ('delta', delta))
+
+
+broadcaster = Broadcaster()
+
+
+def _event(name, data):
+    payload = json.dumps(data, separators=(',', ':'), default=str)
+    return f'event: {name}\ndata: {payload}\n\n'.encode('utf-8')
+
+
+async def _events(router, queue):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + MAX_STREAM_SECONDS
+    try:
+        while loop.time() < deadline:
+            try:
+                event = await asyncio.wait_for(queue.get(), HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield b': keep-alive\n\n'
+                continue
+            yield _event(*event)
+    finally:
+        # Fin normale, déconnexion ou annulation : on libère l'abonnement
+        broadcaster.unsubscribe(router, queue)
+
+
+async def stream_api(request):
+    """``GET /api/stream/[?router=<hostname>]`` as text/event-stream."""
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    router = request.GET.get('router') or None
+    queue = await broadcaster.subscribe(router)
+    response = StreamingHttpResponse(_events(router, queue), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Pas de bufferisation par un éventuel reverse proxy (nginx)
+    response['X-Accel-Buffering'] = 'no'
+    return response
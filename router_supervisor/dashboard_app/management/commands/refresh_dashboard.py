@@ -0,0 +1,45 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+import logging
+import time
+
+from router_supervisor.dashboard_app.refresher import refresh_payloads
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Pre-compute dashboard payloads into the shared cache on the collection cadence'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=settings.DASHBOARD_REFRESH_INTERVAL,
+            help=f'Seconds between refreshes (default: {settings.DASHBOARD_REFRESH_INTERVAL})',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Refresh once and exit',
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        self.stdout.write(self.style.SUCCESS(f'🔄 Rafraîchissement du dashboard toutes les {interval}s'))
+        deadline = time.monotonic()
+        while True:
+            start = time.monotonic()
+            try:
+                payloads = refresh_payloads(interval)
+                logger.debug(f'{len(payloads)} payloads refreshed in {time.monotonic() - start:.3f}s')
+            except Exception as e:
+                self.stderr.write(f'❌ Échec du rafraîchissement, nouvel essai dans {interval}s : {e}')
+                logger.error(f'Error in refresh_dashboard command: {e}', exc_info=True)
+            if options['once']:
+                return
+            # Cadence fixe : on ne cumule pas la durée du calcul
+            deadline += interval
+            time.sleep(max(0.0, deadline - time.monotonic()))
+            if time.monotonic() - deadline > interval:
+                deadline = time.monotonic()
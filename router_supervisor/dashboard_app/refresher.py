@@ -0,0 +1,79 @@
+"""
+Pre-computed dashboard payloads.
+
+``manage.py refresh_dashboard`` calls :func:`refresh_payloads` on the
+collection cadence: it fetches the latest metrics once, builds every
+dashboard response (globally and per router) and stores them already
+serialized in the shared cache, along with the fleet summary rows. Views
+return those bytes directly and only fall back to computing on demand when
+the refresher is not running.
+
+Each cycle writes two keys per router: the cache MAX_ENTRIES
+(CACHE_MAX_ENTRIES) must leave room for them, or the backend culls
+payloads at random and the views fall back to InfluxDB.
+"""
+
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+ALL_ROUTERS = '*'
+
+
+def payload_key(name, router=None):
+    return f'dashboard:payload:{name}:{router or ALL_ROUTERS}'
+
+
+def get_payload(name, router=None, decode=False):
+    """Serialized payload stored by the refresher, or None."""
+    payload = cache.get(payload_key(name, router))
+    if payload is None or not decode:
+        return payload
+    return json.loads(payload)
+
+
+def _dump(value):
+    return json.dumps(value, separators=(',', ':'), default=str).encode('utf-8')
+
+
+def build_payloads():
+    """Return {cache key: serialized bytes} for every dashboard response (and the fleet rows)."""
+    from .fleet import FLEET_KEY, build_fleet_summary
+    from .views import (build_latest_metrics_summary, get_interfaces_data,
+                        get_latest_metrics_from_influx, parse_metrics_for_dashboard)
+
+    metrics_data = get_latest_metrics_from_influx()
+    payloads = {
+        payload_key('latest_metrics'): _dump(metrics_data),
+        payload_key('latest_metrics_api'): _dump(build_latest_metrics_summary(metrics_data)),
+        payload_key('dashboard_context'): _dump(parse_metrics_for_dashboard(metrics_data)),
+        payload_key('interfaces'): _dump(get_interfaces_data()),
+        # Lignes de la vue flotte gardées en liste : /api/fleet/ les trie et les pagine
+        FLEET_KEY: build_fleet_summary(metrics_data),
+    }
+
+    by_router = {}
+    for metric in metrics_data:
+        router = metric.get('tags', {}).get('hostname')
+        if router:
+            by_router.setdefault(router, []).append(metric)
+    for router, records in by_router.items():
+        payloads[payload_key('latest_metrics', router)] = _dump(records)
+        payloads[payload_key('latest_metrics_api', router)] = _dump(build_latest_metrics_summary(records))
+    return payloads
+
+
+def refresh_payloads(interval=None):
+    """Compute and store every payload; they expire if the refresher stops."""
+    interval = interval or settings.DASHBOARD_REFRESH_INTERVAL
+    payloads = build_payloads()
+    max_entries = settings.CACHES['default'].get('OPTIONS', {}).get('MAX_ENTRIES', 300)
+    if len(payloads) > max_entries // 2:
+        logger.warning(f"{len(payloads)} dashboard payloads for a cache of {max_entries} entries: "
+                       f"raise CACHE_MAX_ENTRIES to at least {2 * len(payloads)}")
+    cache.set_many(payloads, timeout=interval * 3)
+    return payloads
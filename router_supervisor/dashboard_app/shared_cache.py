@@ -0,0 +1,161 @@
+"""
+Latest-metrics cache shared by every gunicorn worker (Django CACHES).
+
+Entries are kept for ``fresh`` + ``stale`` seconds. While fresh they are
+served as is; once stale they are still served, and the first request that
+notices takes a short refresh lock and recomputes the value in a
+background thread. Other workers keep serving the stale copy, so the
+producer (InfluxDB) sees at most one refresh per interval for the whole
+deployment instead of one per worker.
+
+Misses are coalesced (single flight): concurrent callers in a process wait
+for the one in-flight computation, and across processes a short cache lock
+lets one worker compute while the others poll the cache for its result.
+
+The refresh lock must be atomic across processes. ``cache.add`` is for the
+locmem, database and Redis backends, but FileBasedCache implements it as a
+check followed by a write, so with that backend the lock is an ``flock``
+on a file next to the cache entries (released by the kernel if the holder
+dies).
+"""
+
+import fcntl
+import hashlib
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache, caches
+from django.core.cache.backends.filebased import FileBasedCache
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = 0.05
+
+
+class _Call:
+    __slots__ = ('done', 'value', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class SingleFlight:
+    """Run ``fn`` once per key at a time; concurrent callers share its result."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value
+        try:
+            call.value = fn()
+            return call.value
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+flights = SingleFlight()
+
+
+def normalize_query(query):
+    """Whitespace-insensitive key for a query string."""
+    return ' '.join(query.split())
+
+
+def _try_lock(lock_key, timeout):
+    """Take the cross-process lock ``lock_key``: its release function, or None if held elsewhere."""
+    if isinstance(caches['default'], FileBasedCache):
+        directory = settings.CACHES['default']['LOCATION']
+        os.makedirs(directory, exist_ok=True)
+        name = hashlib.md5(lock_key.encode('utf-8')).hexdigest()
+        fd = os.open(os.path.join(directory, f'{name}.lock'), os.O_CREAT | os.O_RDWR, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return None
+        # Fermer le descripteur libère le verrou
+        return lambda: os.close(fd)
+    if cache.add(lock_key, 1, timeout=timeout):
+        return lambda: cache.delete(lock_key)
+    return None
+
+
+def _refresh(key, producer, fresh, stale):
+    value = producer()
+    cache.set(key, {'value': value, 'fresh_until': time.time() + fresh}, timeout=fresh + stale)
+    return value
+
+
+def get_or_refresh(key, producer, fresh=None, stale=None):
+    """Return the cached value for ``key``, computing it with ``producer`` when missing."""
+    fresh = settings.DASHBOARD_CACHE_FRESH if fresh is None else fresh
+    stale = settings.DASHBOARD_CACHE_STALE if stale is None else stale
+    lock_key = f'{key}:refreshing'
+
+    entry = cache.get(key)
+    if entry is not None:
+        if time.time() < entry['fresh_until']:
+            return entry['value']
+        # Périmé : on sert la copie et un seul worker la rafraîchit en arrière-plan
+        release = _try_lock(lock_key, max(fresh, 5))
+        if release is not None:
+            threading.Thread(
+                target=_background_refresh,
+                args=(key, producer, fresh, stale, release),
+                name=f'refresh-{key}',
+                daemon=True,
+            ).start()
+        return entry['value']
+
+    return flights.do(key, lambda: _fill(key, producer, fresh, stale, lock_key))
+
+
+def _fill(key, producer, fresh, stale, lock_key):
+    """Compute a missing entry once across processes."""
+    lock_seconds = settings.SINGLE_FLIGHT_LOCK_SECONDS
+    release = _try_lock(lock_key, lock_seconds)
+    if release is not None:
+        try:
+            return _refresh(key, producer, fresh, stale)
+        finally:
+            release()
+
+    # Un autre worker calcule déjà : on attend son résultat dans le cache
+    deadline = time.monotonic() + lock_seconds
+    while time.monotonic() < deadline:
+        time.sleep(POLL_INTERVAL)
+        entry = cache.get(key)
+        if entry is not None:
+            return entry['value']
+    logger.warning(f"No result for {key} after {lock_seconds}s, computing it here")
+    return _refresh(key, producer, fresh, stale)
+
+
+def _background_refresh(key, producer, fresh, stale, release):
+    try:
+        _refresh(key, producer, fresh, stale)
+    except Exception:
+        logger.exception(f"Background refresh of {key} failed")
+    finally:
+        release()
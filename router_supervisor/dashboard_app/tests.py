@@ -1,3 +1,206 @@
-from django.test import TestCase
+import json
+import tempfile
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from router_supervisor.core_models.models import Router, Threshold
+from router_supervisor.dashboard_app import fleet, influx_utils, live_stream, refresher, shared_cache
+
+
+def tables(*rows):
+    return [SimpleNamespace(records=[SimpleNamespace(values=row) for row in rows])]
+
+
+class SnapshotQueryTests(SimpleTestCase):
+    def test_pipeline_values_win_over_telegraf_duplicates(self):
+        rows = tables(
+            {"router": "default", "iface": "", "source": "pipeline", "snmp.uptime": 200.0},
+            {"router": "default", "iface": "", "source": "telegraf", "snmp.uptime": 100.0, "ping.average_response_ms": 3.0},
+            {"router": "default", "iface": "Gi0/0", "source": "telegraf", "interfaces.ifInOctets": 1.0},
+        )
+        with mock.patch.object(influx_utils, "coalesced_query", return_value=rows):
+            snapshot = influx_utils.get_dashboard_snapshot()
+        self.assertEqual(snapshot["default"]["snmp"], {"uptime": 200.0})
+        self.assertEqual(snapshot["default"]["ping"], {"average_response_ms": 3.0})
+        self.assertEqual(snapshot["default"]["interfaces"], {"Gi0/0": {"ifInOctets": 1.0}})
+
+    def test_sources_are_not_merged_before_pivot(self):
+        flux = influx_utils.build_snapshot_query()
+        self.assertIn('pivot(rowKey: ["iface", "source"]', flux)
+
+    def test_default_router_keeps_untagged_series(self):
+        flux = influx_utils.build_snapshot_query(["default", "R1"])
+        self.assertIn('not exists r.router or contains(value: r.router, set: ["default", "R1"])', flux)
+        flux = influx_utils.build_snapshot_query(["R1"])
+        self.assertNotIn("not exists r.router", flux)
+
+
+class InterfaceRatesQueryTests(SimpleTestCase):
+    def test_series_sorted_per_source_before_derivative(self):
+        flux = influx_utils.build_interface_rates_query()
+        group = flux.index('group(columns: ["router", "iface", "source", "_field"])')
+        self.assertLess(group, flux.index('sort(columns: ["_time"])'))
+        self.assertLess(flux.index('sort(columns: ["_time"])'), flux.index("derivative("))
+
+    def test_untagged_series_kept_for_default_router(self):
+        flux = influx_utils.build_interface_rates_query(["default"])
+        self.assertIn("not exists r.router or", flux)
+
+    def test_one_row_per_interface_preferring_pipeline(self):
+        rows = tables(
+            {"router": "default", "iface": "Gi0/0", "source": "pipeline", "in_mbps": 12.3456, "out_mbps": 1.0},
+            {"router": "default", "iface": "Gi0/0", "source": "telegraf", "in_mbps": 99.0, "out_mbps": 99.0},
+            {"router": "default", "iface": "Gi0/1", "source": "telegraf", "in_mbps": 2.0},
+        )
+        with mock.patch.object(influx_utils, "coalesced_query", return_value=rows):
+            rates = {row["name"]: row for row in influx_utils.get_interface_rates()}
+        self.assertEqual(rates["Gi0/0"]["in_mbps"], 12.346)
+        self.assertEqual(rates["Gi0/1"]["in_mbps"], 2.0)
+        self.assertIsNone(rates["Gi0/1"]["out_mbps"])
+
+
+class StreamViewTests(SimpleTestCase):
+    def setUp(self):
+        self.broadcaster = live_stream.Broadcaster(interval=3600)
+        patcher = mock.patch.object(live_stream, "broadcaster", self.broadcaster)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_snapshot_then_unsubscribe_when_stream_ends(self):
+        request = RequestFactory().get("/api/stream/", {"router": "R1"})
+        with mock.patch.object(live_stream, "load_state", return_value={"metrics": {"cpu": 5}}):
+            response = await live_stream.stream_api(request)
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        self.assertEqual(response["Cache-Control"], "no-cache")
+        self.assertIn("R1", self.broadcaster.channels)
+
+        with mock.patch.object(live_stream, "HEARTBEAT_SECONDS", 0.01), \
+                mock.patch.object(live_stream, "MAX_STREAM_SECONDS", 0.05):
+            chunks = [chunk async for chunk in response.streaming_content]
+        self.assertTrue(chunks[0].startswith(b"event: snapshot\n"))
+        self.assertEqual(json.loads(chunks[0].split(b"data: ", 1)[1]), {"metrics": {"cpu": 5}})
+        self.assertIn(b": keep-alive\n\n", chunks[1:])
+        self.assertNotIn("R1", self.broadcaster.channels)
+        self.broadcaster._task.cancel()
+
+    async def test_post_not_allowed(self):
+        response = await live_stream.stream_api(RequestFactory().post("/api/stream/"))
+        self.assertEqual(response.status_code, 405)
+
+
+def metric(hostname, field, value, **tags):
+    return {"measurement": "snmp", "field": field, "value": value, "tags": dict(tags, hostname=hostname)}
+
+
+def add_router(name, ip_address, threshold=None):
+    return Router.objects.create(name=name, ip_address=ip_address, username="u", password="p",
+                                 secret="s", threshold=threshold)
+
+
+class FleetSummaryTests(TestCase):
+    def test_untagged_series_belongs_to_the_single_router(self):
+        threshold = Threshold.objects.create(name="t", ram=90, cpu=50, traffic=100)
+        add_router("Edge", "172.16.10.41", threshold)
+        rows = fleet.build_fleet_summary([metric("default", "cpu_0_usage", 75.0)])
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["name"], "Edge")
+        self.assertEqual(rows[0]["cpu"], 75.0)
+        self.assertEqual(rows[0]["breaches"], ["cpu"])
+
+    def test_series_matched_by_address(self):
+        add_router("Edge", "172.16.10.41")
+        add_router("Core", "10.0.0.2")
+        rows = {row["name"]: row for row in fleet.build_fleet_summary([
+            metric("10.0.0.2", "cpu_0_usage", 10.0),
+            metric("sysname-edge", "cpu_0_usage", 20.0, agent_host="172.16.10.41"),
+        ])}
+        self.assertEqual(set(rows), {"Edge", "Core"})
+        self.assertEqual(rows["Core"]["cpu"], 10.0)
+        self.assertEqual(rows["Edge"]["cpu"], 20.0)
+
+    def test_unmatched_series_reported(self):
+        add_router("Edge", "172.16.10.41")
+        add_router("Core", "10.0.0.2")
+        rows = {row["name"]: row for row in fleet.build_fleet_summary([metric("default", "cpu_0_usage", 5.0)])}
+        self.assertTrue(rows["default"]["unmatched"])
+        self.assertEqual(rows["default"]["cpu"], 5.0)
+        self.assertFalse(rows["Edge"]["unmatched"])
+        self.assertIsNone(rows["Edge"]["cpu"])
+
+
+class FleetPaginationTests(SimpleTestCase):
+    def rows(self):
+        cpus = [30.0, None, 10.0, 30.0, 20.0, None, 50.0]
+        return [dict(fleet._router_row(f"R{i}", {}), cpu=cpu) for i, cpu in enumerate(cpus)]
+
+    def walk(self, **options):
+        names, cursor = [], None
+        while True:
+            page, count, cursor = fleet.paginate(self.rows(), cursor=cursor, limit=2, **options)
+            names += [row["name"] for row in page]
+            if cursor is None:
+                return names, count
+
+    def test_cursor_round_trip(self):
+        row = {"name": "R1", "cpu": 12.5}
+        self.assertEqual(fleet.decode_cursor(fleet.encode_cursor(row, "cpu")), (12.5, "R1"))
+        self.assertEqual(fleet.decode_cursor(fleet.encode_cursor({"name": "R2", "cpu": None}, "cpu")), (None, "R2"))
+
+    def test_pages_cover_every_row_once(self):
+        names, count = self.walk(sort="cpu")
+        self.assertEqual(names, ["R2", "R4", "R0", "R3", "R6", "R1", "R5"])
+        self.assertEqual(count, 7)
+        names, _ = self.walk(sort="cpu", descending=True)
+        self.assertEqual(names, ["R6", "R3", "R0", "R4", "R2", "R1", "R5"])
+
+    def test_malformed_cursor(self):
+        with self.assertRaises(ValueError):
+            fleet.decode_cursor("not-a-cursor")
+        with self.assertRaises(ValueError):
+            fleet.paginate(self.rows(), sort="cpu", cursor=fleet.encode_cursor({"name": "R0", "cpu": "x"}, "cpu"))
+
+
+class RefreshPayloadsTests(SimpleTestCase):
+    @override_settings(CACHES={"default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "refresher-tests",
+        "OPTIONS": {"MAX_ENTRIES": 10},
+    }})
+    def test_warns_when_payloads_outgrow_the_cache(self):
+        payloads = {refresher.payload_key("latest_metrics", f"R{i}"): b"[]" for i in range(6)}
+        with mock.patch.object(refresher, "build_payloads", return_value=payloads), \
+                self.assertLogs(refresher.logger, "WARNING") as logs:
+            refresher.refresh_payloads(5)
+        self.assertIn("CACHE_MAX_ENTRIES", logs.output[0])
+
+
+class RefreshLockTests(SimpleTestCase):
+    def file_cache(self):
+        directory = tempfile.mkdtemp()
+        return override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+            "LOCATION": directory,
+        }})
+
+    def assert_exclusive(self):
+        release = shared_cache._try_lock("dashboard:x:refreshing", 5)
+        self.assertIsNotNone(release)
+        self.assertIsNone(shared_cache._try_lock("dashboard:x:refreshing", 5))
+        other = shared_cache._try_lock("dashboard:y:refreshing", 5)
+        self.assertIsNotNone(other)
+        release()
+        other()
+        shared_cache._try_lock("dashboard:x:refreshing", 5)()
+
+    def test_file_backend_uses_flock(self):
+        with self.file_cache(), mock.patch.object(shared_cache.cache, "add") as add:
+            self.assert_exclusive()
+        add.assert_not_called()
+
+    def test_other_backends_use_cache_add(self):
+        with override_settings(CACHES={"default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache", "LOCATION": "lock-tests",
+        }}):
+            self.assert_exclusive()
@@ -3,11 +3,14 @@ from .views import index
 from django.urls import path
 from .views import latest_metrics_api
 from . import views
+from .live_stream import stream_api
 
 urlpatterns = [
     path('', index, name="dashboard_index"),
     path('api/latest-metrics/', views.latest_metrics_api, name='latest_metrics_api'),
     path('api/interfaces/', views.interfaces_api, name='interfaces_api'),
+    path('api/fleet/', views.fleet_api, name='fleet_api'),
+    path('api/stream/', stream_api, name='stream_api'),
     # path('dashboard/', include("dashboard_app.urls")),
     path('api/latest_metrics/', views.latest_metrics_api, name='latest_metrics'),
 ]
\ No newline at end of file
@@ -1,26 +1,32 @@
 from django.shortcuts import render
-from django.http import JsonResponse
+from django.http import HttpResponse, JsonResponse
+from django.conf import settings
+from django.core.cache import cache
 from django.views.decorators.csrf import csrf_exempt
+from .shared_cache import get_or_refresh
+from .refresher import get_payload
+from .fleet import (BREACH_FIELDS, DEFAULT_LIMIT, FLEET_KEY, MAX_LIMIT, SORT_FIELDS,
+                    build_fleet_summary, paginate)
 from datetime import datetime, timedelta
 import json
 import random
-import threading
-import time as time_module
 
-# Configuration InfluxDB
-INFLUX_URL = "http://influxdb:8086"
-INFLUX_TOKEN = "BQSixul3bdmN-KtFDG_BPfUgSDGc1ZIntJ-QYa2fiIQjA_2psFN2z21AOmxD2s8fpStGlj8YWyvTCckOeCrFJA=="
-INFLUX_ORG = "telecom-sudparis"
-INFLUX_BUCKET = "router-metrics"
-
-# Essayer d'importer InfluxDB client
+# Essayer d'importer le client InfluxDB partagé (configuré par les settings INFLUXDB_*)
 try:
-    from influxdb_client import InfluxDBClient
+    from router_supervisor.api_app.influx_utils import get_influx_client, INFLUXDB_BUCKET as INFLUX_BUCKET
+    from .influx_utils import get_dashboard_snapshot, get_interface_rates
     INFLUX_AVAILABLE = True
 except ImportError:
     INFLUX_AVAILABLE = False
     print("InfluxDB client not available, using fallback data")
 
+# Snapshot des dernières valeurs écrit par le pipeline (lecture sans InfluxDB)
+try:
+    from collector.snapshot import read_snapshot, snapshot_age_seconds
+    SNAPSHOT_AVAILABLE = True
+except ImportError:
+    SNAPSHOT_AVAILABLE = False
+
 def get_fallback_metrics():
     """Retourne des données de fallback réalistes basées sur les vraies métriques SNMP"""
     now = datetime.now().isoformat()
@@ -43,33 +49,41 @@ def get_fallback_metrics():
         {"measurement": "interfaces", "field": "ifOutOctets", "value": random.randint(800000, 3000000), "time": now, "tags": {"hostname": "Cisco-Router-Main", "ifDescr": "GigabitEthernet0/0"}},
     ]
 
-# Cache simple pour éviter les requêtes répétées
-class MetricsCache:
-    def __init__(self, ttl=3):  # TTL de 3 secondes
-        self.cache = {}
-        self.ttl = ttl
-        self.lock = threading.Lock()
-    
-    def get(self, key):
-        with self.lock:
-            if key in self.cache:
-                data, timestamp = self.cache[key]
-                if time_module.time() - timestamp < self.ttl:
-                    return data
-                else:
-                    del self.cache[key]
-            return None
-    
-    def set(self, key, value):
-        with self.lock:
-            self.cache[key] = (value, time_module.time())
+def get_latest_metrics_from_snapshot():
+    """Dernières métriques depuis le snapshot du pipeline, ou None s'il est absent ou trop ancien"""
+    if not SNAPSHOT_AVAILABLE:
+        return None
+    snapshot = read_snapshot(getattr(settings, 'METRICS_SNAPSHOT_PATH', '/tmp/metrics/latest_metrics.snap'))
+    if not snapshot or snapshot_age_seconds(snapshot) > getattr(settings, 'METRICS_SNAPSHOT_MAX_AGE', 30):
+        return None
+
+    return snapshot_to_records(snapshot.get('routers', {})) or None
 
-# Instance globale du cache
-metrics_cache = MetricsCache()
+def snapshot_to_records(routers):
+    """Convertit un snapshot {routeur: {measurement: {champ: valeur}}} en liste de métriques"""
+    now = datetime.now().isoformat()
+    metrics_data = []
+    for router_name, measurements in routers.items():
+        for measurement, values in measurements.items():
+            if measurement == 'interfaces':
+                for interface_name, fields in values.items():
+                    tags = {'hostname': router_name, 'ifDescr': interface_name}
+                    for field, value in fields.items():
+                        if field != 'timestamp':
+                            metrics_data.append({"measurement": measurement, "field": field, "value": value, "time": now, "tags": tags})
+                continue
+            tags = {'hostname': router_name}
+            for field, value in values.items():
+                if field != 'timestamp':
+                    metrics_data.append({"measurement": measurement, "field": field, "value": value, "time": now, "tags": tags})
+    return metrics_data
 
 def get_latest_metrics_from_influx():
     """Récupère les dernières métriques depuis InfluxDB avec cache"""
-    print("🔍 DEBUG: get_latest_metrics_from_influx appelée - VERSION INFLUXDB RÉELLE")
+    # Chemin rapide : snapshot local du pipeline, sans requête InfluxDB
+    snapshot_metrics = get_latest_metrics_from_snapshot()
+    if snapshot_metrics:
+        return snapshot_metrics
     
     # Vérifier si InfluxDB est disponible
     if not INFLUX_AVAILABLE:
@@ -77,49 +91,16 @@ def get_latest_metrics_from_influx():
         return get_fallback_metrics()
     
     try:
-        # Récupérer les données d'InfluxDB
-        with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-            query_api = client.query_api()
-            
-            # Requête pour récupérer les dernières métriques
-            flux_query = f'''
-                from(bucket:"{INFLUX_BUCKET}")
-                |> range(start: -10m)
-                |> filter(fn: (r) => r._measurement == "snmp" or r._measurement == "ping")
-                |> filter(fn: (r) => r._field == "cpu_0_usage" or r._field == "cpu_5min" or r._field == "ram_used" or r._field == "ram_free" or r._field == "uptime" or r._field == "average_response_ms" or r._field == "ifInOctets" or r._field == "ifOutOctets")
-                |> sort(columns: ["_time"], desc:true)
-                |> limit(n:1)
-            '''
-            
-            tables = query_api.query(flux_query)
-            metrics_data = []
-            
-            for table in tables:
-                for record in table.records:
-                    metric = {
-                        "measurement": record.get_measurement(),
-                        "field": record.get_field(),
-                        "value": record.get_value(),
-                        "time": record.get_time().isoformat(),
-                        "tags": dict(record.values)
-                    }
-                    
-                    # Debug spécial pour l'uptime
-                    if record.get_field() == "uptime":
-                        print(f"🔍 DEBUG UPTIME RÉCUPÉRÉ - Valeur brute: {record.get_value()}")
-                        print(f"🔍 DEBUG UPTIME RÉCUPÉRÉ - Type: {type(record.get_value())}")
-                        print(f"🔍 DEBUG UPTIME RÉCUPÉRÉ - Mesure: {record.get_measurement()}")
-                        print(f"🔍 DEBUG UPTIME RÉCUPÉRÉ - Champ: {record.get_field()}")
-                    
-                    metrics_data.append(metric)
+        # Une seule requête Flux (last + pivot) pour toutes les cartes et tous les routeurs
+        metrics_data = snapshot_to_records(get_dashboard_snapshot())
+        
+        if metrics_data:
+            print(f"✅ Données récupérées d'InfluxDB avec succès: {len(metrics_data)} métriques")
+            return metrics_data
+        else:
+            print("⚠️ Aucune donnée trouvée dans InfluxDB, utilisation des données de fallback")
+            return get_fallback_metrics()
             
-            if metrics_data:
-                print(f"✅ Données récupérées d'InfluxDB avec succès: {len(metrics_data)} métriques")
-                return metrics_data
-            else:
-                print("⚠️ Aucune donnée trouvée dans InfluxDB, utilisation des données de fallback")
-                return get_fallback_metrics()
-                
     except Exception as e:
         print(f"❌ Erreur lors de la récupération des données InfluxDB: {e}")
         return get_fallback_metrics()
@@ -165,26 +146,15 @@ def parse_metrics_for_dashboard(metrics_data):
             elif field == 'ram_free':
                 ram_free = value
             elif field == 'uptime':
-                # Debug: afficher la valeur brute
-                print(f"🔍 DEBUG Uptime - Valeur brute: {value}")
-                print(f"🔍 DEBUG Uptime - Type: {type(value)}")
-                
-                # Tester différentes conversions
-                centiseconds_to_hours = value / 360000
-                seconds_to_hours = value / 3600
-                
-                print(f"🔍 DEBUG Uptime - Si centisecondes -> heures: {centiseconds_to_hours}")
-                print(f"🔍 DEBUG Uptime - Si secondes -> heures: {seconds_to_hours}")
-                
                 # Correction temporaire : multiplier par 1000 pour tester
                 # Si 0.28 heures devient 280 heures, le problème est la conversion
                 context['uptime'] = round(value / 360000 * 1000, 2)
-                print(f"🔍 DEBUG Uptime - Valeur corrigée (x1000): {context['uptime']}")
         
         # Traiter les métriques de ping
         elif measurement == 'ping' and field == 'average_response_ms':
             context['latency'] = value
-            print(f"🔍 Latence détectée: {value}ms")
+        elif measurement == 'ping_latency' and field == 'latency_ms':
+            context['latency'] = value
         
         # Traiter les métriques d'interfaces
         elif measurement == 'interfaces':
@@ -209,36 +179,41 @@ def parse_metrics_for_dashboard(metrics_data):
     
     return context
 
+def get_cached_latest_metrics():
+    """Dernières métriques via le cache partagé entre workers (stale-while-revalidate)"""
+    return get_or_refresh("dashboard:latest_metrics", get_latest_metrics_from_influx)
+
 def dashboard_view(request):
     """Vue principale du dashboard"""
-    metrics_data = get_latest_metrics_from_influx()
-    context = parse_metrics_for_dashboard(metrics_data)
+    context = get_payload('dashboard_context', decode=True)
+    if context is None:
+        context = parse_metrics_for_dashboard(get_cached_latest_metrics())
     return render(request, 'dashboard.html', context)
 
 @csrf_exempt
 def get_latest_metrics(request):
     """API pour récupérer les dernières métriques (utilisée par le JS) avec cache"""
-    print("🚀 DEBUG: get_latest_metrics() appelée")
-    
-    # Vérifier le cache d'abord
-    cached_data = metrics_cache.get("latest_metrics")
-    if cached_data:
-        print("🔍 DEBUG: Données récupérées du cache")
-        return JsonResponse(cached_data, safe=False)
+    payload = get_payload('latest_metrics', request.GET.get('router'))
+    if payload is not None:
+        return HttpResponse(payload, content_type='application/json')
     
-    # Si pas en cache, récupérer les données
-    metrics_data = get_latest_metrics_from_influx()
-    print(f"🔍 DEBUG: Données récupérées d'InfluxDB: {len(metrics_data)} éléments")
-    
-    # Mettre en cache
-    metrics_cache.set("latest_metrics", metrics_data)
+    # Cache partagé : au plus un rafraîchissement InfluxDB par intervalle pour tous les workers
+    metrics_data = get_cached_latest_metrics()
     
     return JsonResponse(metrics_data, safe=False)
 
 def latest_metrics_api(request):
     """API alternative pour les métriques avec pourcentages calculés"""
-    metrics_data = get_latest_metrics_from_influx()
+    # Payload précalculé par `manage.py refresh_dashboard`, renvoyé tel quel
+    payload = get_payload('latest_metrics_api', request.GET.get('router'))
+    if payload is not None:
+        return HttpResponse(payload, content_type='application/json')
     
+    metrics_data = get_cached_latest_metrics()
+    return JsonResponse(build_latest_metrics_summary(metrics_data))
+
+def build_latest_metrics_summary(metrics_data):
+    """Format simplifié avec calcul des pourcentages (latest_metrics_api)"""
     # Convertir en format simplifié avec calcul des pourcentages
     data = {
         "cpu_5min": 0,
@@ -273,36 +248,24 @@ def latest_metrics_api(request):
             elif field == 'ram_free':
                 ram_free_bytes = value
             elif field == 'uptime':
-                # Debug: afficher la valeur brute
-                print(f"🔍 DEBUG Uptime API - Valeur brute: {value}")
-                print(f"🔍 DEBUG Uptime API - Type: {type(value)}")
-                
-                # Tester différentes conversions
-                centiseconds_to_hours = value / 360000
-                seconds_to_hours = value / 3600
-                
-                print(f"🔍 DEBUG Uptime API - Si centisecondes -> heures: {centiseconds_to_hours}")
-                print(f"🔍 DEBUG Uptime API - Si secondes -> heures: {seconds_to_hours}")
-                
                 # Si la valeur est très petite (< 1), c'est probablement déjà en heures
                 # Si elle est entre 1 et 1000, c'est probablement en secondes
                 # Si elle est > 100000, c'est probablement en centisecondes
                 if value < 1:
                     # Déjà en heures
                     data['uptime'] = round(value, 2)
-                    print(f"🔍 DEBUG Uptime API - Traité comme heures: {data['uptime']}")
                 elif value < 10000:
                     # En secondes
                     data['uptime'] = round(value / 3600, 2)
-                    print(f"🔍 DEBUG Uptime API - Traité comme secondes: {data['uptime']}")
                 else:
                     # En centisecondes
                     data['uptime'] = round(value / 360000, 2)
-                    print(f"🔍 DEBUG Uptime API - Traité comme centisecondes: {data['uptime']}")
         
         # Traiter les métriques de ping
         elif measurement == 'ping' and field == 'average_response_ms':
             data['latency_ms'] = value
+        elif measurement == 'ping_latency' and field == 'latency_ms':
+            data['latency_ms'] = value
     
     # Calculer le pourcentage de RAM
     if ram_used_bytes > 0 and ram_free_bytes > 0:
@@ -314,7 +277,7 @@ def latest_metrics_api(request):
     # Mettre à jour le nom du routeur
     data['router_name'] = router_name
     
-    return JsonResponse(data)
+    return data
 
 def index(request):
     """Vue d'index alternative"""
@@ -329,67 +292,65 @@ def index(request):
     return render(request, "dashboard.html", context)
 
 def get_interfaces_data():
-    """Récupère les données d'interfaces depuis InfluxDB"""
+    """Débits courants de toutes les interfaces, calculés par InfluxDB (derivative)"""
     if not INFLUX_AVAILABLE:
         return []
     
     try:
-        with InfluxDBClient(url=INFLUX_URL, token=INFLUX_TOKEN, org=INFLUX_ORG) as client:
-            query_api = client.query_api()
-            
-            # Requête pour récupérer les dernières données d'interfaces
-            flux_query = f'''
-                from(bucket:"{INFLUX_BUCKET}")
-                |> range(start: -10m)
-                |> filter(fn: (r) => r._measurement == "interfaces")
-                |> filter(fn: (r) => r._field == "ifInOctets" or r._field == "ifOutOctets")
-                |> sort(columns: ["_time"], desc:true)
-                |> group(columns: ["ifDescr", "_field"])
-                |> first()
-            '''
-            
-            tables = query_api.query(flux_query)
-            interfaces_data = {}
-            
-            for table in tables:
-                for record in table.records:
-                    interface_name = record.values.get('ifDescr', 'Unknown')
-                    field = record.get_field()
-                    value = record.get_value()
-                    
-                    if interface_name not in interfaces_data:
-                        interfaces_data[interface_name] = {}
-                    
-                    interfaces_data[interface_name][field] = value
-            
-            # Convertir en format pour le dashboard
-            interfaces_list = []
-            for interface_name, data in interfaces_data.items():
-                if interface_name != 'Unknown' and interface_name != 'Null0':  # Ignorer les interfaces non utiles
-                    in_octets = data.get('ifInOctets', 0)
-                    out_octets = data.get('ifOutOctets', 0)
-                    
-                    # Convertir en MB
-                    in_mb = round(in_octets / (1024 * 1024), 2) if in_octets > 0 else 0
-                    out_mb = round(out_octets / (1024 * 1024), 2) if out_octets > 0 else 0
-                    
-                    interfaces_list.append({
-                        'name': interface_name,
-                        'in_octets': in_octets,
-                        'out_octets': out_octets,
-                        'in_mb': in_mb,
-                        'out_mb': out_mb,
-                        'status': 'active' if (in_octets > 0 or out_octets > 0) else 'inactive'
-                    })
-            
-            print(f"✅ {len(interfaces_list)} interfaces actives récupérées")
-            return interfaces_list
-            
+        interfaces_list = []
+        for rates in get_interface_rates():
+            if rates['name'] in ('Unknown', 'Null0'):  # Ignorer les interfaces non utiles
+                continue
+            rates['status'] = 'active' if (rates['in_mbps'] or rates['out_mbps']) else 'inactive'
+            interfaces_list.append(rates)
+        
+        print(f"✅ {len(interfaces_list)} interfaces actives récupérées")
+        return interfaces_list
+        
     except Exception as e:
         print(f"❌ Erreur lors de la récupération des interfaces: {e}")
         return []
 
 def interfaces_api(request):
-    """API pour récupérer les données d'interfaces"""
-    interfaces_data = get_interfaces_data()
+    """API pour récupérer les débits des interfaces (Mbit/s, erreurs/s), filtrables par ?router="""
+    router = request.GET.get('router')
+    payload = get_payload('interfaces')
+    if payload is not None and not router:
+        return HttpResponse(payload, content_type='application/json')
+    
+    if payload is not None:
+        interfaces_data = json.loads(payload)
+    else:
+        interfaces_data = get_or_refresh("dashboard:interfaces", get_interfaces_data)
+    if router:
+        interfaces_data = [item for item in interfaces_data if item.get('router') == router]
     return JsonResponse(interfaces_data, safe=False)
+
+def get_fleet_summary():
+    """Lignes de la vue flotte : précalculées par le refresher, sinon via le cache partagé"""
+    rows = cache.get(FLEET_KEY)
+    if rows is None:
+        rows = get_or_refresh("dashboard:fleet_summary", lambda: build_fleet_summary(get_cached_latest_metrics()))
+    return rows
+
+def fleet_api(request):
+    """
+    Vue d'ensemble de la flotte, une ligne par routeur :
+    ?sort=cpu&order=desc&breach=any|cpu|ram&limit=100&cursor=<next>
+    """
+    params = request.GET
+    sort = params.get('sort', 'name')
+    if sort not in SORT_FIELDS:
+        return JsonResponse({"status": "error", "message": f"sort must be one of {', '.join(SORT_FIELDS)}"}, status=400)
+    breach = params.get('breach') or None
+    if breach and breach not in BREACH_FIELDS + ('any',):
+        return JsonResponse({"status": "error", "message": f"breach must be any, {', '.join(BREACH_FIELDS)}"}, status=400)
+    try:
+        limit = min(max(int(params.get('limit', DEFAULT_LIMIT)), 1), MAX_LIMIT)
+        page, count, next_cursor = paginate(
+            get_fleet_summary(), sort, params.get('order') == 'desc', breach, params.get('cursor'), limit,
+        )
+    except ValueError as e:
+        return JsonResponse({"status": "error", "message": str(e)}, status=400)
+    
+    return JsonResponse({"count": count, "next": next_cursor, "results": page})
@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/4.2/ref/settings/
 
 from pathlib import Path
 import os
+import sys
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -107,6 +108,14 @@ else:
         }
     }
 
+# manage.py test : schéma créé directement depuis les modèles, les migrations
+# n'étant générées qu'au déploiement (entrypoint.sh → makemigrations)
+if len(sys.argv) > 1 and sys.argv[1] == 'test':
+    MIGRATION_MODULES = {
+        app: None
+        for app in ('core_models', 'settings_app', 'dashboard_app', 'thresholds_app', 'alerts_app', 'api_app')
+    }
+
 
 
 # Password validation
@@ -166,6 +175,65 @@ LOGOUT_REDIRECT_URL = '/login/' # Où aller après logout
 
 AUTH_USER_MODEL = 'core_models.User'
 
+# InfluxDB (client partagé par processus, voir api_app/influx_utils.py)
+INFLUXDB_URL = os.environ.get('INFLUXDB_URL', 'http://influxdb:8086')
+INFLUXDB_TOKEN = os.environ.get('INFLUXDB_TOKEN', 'BQSixul3bdmN-KtFDG_BPfUgSDGc1ZIntJ-QYa2fiIQjA_2psFN2z21AOmxD2s8fpStGlj8YWyvTCckOeCrFJA==')
+INFLUXDB_ORG = os.environ.get('INFLUXDB_ORG', 'telecom-sudparis')
+INFLUXDB_BUCKET = os.environ.get('INFLUXDB_BUCKET', 'router-metrics')
+# Connexions HTTP gardées ouvertes par processus, et délai max d'une requête
+INFLUXDB_POOL_SIZE = int(os.environ.get('INFLUXDB_POOL_SIZE', '8'))
+INFLUXDB_TIMEOUT_MS = int(os.environ.get('INFLUXDB_TIMEOUT_MS', '10000'))
+# Paliers d'agrégats 1m/5m/1h (`manage.py setup_rollups`), lus par l'API d'historique une fois créés
+INFLUXDB_ROLLUPS = os.environ.get('INFLUXDB_ROLLUPS', '0') == '1'
+
+# Cache partagé entre workers gunicorn (fichier par défaut, sans Redis ; 'db' nécessite createcachetable)
+CACHE_BACKEND = os.environ.get('CACHE_BACKEND', 'file')
+# `refresh_dashboard` écrit 2 clés par routeur à chaque cycle : au-delà de MAX_ENTRIES (300 par
+# défaut dans Django), le cache supprime un tiers des entrées au hasard et le dashboard repart sur
+# InfluxDB. Prévoir au moins 2 × routeurs + 100. Le cache fichier liste son répertoire à chaque
+# écriture : au-delà de quelques milliers de routeurs, préférer 'db'.
+CACHE_MAX_ENTRIES = int(os.environ.get('CACHE_MAX_ENTRIES', '10000'))
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'db': 'django.core.cache.backends.db.DatabaseCache',
+}
+CACHES = {
+    'default': {
+        'BACKEND': CACHE_BACKENDS[CACHE_BACKEND],
+        'LOCATION': os.environ.get('CACHE_LOCATION', {
+            'locmem': 'router-supervisor',
+            'file': '/tmp/metrics/django_cache',
+            'db': 'django_cache',
+        }[CACHE_BACKEND]),
+        'OPTIONS': {'MAX_ENTRIES': CACHE_MAX_ENTRIES},
+    }
+}
+# Données du dashboard : fraîches pendant FRESH s, servies périmées jusqu'à FRESH + STALE s
+DASHBOARD_CACHE_FRESH = int(os.environ.get('DASHBOARD_CACHE_FRESH', '3'))
+DASHBOARD_CACHE_STALE = int(os.environ.get('DASHBOARD_CACHE_STALE', '30'))
+# Cadence de `manage.py refresh_dashboard` (alignée sur la collecte du pipeline)
+DASHBOARD_REFRESH_INTERVAL = float(os.environ.get('DASHBOARD_REFRESH_INTERVAL', '5'))
+# Durée max d'attente du calcul mené par un autre worker (single flight)
+SINGLE_FLIGHT_LOCK_SECONDS = int(os.environ.get('SINGLE_FLIGHT_LOCK_SECONDS', '5'))
+
+# Dernières valeurs publiées par le pipeline (voir collector/snapshot.py)
+METRICS_SNAPSHOT_PATH = os.environ.get('METRICS_SNAPSHOT_PATH', '/tmp/metrics/latest_metrics.snap')
+# Au-delà de cet âge (secondes), le dashboard interroge InfluxDB
+METRICS_SNAPSHOT_MAX_AGE = int(os.environ.get('METRICS_SNAPSHOT_MAX_AGE', '30'))
+
+# File d'ingestion : receive_metrics répond 202 et `manage.py ingest_worker` écrit en base
+INGEST_ASYNC = os.environ.get('INGEST_ASYNC', '1') == '1'
+INGEST_QUEUE_DIR = os.environ.get('INGEST_QUEUE_DIR', '/tmp/metrics/ingest_queue')
+INGEST_QUEUE_MAX_ITEMS = int(os.environ.get('INGEST_QUEUE_MAX_ITEMS', '10000'))
+# Échecs d'écriture d'un même payload avant son passage dans <file>/dead/
+INGEST_MAX_ATTEMPTS = int(os.environ.get('INGEST_MAX_ATTEMPTS', '5'))
+# Fraction des requêtes dont le corps brut est journalisé (niveau DEBUG)
+INGEST_DEBUG_SAMPLE_RATE = float(os.environ.get('INGEST_DEBUG_SAMPLE_RATE', '0'))
+
+# Jeton du pipeline (mode fleet) pour lire /api/routers/ sans session ; vide = session obligatoire
+PIPELINE_API_TOKEN = os.environ.get('PIPELINE_API_TOKEN', '')
+
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = 'z.imt.fr'
 EMAIL_PORT = 587
@@ -77,6 +77,9 @@ echo ""
 echo "🐍 Test the Python client:"
 echo "   python3 influxdb_client.py"
 echo ""
+echo "📉 Create the 1m/5m/1h rollup buckets and tasks (then set INFLUXDB_ROLLUPS=1):"
+echo "   python router_supervisor/manage.py setup_rollups --backfill 7"
+echo ""
 echo "📊 Query data with Django management command:"
 echo "   python router_supervisor/manage.py query_influxdb --help"
 echo ""